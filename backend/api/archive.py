@@ -0,0 +1,53 @@
+# backend/api/archive.py
+import tarfile
+from datetime import datetime
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..models import Project
+from ..core.archive import stream_archive, import_archive
+from ..core.embeddings import prompt_index
+
+router = APIRouter(prefix="/api/archive", tags=["archive"])
+
+
+@router.get("/export")
+def export_archive(
+        project_id: List[int] = Query([], description="要导出的项目 ID，可重复传入"),
+        include_global: bool = Query(False, description="是否包含不属于任何项目的全局资产"),
+        compress: bool = Query(True, description="是否 gzip 压缩"),
+        db: Session = Depends(get_db)
+):
+    """流式导出项目、资产与媒体文件为 tar 归档（相同内容的媒体只写一次）"""
+    if not project_id and not include_global:
+        raise HTTPException(status_code=400, detail="请至少指定一个项目或勾选全局资产")
+    found = {row.id for row in db.query(Project.id).filter(Project.id.in_(project_id)).all()}
+    missing = [pid for pid in project_id if pid not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"项目不存在: {missing}")
+
+    suffix = "tar.gz" if compress else "tar"
+    filename = f"comfyforge_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{suffix}"
+    return StreamingResponse(
+        stream_archive(sorted(found), include_global, compress),
+        media_type="application/gzip" if compress else "application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/import")
+def import_archive_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    """导入归档：按内容哈希去重媒体与资产，重新分配 ID 并重建版本链与血缘"""
+    try:
+        stats = import_archive(file.file, db)
+    except (tarfile.TarError, ValueError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"归档解析失败: {e}")
+    if stats["assets_created"]:
+        stats["search_index"] = prompt_index.reconcile(db)
+    print(f"📦 [Archive] 导入完成: {stats['assets_created']} 个新资产, {stats['assets_deduped']} 个重复跳过")
+    return stats
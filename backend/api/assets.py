@@ -10,7 +10,25 @@ from datetime import datetime
 
 from ..db import get_db  # 统一导入
 from ..models import Asset, Project
-from ..models.schemas import ASSET_DATA_SCHEMAS
+from ..models.schemas import ASSET_DATA_SCHEMAS, TagFacetOut
+from ..core.tag_index import (
+    ENTITY_ASSET, TAG_MODE_AND, sync_entity_tags, remove_entity_tags, tagged_entity_ids, tag_facets
+)
+from ..core.asset_versions import (
+    is_delta_stub, resolve_asset_data, register_version_head, advance_version_head,
+    release_asset_version, version_history
+)
+from ..models.asset_version import AssetVersionHead
+from ..core.phash import (
+    INDEXED_MAX_DISTANCE, index_image_asset, remove_image_hash, find_similar, duplicate_report,
+    backfill_image_hashes
+)
+from ..core.embeddings import prompt_index, SEARCHABLE_FIELDS
+from ..core.file_gc import is_file_shared
+from ..core.lineage import (
+    ALL_RELATIONS, DEFAULT_MAX_DEPTH, RELATION_VERSION, record_lineage, detach_asset_lineage,
+    get_ancestors, get_descendants
+)
 
 IMAGES_DIR = "data/assets/images"
 VIDEOS_DIR = "data/assets/videos"
@@ -50,6 +68,26 @@ class ProjectUpdate(BaseModel):
     project_id: Optional[int] = None
 
 
+class LineageNodeOut(BaseModel):
+    id: int
+    type: str
+    name: str
+    version: Optional[int] = None
+    depth: int
+
+
+class LineageEdgeOut(BaseModel):
+    parent: int
+    child: int
+    relation: str
+
+
+class LineageGraphOut(BaseModel):
+    root_id: int
+    nodes: List[LineageNodeOut]
+    edges: List[LineageEdgeOut]
+
+
 class AssetOut(AssetBase):
     id: int
     version: int
@@ -62,6 +100,17 @@ class AssetOut(AssetBase):
     class Config:
         from_attributes = True  # SQLAlchemy 2.0 风格，替代 orm_mode
 
+
+class SimilarAssetOut(BaseModel):
+    distance: int
+    asset: AssetOut
+
+
+class SemanticHitOut(BaseModel):
+    score: float
+    asset: AssetOut
+
+
 @router.post("/", response_model=AssetOut)
 def create_asset(asset: AssetCreate, db: Session = Depends(get_db)):
     # 验证 data 字段
@@ -85,11 +134,25 @@ def create_asset(asset: AssetCreate, db: Session = Depends(get_db)):
         project_id=asset.project_id
     )
     db.add(db_asset)
+    db.flush()
+    sync_entity_tags(db, ENTITY_ASSET, db_asset.id, db_asset.tags)
+    register_version_head(db, db_asset)
+    index_image_asset(db, db_asset)
     db.commit()
     db.refresh(db_asset)
+    if db_asset.type in SEARCHABLE_FIELDS:
+        prompt_index.upsert_asset(db_asset)
     return db_asset
 
 
+def _asset_out(db: Session, asset: Asset) -> AssetOut:
+    """序列化资产；被差量压缩的历史版本在这里还原出完整 data"""
+    out = AssetOut.model_validate(asset)
+    if is_delta_stub(asset.data):
+        out.data = resolve_asset_data(db, asset)
+    return out
+
+
 
 @router.get("/", response_model=List[AssetOut])
 def list_assets(
@@ -98,11 +161,20 @@ def list_assets(
         type: Optional[str] = None,
         project_id: Optional[int] = None,
         is_global: Optional[bool] = None,  # 🌟 1. 增加一个专门过滤全局资产的参数
+        tags: Optional[List[str]] = Query(None, description="标签过滤，可重复传参"),
+        tag_mode: str = Query(TAG_MODE_AND, pattern="^(and|or)$", description="and: 全部命中; or: 任一命中"),
+        latest_only: bool = Query(False, description="只返回每条版本链的最新版本"),
         db: Session = Depends(get_db)
 ):
     query = db.query(Asset)
+    if latest_only:
+        # 🌟 走物化的版本头指针表，不再自连接整张 assets 表
+        query = query.join(AssetVersionHead, AssetVersionHead.head_asset_id == Asset.id)
     if type:
         query = query.filter(Asset.type == type)
+    if tags:
+        # 🌟 走 tag_index 索引，不再扫描 JSON
+        query = query.filter(Asset.id.in_(tagged_entity_ids(db, ENTITY_ASSET, tags, tag_mode)))
 
     # 🌟 2. 核心隔离逻辑
     if is_global:
@@ -113,14 +185,105 @@ def list_assets(
         query = query.filter(Asset.project_id == project_id)
 
     assets = query.offset(skip).limit(limit).all()
-    return assets
+    return [_asset_out(db, a) for a in assets]
+
+
+@router.get("/tags/facets", response_model=List[TagFacetOut])
+def get_asset_tag_facets(
+        type: Optional[str] = None,
+        project_id: Optional[int] = None,
+        is_global: Optional[bool] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        db: Session = Depends(get_db)
+):
+    """标签分面统计：每个标签下的资产数量，可按类型 / 项目限定范围"""
+    scope = None
+    if type or is_global or project_id is not None:
+        scope = db.query(Asset.id)
+        if type:
+            scope = scope.filter(Asset.type == type)
+        if is_global:
+            scope = scope.filter(Asset.project_id.is_(None))
+        elif project_id is not None:
+            scope = scope.filter(Asset.project_id == project_id)
+    return [{"tag": tag, "count": count} for tag, count in tag_facets(db, ENTITY_ASSET, scope, limit)]
+
+@router.get("/search/semantic", response_model=List[SemanticHitOut])
+def semantic_search(
+        q: str = Query(..., min_length=1, description="自然语言描述，例如“赛博朋克风格的雨夜街道”"),
+        top_k: int = Query(10, ge=1, le=100),
+        type: Optional[str] = Query(None, description="prompt / character，不传则全部"),
+        project_id: Optional[int] = None,
+        db: Session = Depends(get_db)
+):
+    """提示词 / 角色资产的语义检索（本地 Embedding + NumPy 向量索引）"""
+    allowed_ids = None
+    if type or project_id is not None:
+        scope = db.query(Asset.id)
+        if type:
+            scope = scope.filter(Asset.type == type)
+        if project_id is not None:
+            scope = scope.filter(Asset.project_id == project_id)
+        allowed_ids = [row.id for row in scope.all()]
+    hits = prompt_index.search(q, top_k, allowed_ids)
+    assets = {a.id: a for a in db.query(Asset).filter(Asset.id.in_([h[0] for h in hits])).all()}
+    return [{"score": score, "asset": _asset_out(db, assets[i])} for i, score in hits if i in assets]
+
+
+@router.post("/search/reindex")
+def reindex_semantic_search(db: Session = Depends(get_db)):
+    """与数据库对账：补齐缺失向量、剔除失效条目"""
+    return prompt_index.reconcile(db)
+
+
+@router.get("/duplicates/report")
+def get_duplicate_report(
+        max_distance: int = Query(INDEXED_MAX_DISTANCE, ge=0, le=16, description="汉明距离阈值"),
+        db: Session = Depends(get_db)
+):
+    """近重复清理报告：data/assets/images 下的相似图片簇与可回收空间（只读，不删除）"""
+    return duplicate_report(db, max_distance)
+
+
+@router.post("/phash/backfill")
+def backfill_phash(db: Session = Depends(get_db)):
+    """为历史图片资产补算感知哈希"""
+    return backfill_image_hashes(db)
+
 
 @router.get("/{asset_id}", response_model=AssetOut)
 def get_asset(asset_id: int, db: Session = Depends(get_db)):
     asset = db.query(Asset).filter(Asset.id == asset_id).first()
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
-    return asset
+    return _asset_out(db, asset)
+
+
+@router.get("/{asset_id}/similar", response_model=List[SimilarAssetOut])
+def get_similar_assets(
+        asset_id: int,
+        max_distance: int = Query(INDEXED_MAX_DISTANCE, ge=0, le=32, description="汉明距离阈值，<=3 走索引"),
+        limit: int = Query(50, ge=1, le=500),
+        db: Session = Depends(get_db)
+):
+    """以图搜图：按感知哈希查找近似的图片资产"""
+    if not db.query(Asset.id).filter(Asset.id == asset_id).first():
+        raise HTTPException(status_code=404, detail="Asset not found")
+    hits = find_similar(db, asset_id, max_distance, limit)
+    assets = {a.id: a for a in db.query(Asset).filter(Asset.id.in_([h[0] for h in hits])).all()}
+    return [
+        {"distance": distance, "asset": _asset_out(db, assets[hit_id])}
+        for hit_id, distance in hits if hit_id in assets
+    ]
+
+
+@router.get("/{asset_id}/versions", response_model=List[AssetOut])
+def get_asset_versions(asset_id: int, db: Session = Depends(get_db)):
+    """版本历史：从最早版本到当前版本"""
+    asset = db.query(Asset).filter(Asset.id == asset_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return [_asset_out(db, a) for a in version_history(db, asset)]
 
 
 # backend/api/assets.py (部分修改)
@@ -131,8 +294,8 @@ def update_asset(asset_id: int, asset_update: AssetUpdate, db: Session = Depends
     if not original:
         raise HTTPException(status_code=404, detail="Asset not found")
 
-    # 如果更新了 data，需要验证
-    new_data = asset_update.data if asset_update.data is not None else original.data
+    # 如果更新了 data，需要验证（历史版本可能已被压缩为差量，先还原）
+    new_data = asset_update.data if asset_update.data is not None else resolve_asset_data(db, original)
     schema = ASSET_DATA_SCHEMAS.get(original.type)
     if schema and asset_update.data is not None:
         try:
@@ -156,10 +319,54 @@ def update_asset(asset_id: int, asset_update: AssetUpdate, db: Session = Depends
         file_path=original.file_path
     )
     db.add(new_asset)
+    db.flush()
+    sync_entity_tags(db, ENTITY_ASSET, new_asset.id, new_asset.tags)
+    record_lineage(db, new_asset.id, [original.id], RELATION_VERSION)
+    # 🌟 移动头指针，并把旧版本的大 JSON 压缩为相对新版本的差量
+    advance_version_head(db, original, new_asset)
+    index_image_asset(db, new_asset)
     db.commit()
     db.refresh(new_asset)
+    if new_asset.type in SEARCHABLE_FIELDS:
+        # 语义索引只保留每条版本链的最新版本
+        prompt_index.remove_asset(original.id)
+        prompt_index.upsert_asset(new_asset)
     return new_asset
 
+def _parse_relations(relation: Optional[str]):
+    if not relation:
+        return ALL_RELATIONS
+    if relation not in ALL_RELATIONS:
+        raise HTTPException(status_code=400, detail=f"relation 仅支持: {', '.join(ALL_RELATIONS)}")
+    return (relation,)
+
+
+@router.get("/{asset_id}/ancestors", response_model=LineageGraphOut)
+def get_asset_ancestors(
+        asset_id: int,
+        max_depth: int = Query(DEFAULT_MAX_DEPTH, ge=1, le=100),
+        relation: Optional[str] = Query(None, description="source / version，不传则两者都追溯"),
+        db: Session = Depends(get_db)
+):
+    """血缘溯源：该资产由哪些资产派生而来（递归 CTE，带深度上限）"""
+    if not db.query(Asset.id).filter(Asset.id == asset_id).first():
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return get_ancestors(db, asset_id, max_depth, _parse_relations(relation))
+
+
+@router.get("/{asset_id}/descendants", response_model=LineageGraphOut)
+def get_asset_descendants(
+        asset_id: int,
+        max_depth: int = Query(DEFAULT_MAX_DEPTH, ge=1, le=100),
+        relation: Optional[str] = Query(None, description="source / version，不传则两者都展开"),
+        db: Session = Depends(get_db)
+):
+    """血缘展开：哪些产物派生自该资产（例如某张角色设定图）"""
+    if not db.query(Asset.id).filter(Asset.id == asset_id).first():
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return get_descendants(db, asset_id, max_depth, _parse_relations(relation))
+
+
 @router.patch("/{asset_id}/project", response_model=AssetOut)
 def update_asset_project(
     asset_id: int,
@@ -173,7 +380,7 @@ def update_asset_project(
     asset.project_id = update.project_id
     db.commit()
     db.refresh(asset)
-    return asset
+    return _asset_out(db, asset)
 
 
 @router.delete("/{asset_id}", status_code=204)
@@ -182,10 +389,10 @@ def delete_asset(asset_id: int, db: Session = Depends(get_db)):
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
 
-    # 清理磁盘文件
+    # 清理磁盘文件（版本链上的其它资产仍在使用时保留，交给 GC 兜底）
     if asset.data and isinstance(asset.data, dict):
         file_path = asset.data.get("file_path", "")
-        if file_path and not file_path.startswith("http"):
+        if file_path and not file_path.startswith("http") and not is_file_shared(db, file_path, asset.id):
             abs_path = os.path.abspath(file_path)
             if os.path.isfile(abs_path):
                 try:
@@ -193,8 +400,15 @@ def delete_asset(asset_id: int, db: Session = Depends(get_db)):
                 except OSError:
                     pass
 
+    remove_entity_tags(db, ENTITY_ASSET, asset.id)
+    detach_asset_lineage(db, asset.id)
+    release_asset_version(db, asset)
+    remove_image_hash(db, asset.id)
+    is_searchable = asset.type in SEARCHABLE_FIELDS
     db.delete(asset)
     db.commit()
+    if is_searchable:
+        prompt_index.remove_asset(asset_id)
     return
 
 
@@ -0,0 +1,154 @@
+# backend/api/capability_rules.py
+import re
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..models.capability_rule import CapabilityRule
+from ..models.model_config import ModelConfig
+from ..core.capability_classifier import (
+    CAPABILITY_KEYS, CapabilityClassifier, capability_classifier, benchmark,
+    load_rules, rule_to_dict, unsupported_regex_reason,
+)
+from ..core.model_catalog_cache import model_catalog_cache
+from ..core.services.model_syncer import ModelSyncer
+
+router = APIRouter(prefix="/api/capability-rules", tags=["capability-rules"])
+
+
+class CapabilityRuleBase(BaseModel):
+    name: str
+    keywords: List[str] = []
+    regex: Optional[str] = None
+    capabilities: List[str]
+    priority: int = 100
+    enabled: bool = True
+
+
+class CapabilityRuleCreate(CapabilityRuleBase):
+    pass
+
+
+class CapabilityRuleUpdate(BaseModel):
+    name: Optional[str] = None
+    keywords: Optional[List[str]] = None
+    regex: Optional[str] = None
+    capabilities: Optional[List[str]] = None
+    priority: Optional[int] = None
+    enabled: Optional[bool] = None
+
+
+class CapabilityRuleOut(CapabilityRuleBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+def _validate(db: Session, data: dict, rule: Optional[CapabilityRule] = None) -> None:
+    regex = data.get("regex")
+    if regex:
+        # 规则会被拼进同一条正则，每条规则占一个命名分组，用户正则里不能引用分组编号 / 名称
+        reason = unsupported_regex_reason(regex)
+        if reason:
+            raise HTTPException(status_code=400, detail=f"正则表达式不支持: {reason}")
+        try:
+            re.compile(regex)
+        except re.error as e:
+            raise HTTPException(status_code=400, detail=f"正则表达式无效: {e}")
+    capabilities = data.get("capabilities")
+    if capabilities is not None:
+        unknown = [c for c in capabilities if c not in CAPABILITY_KEYS]
+        if unknown or not capabilities:
+            raise HTTPException(
+                status_code=400,
+                detail=f"能力必须取自 {', '.join(CAPABILITY_KEYS)}，不支持: {', '.join(unknown) or '空列表'}"
+            )
+    # 单条能编译不代表拼起来也能：用现有规则 + 候选规则试编译一遍，失败就不落库
+    candidate = rule_to_dict(rule) if rule is not None else {}
+    candidate.update(data)
+    try:
+        CapabilityClassifier(load_rules(db, exclude_id=rule.id if rule is not None else None) + [candidate])
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"规则与现有规则合并编译失败: {e}")
+
+
+def _reload_rules(db: Session) -> None:
+    """规则落库后：重编译分类器，按新规则重算已同步模型的能力，再作废模型目录缓存"""
+    capability_classifier.reload(db)
+    changed = ModelSyncer.reclassify_synced_models(db)
+    db.commit()
+    model_catalog_cache.invalidate()
+    if changed:
+        print(f"🧠 [Capabilities] 规则变更，已重算 {changed} 个同步模型的能力")
+
+
+def _get_rule(db: Session, rule_id: int) -> CapabilityRule:
+    rule = db.query(CapabilityRule).filter(CapabilityRule.id == rule_id).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="能力规则不存在")
+    return rule
+
+
+@router.get("/", response_model=List[CapabilityRuleOut])
+def list_capability_rules(enabled: Optional[bool] = None, db: Session = Depends(get_db)):
+    query = db.query(CapabilityRule)
+    if enabled is not None:
+        query = query.filter(CapabilityRule.enabled == enabled)
+    return query.order_by(CapabilityRule.priority, CapabilityRule.id).all()
+
+
+@router.post("/", response_model=CapabilityRuleOut)
+def create_capability_rule(rule: CapabilityRuleCreate, db: Session = Depends(get_db)):
+    data = rule.dict()
+    _validate(db, data)
+    db_rule = CapabilityRule(**data)
+    db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    _reload_rules(db)
+    return db_rule
+
+
+@router.put("/{rule_id:int}", response_model=CapabilityRuleOut)
+def update_capability_rule(rule_id: int, rule_update: CapabilityRuleUpdate, db: Session = Depends(get_db)):
+    rule = _get_rule(db, rule_id)
+    data = rule_update.dict(exclude_unset=True)
+    _validate(db, data, rule)
+    for field, value in data.items():
+        setattr(rule, field, value)
+    db.commit()
+    db.refresh(rule)
+    _reload_rules(db)
+    return rule
+
+
+@router.delete("/{rule_id:int}", status_code=204)
+def delete_capability_rule(rule_id: int, db: Session = Depends(get_db)):
+    rule = _get_rule(db, rule_id)
+    db.delete(rule)
+    db.commit()
+    _reload_rules(db)
+    return
+
+
+@router.get("/classify")
+def classify(model_id: str = Query(..., min_length=1)):
+    """用当前规则试分类一个模型 ID（不落库），方便调试规则"""
+    return {"model_id": model_id, "capabilities": capability_classifier.get().classify(model_id)}
+
+
+@router.get("/benchmark")
+def run_benchmark(rounds: int = Query(5, ge=1, le=50), db: Session = Depends(get_db)):
+    """用库里已有的模型名做微基准；库里模型太少时补充合成 ID"""
+    model_ids = [name for (name,) in db.query(ModelConfig.model_name).distinct().all() if name]
+    if len(model_ids) < 500:
+        model_ids += [f"vendor-{i % 17}/model-{i}-{('chat', 'vl', 'i2v', 'sdxl', 'turbo')[i % 5]}"
+                      for i in range(500 - len(model_ids))]
+    return benchmark(model_ids, rounds)
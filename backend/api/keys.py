@@ -1,52 +1,66 @@
 # backend/api/keys.py
+import json
+import asyncio
 import requests
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel, validator
 from datetime import datetime
 
-from ..db import get_db  # 统一导入
+from ..db import get_db, get_async_db  # 统一导入
 from ..models.api_key import APIKey
 from ..models.provider import Provider  # 🌟 引入供应商配置模型
 from ..models.schemas import APIKeyCreate, APIKeyUpdate, APIKeyOut
 
 from ..models.model_config import ModelConfig  # 🌟 新增：引入模型配置表
+from ..core.key_metrics import key_metrics
+from ..core.key_pool import key_pool
+from ..core.config_cache import config_cache
+from ..core.key_probe import (build_probe_request, build_quota_request, interpret_probe, interpret_quota,
+                              iter_probe_results, PROBE_TIMEOUT_SECONDS, MAX_CONCURRENCY)
+from ..core.key_monitor import apply_key_checks
+from ..core.db_writer import db_writer
+from ..core.key_scoring import key_scoreboard
+from ..core.circuit_breaker import breakers
+from ..core.key_health import key_health
+from ..core.model_catalog_cache import model_catalog_cache
 
 router = APIRouter(prefix="/api/keys", tags=["keys"])
 
 
 # ================= 内部探测工具函数 =================
 def _execute_key_test(key_record: APIKey, provider_record: Provider) -> dict:
-    """万能探测逻辑：根据数据库配置动态拼装请求"""
-    base_url = key_record.base_url or provider_record.default_base_url
-    if not base_url:
-        return {"valid": False, "message": "网关地址 (Base URL) 未配置，无法测试"}
-
-    base_url = base_url.rstrip("/")
-
-    # 动态组装探测 URL (OpenAI 标准通常有 /models 接口)
-    test_url = f"{base_url}/models" if provider_record.api_format == "openai_compatible" else f"{base_url}"
-
-    # 动态组装鉴权头
-    headers = {"Content-Type": "application/json"}
-    if key_record.key:
-        auth_type = (provider_record.auth_type or "Bearer").lower()
-        if auth_type == "bearer":
-            headers["Authorization"] = f"Bearer {key_record.key}"
-        elif auth_type == "x-api-key":
-            headers["x-api-key"] = key_record.key
+    """万能探测逻辑：根据数据库配置动态拼装请求（与后台巡检共用 key_probe 的拼装规则）"""
+    test_url, headers, error = build_probe_request(key_record, provider_record)
+    if test_url is None:
+        return {"valid": False, "message": error}
 
     # 发射探针
     try:
-        resp = requests.get(test_url, headers=headers, timeout=10)
-        if resp.status_code == 200:
-            return {"valid": True, "quota_remaining": None, "message": "测试成功：节点连接正常，API Key 有效！"}
-        else:
-            return {"valid": False, "message": f"测试失败 (HTTP {resp.status_code}): {resp.text}"}
+        resp = requests.get(test_url, headers=headers, timeout=PROBE_TIMEOUT_SECONDS)
+        result = interpret_probe(resp.status_code, resp.text)
     except Exception as e:
         return {"valid": False, "message": f"请求异常: {str(e)}"}
 
+    # 探测通过后顺带查一次剩余额度（支持的 Provider 才查）
+    quota_url, extractor = build_quota_request(key_record, provider_record)
+    if result["valid"] and quota_url:
+        try:
+            resp = requests.get(quota_url, headers=headers, timeout=PROBE_TIMEOUT_SECONDS)
+            result["quota_remaining"] = interpret_quota(resp.status_code, resp.json(), extractor)
+        except Exception:
+            pass
+    return result
+
+
+def _key_out(key: APIKey) -> APIKeyOut:
+    """统计字段叠加内存中尚未写回的调用指标"""
+    return APIKeyOut.model_validate(key).model_copy(update=key_metrics.merged(key))
+
 
 # ================= 路由接口 =================
 
@@ -71,6 +85,7 @@ def create_key(key: APIKeyCreate, db: Session = Depends(get_db)):
     db.add(db_key)
     db.commit()
     db.refresh(db_key)
+    key_pool.invalidate(db_key.provider)
     return db_key
 
 
@@ -88,7 +103,7 @@ def list_keys(
         query = query.filter(APIKey.provider == provider)
     if is_active is not None:
         query = query.filter(APIKey.is_active == is_active)
-    return query.offset(skip).limit(limit).all()
+    return [_key_out(k) for k in query.offset(skip).limit(limit).all()]
 
 
 # 获取单个Key
@@ -97,7 +112,22 @@ def get_key(key_id: int, db: Session = Depends(get_db)):
     key = db.query(APIKey).filter(APIKey.id == key_id).first()
     if not key:
         raise HTTPException(status_code=404, detail="Key not found")
-    return key
+    return _key_out(key)
+
+
+# 🌟 查看 Key 的自适应评分（ADAPTIVE 策略的依据）
+@router.get("/{key_id}/score")
+def get_key_score(key_id: int, db: Session = Depends(get_db)):
+    key = db.query(APIKey).filter(APIKey.id == key_id).first()
+    if not key:
+        raise HTTPException(status_code=404, detail="Key not found")
+    entry = key_pool.get(db, key.provider).entries.get(key_id)
+    stats = key_scoreboard.stats(key_id, key_metrics.merged(key)["avg_latency"])
+    if entry is not None:
+        stats["score"] = key_scoreboard.score(entry, entry.price_per_call)
+    stats["breaker"] = breakers.key_state(key_id) or {"state": "closed", "failures": 0, "retry_in_seconds": 0.0}
+    stats["health"] = key_health.snapshot(key_id)
+    return {"key_id": key_id, **stats}
 
 
 # 更新Key
@@ -110,12 +140,16 @@ def update_key(key_id: int, update: APIKeyUpdate, db: Session = Depends(get_db))
     # exclude_unset=True 确保前端没传的字段(比如只更新描述时没传URL)，不会被覆盖为空
     update_data = update.dict(exclude_unset=True)
 
+    old_provider = key.provider
     for field, value in update_data.items():
         setattr(key, field, value)
 
     db.commit()
     db.refresh(key)
-    return key
+    key_pool.invalidate(old_provider)
+    key_pool.invalidate(key.provider)
+    config_cache.invalidate_keys([key_id])
+    return _key_out(key)
 
 
 # 删除Key
@@ -126,8 +160,13 @@ def delete_key(key_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Key not found")
         # 🌟 修复关键：在删除 Key 之前，先一波带走所有绑定在这个 Key 下的模型！
     db.query(ModelConfig).filter(ModelConfig.api_key_id == key_id).delete()
+    provider = key.provider
     db.delete(key)
     db.commit()
+    key_pool.invalidate(provider)
+    config_cache.invalidate_keys([key_id])
+    key_scoreboard.forget(key_id)
+    model_catalog_cache.invalidate(key_id)
     return
 
 
@@ -153,6 +192,8 @@ def test_key_endpoint(key_id: int, db: Session = Depends(get_db)):
             key.quota_remaining = result["quota_remaining"]
         key.last_checked = datetime.utcnow()
         db.commit()
+        key_pool.invalidate(key.provider)
+        config_cache.invalidate_keys([key_id])
         return {"valid": True, "quota_remaining": key.quota_remaining, "message": result.get("message", "Key is valid")}
     else:
         key.failure_count += 1
@@ -160,34 +201,54 @@ def test_key_endpoint(key_id: int, db: Session = Depends(get_db)):
             key.is_active = False
         key.last_checked = datetime.utcnow()
         db.commit()
+        key_pool.invalidate(key.provider)
+        config_cache.invalidate_keys([key_id])
         raise HTTPException(status_code=400, detail=result.get("message", "Key is invalid"))
 
 
-# 🌟 修复：测试所有活跃Key（用于批量检查）
+# 🌟 测试所有活跃Key：并发探测，逐条以 NDJSON 流式返回，前端可以边测边显示
 @router.post("/test-all")
-def test_all_keys(db: Session = Depends(get_db)):
-    """测试所有活跃Key，并更新状态（可由定时任务调用）"""
-    keys = db.query(APIKey).filter(APIKey.is_active == True).all()
-    results = []
-
-    for key in keys:
-        provider_record = db.query(Provider).filter(Provider.id == key.provider).first()
-        if not provider_record:
-            continue  # 跳过无效的供应商
-
-        result = _execute_key_test(key, provider_record)
-
-        if result["valid"]:
-            key.is_active = True
-            key.failure_count = 0
-            if result.get("quota_remaining") is not None:
-                key.quota_remaining = result["quota_remaining"]
-        else:
-            key.failure_count += 1
-            if key.failure_count >= 3:
-                key.is_active = False
-        key.last_checked = datetime.utcnow()
-        results.append({"id": key.id, "valid": result["valid"], "message": result.get("message")})
-
-    db.commit()
-    return results
\ No newline at end of file
+async def test_all_keys(
+        concurrency: int = Query(MAX_CONCURRENCY, ge=1, le=128, description="同时在飞的探测数"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """测试所有活跃Key，并更新状态（可由定时任务调用）；每行一个结果，最后一行是汇总"""
+    keys = (await db.execute(select(APIKey).where(APIKey.is_active == True))).scalars().all()
+    # 供应商一次性预加载，不再每个 Key 查一次
+    providers = {p.id: p for p in (await db.execute(select(Provider))).scalars().all()}
+    pairs = [(k, providers[k.provider]) for k in keys if k.provider in providers]  # 跳过无效的供应商
+
+    async def save(outcomes: list) -> None:
+        await db_writer.write(apply_key_checks, outcomes)
+        key_pool.invalidate()
+        config_cache.invalidate_keys([o[0] for o in outcomes])
+
+    async def stream():
+        outcomes = []
+        saving = None
+        try:
+            async for key, result in iter_probe_results(pairs, concurrency=concurrency):
+                # 与后台巡检一致：探测结果喂给被动健康与 Key 级熔断器
+                key_health.record_probe(key.id, result["valid"])
+                breakers.record_key(key.id, result["valid"])
+                outcomes.append((key.id, result, result["latency"], datetime.utcnow()))
+                yield json.dumps({
+                    "id": key.id,
+                    "provider": key.provider,
+                    "valid": result["valid"],
+                    "message": result.get("message"),
+                    "latency": round(result["latency"], 1),
+                }, ensure_ascii=False) + "\n"
+            # 全部探测完成后一次提交
+            if outcomes:
+                saving = asyncio.ensure_future(save(outcomes))
+                await asyncio.shield(saving)
+            valid = sum(1 for o in outcomes if o[1]["valid"])
+            yield json.dumps({"done": True, "total": len(outcomes), "valid": valid,
+                              "skipped": len(keys) - len(pairs)}) + "\n"
+        finally:
+            if outcomes and saving is None:
+                # 客户端中途断开：已完成的探测结果交给独立任务落库，不随请求一起丢掉
+                asyncio.ensure_future(save(outcomes))
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -0,0 +1,32 @@
+# backend/api/maintenance.py
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..core import file_gc
+
+router = APIRouter(prefix="/api/maintenance", tags=["maintenance"])
+
+
+@router.post("/gc")
+def run_file_gc(
+        dry_run: bool = Query(True, description="只出报告，不删除文件"),
+        min_age_minutes: int = Query(file_gc.DEFAULT_MIN_AGE_SECONDS // 60, ge=0, description="资产目录文件的最小存活时长"),
+        temp_max_age_hours: float = Query(file_gc.DEFAULT_TEMP_MAX_AGE_SECONDS / 3600, ge=0, description="临时文件最长保留时长"),
+        temp_quota_mb: int = Query(file_gc.DEFAULT_TEMP_QUOTA_BYTES // 1024 ** 2, ge=0, description="data/temp 体积上限"),
+        db: Session = Depends(get_db)
+):
+    """孤儿文件回收：对账磁盘文件与数据库引用，默认 dry-run"""
+    return file_gc.run_gc(
+        db,
+        dry_run=dry_run,
+        min_age_seconds=min_age_minutes * 60,
+        temp_max_age_seconds=int(temp_max_age_hours * 3600),
+        temp_quota_bytes=temp_quota_mb * 1024 ** 2,
+    )
+
+
+@router.get("/gc/last")
+def get_last_gc_report():
+    """最近一次 GC（手动或定时）的报告"""
+    return file_gc.last_report or {}
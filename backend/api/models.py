@@ -1,16 +1,18 @@
 # backend/api/models.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from ..db import get_db
+from ..db import get_db, get_async_db
 from ..models.api_key import APIKey
 from ..models.model_config import ModelConfig
 from ..models.schemas import ModelConfigOut
 from ..core.services.model_syncer import ModelSyncer
 from ..core.adapters.factory import AdapterFactory
+from ..core.model_catalog_cache import model_catalog_cache
 
 router = APIRouter(prefix="/api/models", tags=["models"])
 
@@ -41,24 +43,18 @@ class BulkUIParamsUpdate(BaseModel):
 
 @router.get("/", response_model=List[ModelConfigOut])
 def list_models(
-        mode: Optional[str] = Query(None, description="能力过滤: chat, vision, image, video"),
+        mode: Optional[str] = Query(None, description="能力过滤: chat, vision, text_to_image, image_to_image, text_to_video, image_to_video"),
         key_id: Optional[int] = Query(None, description="按 API Key ID 过滤模型"),
         db: Session = Depends(get_db)
 ):
-    query = db.query(ModelConfig).filter(ModelConfig.is_active == True)
-    if key_id is not None:
-        query = query.filter(ModelConfig.api_key_id == key_id)
-
-    all_models = query.all()
-    if mode:
-        return [m for m in all_models if m.capabilities and m.capabilities.get(mode) is True]
-    return all_models
+    # 能力过滤走 cap_* 索引列；序列化结果按 (key_id, mode) 缓存，同步 / 编辑时失效
+    return Response(content=model_catalog_cache.get(db, key_id, mode), media_type="application/json")
 
 
 @router.post("/sync/{key_id}")
-async def sync_by_key_id(key_id: int, db: Session = Depends(get_db)):
+async def sync_by_key_id(key_id: int, db: AsyncSession = Depends(get_async_db)):
     """根据指定的 Key ID 执行模型批量同步"""
-    key_record = db.query(APIKey).filter(APIKey.id == key_id).first()
+    key_record = await db.get(APIKey, key_id)
     if not key_record:
         raise HTTPException(status_code=404, detail="未找到该 API Key，请刷新页面重试")
     if not key_record.is_active:
@@ -77,6 +73,27 @@ async def sync_by_key_id(key_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"同步服务内部错误: {str(e)}")
 
 
+@router.post("/sync-all")
+async def sync_all_keys(
+        force: bool = Query(False, description="目录没变也强制做一次数据库差分"),
+        db: AsyncSession = Depends(get_async_db)
+):
+    """所有活跃 Key 并发拉取远程模型列表，单事务批量落库"""
+    try:
+        reports = await ModelSyncer.sync_all(db, force=force)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"同步服务内部错误: {str(e)}")
+    created = sum(r["created"] for r in reports)
+    failed = [r for r in reports if r["error"]]
+    return {
+        "status": "success",
+        "message": f"同步完成：{len(reports)} 个 Key，新增 {created} 个模型，失败 {len(failed)} 个 Key",
+        "keys": reports,
+    }
+
+
 # ================= 2. 手动模型 CRUD 路由 =================
 
 @router.post("/")
@@ -99,6 +116,7 @@ def create_model(model_data: ModelCreateUpdate, db: Session = Depends(get_db)):
     db.add(new_model)
     db.commit()
     db.refresh(new_model)
+    model_catalog_cache.invalidate(new_model.api_key_id)
     return {"status": "success", "id": new_model.id}
 
 
@@ -111,6 +129,7 @@ def update_model(model_id: int, model_data: ModelCreateUpdate, db: Session = Dep
     db_model.model_name = model_data.model_name
     db_model.capabilities = model_data.capabilities
     db.commit()
+    model_catalog_cache.invalidate(db_model.api_key_id)
     return {"status": "success"}
 
 
@@ -121,33 +140,35 @@ def delete_model(model_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="未找到该模型")
     if not db_model.is_manual:
         raise HTTPException(status_code=403, detail="官方同步的模型禁止手动删除")
+    key_id = db_model.api_key_id
     db.delete(db_model)
     db.commit()
+    model_catalog_cache.invalidate(key_id)
     return {"status": "success"}
 
 
 # ================= 3. 探针测试路由 (搭载全新 DSL 自适应引擎) =================
 
 @router.post("/{model_id:int}/test")
-async def test_model_health(model_id: int, db: Session = Depends(get_db)):
+async def test_model_health(model_id: int, db: AsyncSession = Depends(get_async_db)):
     """基于 DSL 模板驱动的连通性探针测试"""
-    db_model = db.query(ModelConfig).filter(ModelConfig.id == model_id).first()
+    db_model = await db.get(ModelConfig, model_id)
     if not db_model:
         raise HTTPException(status_code=404, detail="模型不存在")
 
-    key_record = db.query(APIKey).filter(APIKey.id == db_model.api_key_id).first()
+    key_record = await db.get(APIKey, db_model.api_key_id) if db_model.api_key_id else None
     if not key_record or not key_record.is_active:
         db_model.health_status = "error"
-        db.commit()
+        await db.commit()
         raise HTTPException(status_code=400, detail="绑定的 API Key 无效")
 
     from ..models.provider import Provider
-    provider_record = db.query(Provider).filter(Provider.id == db_model.provider).first()
+    provider_record = await db.get(Provider, db_model.provider)
     if not provider_record:
         raise HTTPException(status_code=400, detail="未找到供应商配置")
 
     try:
-        adapter_class = AdapterFactory.get_adapter(db_model.provider, db)
+        adapter_class = AdapterFactory.resolve_adapter(provider_record)
         adapter = adapter_class(provider=provider_record, api_key=key_record)
 
         caps = db_model.capabilities or {}
@@ -202,7 +223,8 @@ async def test_model_health(model_id: int, db: Session = Depends(get_db)):
         status_msg = f"探针异常：{str(e)}"
 
     db_model.last_tested_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
+    model_catalog_cache.invalidate(db_model.api_key_id)
 
     return {"status": db_model.health_status, "message": status_msg, "last_tested_at": db_model.last_tested_at}
 
@@ -214,6 +236,7 @@ def update_model_ui_params(model_id: int, payload: UIParamsUpdate, db: Session =
         raise HTTPException(status_code=404, detail="模型未找到")
     db_model.context_ui_params = payload.context_ui_params
     db.commit()
+    model_catalog_cache.invalidate(db_model.api_key_id)
     return {"status": "success"}
 
 
@@ -230,6 +253,7 @@ def bulk_update_ui_params(payload: BulkUIParamsUpdate, db: Session = Depends(get
             flag_modified(m, "context_ui_params")
             updated_count += 1
     db.commit()
+    model_catalog_cache.invalidate(payload.api_key_id)
     return {"status": "success", "message": f"成功更新 {updated_count} 个模型"}
 
 
@@ -244,4 +268,5 @@ def toggle_model_favorite(model_id: int, payload: FavoriteUpdate, db: Session =
         raise HTTPException(status_code=404, detail="模型未找到")
     db_model.is_favorite = payload.is_favorite
     db.commit()
+    model_catalog_cache.invalidate(db_model.api_key_id)
     return {"status": "success", "is_favorite": db_model.is_favorite}
\ No newline at end of file
@@ -6,7 +6,12 @@ from pydantic import BaseModel
 from datetime import datetime
 
 from ..db import get_db  # 统一导入
-from ..models import Asset, Project# 🌟 补充导入 Dict, Any
+from ..models import Asset, Project
+from ..models.schemas import TagFacetOut
+from ..core.tag_index import (
+    ENTITY_PROJECT, TAG_MODE_AND, sync_entity_tags, remove_entity_tags, tagged_entity_ids, tag_facets
+)
+# 🌟 补充导入 Dict, Any
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import datetime
@@ -45,6 +50,8 @@ def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
         tags=project.tags
     )
     db.add(db_project)
+    db.flush()
+    sync_entity_tags(db, ENTITY_PROJECT, db_project.id, db_project.tags)
     db.commit()
     db.refresh(db_project)
     return db_project
@@ -53,9 +60,19 @@ def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
 def list_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1),
+    tags: Optional[List[str]] = Query(None, description="标签过滤，可重复传参"),
+    tag_mode: str = Query(TAG_MODE_AND, pattern="^(and|or)$", description="and: 全部命中; or: 任一命中"),
     db: Session = Depends(get_db)
 ):
-    return db.query(Project).offset(skip).limit(limit).all()
+    query = db.query(Project)
+    if tags:
+        query = query.filter(Project.id.in_(tagged_entity_ids(db, ENTITY_PROJECT, tags, tag_mode)))
+    return query.offset(skip).limit(limit).all()
+
+@router.get("/tags/facets", response_model=List[TagFacetOut])
+def get_project_tag_facets(limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    """标签分面统计：每个标签下的项目数量"""
+    return [{"tag": tag, "count": count} for tag, count in tag_facets(db, ENTITY_PROJECT, None, limit)]
 
 @router.get("/{project_id}", response_model=ProjectOut)
 def get_project(project_id: int, db: Session = Depends(get_db)):
@@ -69,8 +86,11 @@ def update_project(project_id: int, project_update: ProjectUpdate, db: Session =
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(404, "Project not found")
-    for field, value in project_update.dict(exclude_unset=True).items():
+    update_data = project_update.dict(exclude_unset=True)
+    for field, value in update_data.items():
         setattr(project, field, value)
+    if "tags" in update_data:
+        sync_entity_tags(db, ENTITY_PROJECT, project.id, project.tags)
     db.commit()
     db.refresh(project)
     return project
@@ -80,6 +100,7 @@ def delete_project(project_id: int, db: Session = Depends(get_db)):
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(404, "Project not found")
+    remove_entity_tags(db, ENTITY_PROJECT, project.id)
     db.delete(project)
     db.commit()
     return
\ No newline at end of file
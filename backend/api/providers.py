@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from typing import List, Optional, Any, Dict  # 🌟 1. 补上 Dict 导入
 from ..db import get_db
 from ..models.provider import Provider
+from ..core.key_pool import key_pool
+from ..core.config_cache import config_cache
 from pydantic import BaseModel, ConfigDict
 
 router = APIRouter(prefix="/api/providers", tags=["providers"])
@@ -24,6 +26,8 @@ class ProviderBase(BaseModel):
     # 🌟 核心修复：把 Dict[str, str] 改成 Dict[str, Any]
     endpoints: Optional[Dict[str, Any]] = {}
     custom_headers: Optional[Dict[str, str]] = {}
+    # 模型目录自动刷新间隔（分钟），为空走默认值，0 关闭
+    catalog_refresh_minutes: Optional[int] = None
 
 
 class ProviderOut(ProviderBase):
@@ -48,6 +52,7 @@ def create_provider(data: ProviderBase, db: Session = Depends(get_db)):
     new_provider = Provider(**data.model_dump())
     db.add(new_provider)
     db.commit()
+    key_pool.invalidate(data.id)
     return {"status": "success", "message": "新厂商配置已注入"}
 
 
@@ -63,6 +68,8 @@ def update_provider(provider_id: str, data: ProviderBase, db: Session = Depends(
         setattr(provider, key, value)
 
     db.commit()
+    key_pool.invalidate(provider_id)
+    config_cache.invalidate_provider(provider_id)
     return {"status": "success", "message": "配置已更新"}
 
 
@@ -72,4 +79,6 @@ def delete_provider(provider_id: str, db: Session = Depends(get_db)):
     if provider:
         db.delete(provider)
         db.commit()
+        key_pool.invalidate(provider_id)
+        config_cache.invalidate_provider(provider_id)
     return {"status": "success"}
\ No newline at end of file
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Tuple
 from pydantic import BaseModel
 from datetime import datetime
 
 from ..db import get_db  # 统一导入
 from ..models.node_parameter_stat import NodeParameterStat
+from ..core.db_writer import db_writer
 
 router = APIRouter(prefix="/api/suggestions", tags=["suggestions"])
 
@@ -24,25 +25,30 @@ class SuggestionOut(BaseModel):
         from_attributes = True
 
 @router.post("/report")
-def report_stats(request: ReportRequest, db: Session = Depends(get_db)):
+def report_stats(request: ReportRequest):
     """接收前端上报的参数配置统计"""
-    for item in request.items:
+    pairs = [(item.class_type, item.field) for item in request.items]
+    # 走单写线程：高频上报合并进同一个事务，也不会出现并发下重复插入同一条统计
+    db_writer.write_sync(_apply_report, pairs)
+    return {"status": "ok"}
+
+def _apply_report(db: Session, pairs: List[Tuple[str, str]]) -> None:
+    for class_type, field in pairs:
         # 查找或创建记录
         stat = db.query(NodeParameterStat).filter(
-            NodeParameterStat.class_type == item.class_type,
-            NodeParameterStat.field == item.field
+            NodeParameterStat.class_type == class_type,
+            NodeParameterStat.field == field
         ).first()
         if stat:
             stat.count += 1
         else:
             stat = NodeParameterStat(
-                class_type=item.class_type,
-                field=item.field,
+                class_type=class_type,
+                field=field,
                 count=1
             )
             db.add(stat)
-    db.commit()
-    return {"status": "ok"}
+            db.flush()  # 同批内后续同名上报要能查到这条
 
 @router.get("/recommend", response_model=List[SuggestionOut])
 def recommend_stats(class_type: str, limit: int = 5, db: Session = Depends(get_db)):
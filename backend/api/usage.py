@@ -0,0 +1,65 @@
+# backend/api/usage.py
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func, case
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..models.call_log import CallLog
+from ..core.usage import call_log
+
+router = APIRouter(prefix="/api/usage", tags=["usage"])
+
+GROUP_COLUMNS = {
+    "key": CallLog.api_key_id,
+    "provider": CallLog.provider,
+    "model": CallLog.model,
+    "type": CallLog.req_type,
+}
+
+
+@router.get("/summary")
+def usage_summary(
+        since_hours: float = Query(24, gt=0, description="统计最近多少小时"),
+        group_by: str = Query("key", description="分组维度: key / provider / model / type"),
+        provider: Optional[str] = None,
+        api_key_id: Optional[int] = None,
+        db: Session = Depends(get_db)
+):
+    """按维度汇总真实用量（token / 图片 / 视频 / 流量 / 折算配额）"""
+    group_col = GROUP_COLUMNS.get(group_by)
+    if group_col is None:
+        raise HTTPException(status_code=400, detail=f"不支持的分组维度: {group_by}")
+    # 先把缓冲里尚未落盘的流水写进去，保证统计是实时的
+    call_log.flush()
+
+    query = db.query(
+        group_col.label("group"),
+        func.count(CallLog.id).label("calls"),
+        func.sum(case((CallLog.success == True, 1), else_=0)).label("successes"),
+        func.avg(CallLog.latency_ms).label("avg_latency_ms"),
+        func.sum(CallLog.prompt_tokens).label("prompt_tokens"),
+        func.sum(CallLog.completion_tokens).label("completion_tokens"),
+        func.sum(CallLog.total_tokens).label("total_tokens"),
+        func.sum(CallLog.image_units).label("image_units"),
+        func.sum(CallLog.video_units).label("video_units"),
+        func.sum(CallLog.video_seconds).label("video_seconds"),
+        func.sum(CallLog.response_bytes).label("response_bytes"),
+        func.sum(CallLog.quota_used).label("quota_used"),
+    ).filter(CallLog.created_at >= datetime.utcnow() - timedelta(hours=since_hours))
+    if provider:
+        query = query.filter(CallLog.provider == provider)
+    if api_key_id is not None:
+        query = query.filter(CallLog.api_key_id == api_key_id)
+
+    rows = query.group_by(group_col).order_by(func.count(CallLog.id).desc()).all()
+    return {
+        "since_hours": since_hours,
+        "group_by": group_by,
+        "items": [
+            {**row._asdict(), "avg_latency_ms": round(row.avg_latency_ms or 0.0, 1)}
+            for row in rows
+        ],
+    }
@@ -1,5 +1,6 @@
 # backend/app.py
 import os
+import time
 import uuid
 import asyncio
 import inspect
@@ -11,26 +12,41 @@ from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, WebSocket,
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.db import init_db, SessionLocal, get_db
-from backend.core.asset_utils import save_image_from_base64, save_video_as_asset
+from backend.db import init_db, SessionLocal, AsyncSessionLocal, async_engine, get_async_db
+from backend.core.asset_utils import save_image_from_base64_async
 from backend.core.key_monitor import start_key_monitor
+from backend.core.file_gc import start_file_gc
+from backend.core.catalog_refresher import start_catalog_refresher
+from backend.core.db_writer import db_writer
+from backend.core.key_metrics import key_metrics, start_metrics_flusher
+from backend.core.usage import call_log, quota_cost, start_call_log_flusher
+from backend.core.router import KeyRouter, RoutingStrategy
+from backend.core.hedging import HEDGEABLE_TYPES, hedged_call, hedge_delay_seconds
+from backend.core.failover import call_with_failover, call_with_breaker, idempotency_cache
+from backend.core.config_cache import config_cache
+from backend.core.tag_index import ensure_tag_index
+from backend.core.capability_classifier import ensure_capability_rules
+from backend.core.lineage import ensure_lineage_index
+from backend.core.asset_versions import ensure_version_heads
+from backend.core.embeddings import prompt_index
 from backend.core.adapters.factory import AdapterFactory
+from backend.core.adapters.base import CallContext
 from backend.core.executors.direct_api import DirectAPIPipelineExecutor
 from backend.core.executors.video_loop import VideoLoopExecutor
 from backend.core.executors.cloud_video_loop import CloudVideoLoopExecutor
 from backend.core.executors.real_video_loop import RealVideoLoopExecutor
 
-from backend.api import assets, projects, keys, suggestions, recommendation_rules, models, providers
+from backend.api import assets, projects, keys, suggestions, recommendation_rules, models, providers, archive, maintenance, usage, capability_rules
 from backend.models.api_key import APIKey
 from backend.models.provider import Provider
 # 🌟 引入我们创建的 WS 广播中心
 from backend.core.ws import manager
 
 tasks = {}
-# 🌟 Phase 10: 建立全局任务管家，记录 client_id 与其正在执行的 Adapter 实例
-active_adapters: Dict[str, Any] = {}
+# 🌟 Phase 10: 建立全局任务管家，记录 client_id 与其正在执行的调用上下文（适配器实例是池化共享的，按调用中断）
+active_calls: Dict[str, CallContext] = {}
 # 🌟 核弹级新增：追踪底层的异步协程任务实体
 active_tasks: Dict[str, asyncio.Task] = {}
 
@@ -38,14 +54,35 @@ active_tasks: Dict[str, asyncio.Task] = {}
 async def lifespan(app: FastAPI):
     init_db()
     print("数据库初始化完成")
-    monitor_task = asyncio.create_task(start_key_monitor(interval_minutes=60))
+    db_writer.start()
+    db = SessionLocal()
+    try:
+        ensure_tag_index(db)
+        ensure_capability_rules(db)
+        ensure_lineage_index(db)
+        ensure_version_heads(db)
+        prompt_index.load_or_rebuild(db)
+    finally:
+        db.close()
+    monitor_task = asyncio.create_task(start_key_monitor(interval_minutes=5))
     print("Key监控任务已启动")
+    gc_task = asyncio.create_task(start_file_gc())
+    metrics_task = asyncio.create_task(start_metrics_flusher())
+    call_log_task = asyncio.create_task(start_call_log_flusher())
+    catalog_task = asyncio.create_task(start_catalog_refresher())
     yield
-    monitor_task.cancel()
-    try:
-        await monitor_task
-    except asyncio.CancelledError:
-        pass
+    for task in (monitor_task, gc_task, metrics_task, call_log_task, catalog_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    prompt_index.flush(force=True)
+    # 先把内存里的 Key 指标写回，再等写队列里剩余的操作全部落盘
+    await asyncio.to_thread(key_metrics.flush)
+    await asyncio.to_thread(call_log.flush)
+    await asyncio.to_thread(db_writer.stop)
+    await async_engine.dispose()
     print("应用关闭，Key监控已停止")
 
 app = FastAPI(title="ComfyForge API", lifespan=lifespan)
@@ -65,6 +102,10 @@ app.include_router(suggestions.router)
 app.include_router(recommendation_rules.router)
 app.include_router(models.router)
 app.include_router(providers.router)
+app.include_router(archive.router)
+app.include_router(maintenance.router)
+app.include_router(usage.router)
+app.include_router(capability_rules.router)
 
 class PipelineStep(BaseModel):
     step: str
@@ -97,9 +138,15 @@ class GenerateRequest(BaseModel):
     image_url: Optional[str] = None
     messages: Optional[list] = None
     params: Optional[Dict[str, Any]] = {}
+    # 🌟 对冲模式（仅 chat / vision）：超过该 Key 的 p95 仍未返回，就换一个 Key 再发一份
+    hedge: bool = False
+    hedge_provider: Optional[str] = None  # 同 Provider 没有别的 Key 时，改用这个 Provider 对冲
+    hedge_model: Optional[str] = None     # 跨 Provider 对冲时备用 Provider 上的模型名；不填则只在同 Provider 内对冲
+    # 🌟 幂等键：同一个键的重复提交共享同一次执行（防止连点重复扣费）
+    idempotency_key: Optional[str] = None
 
 @app.post("/api/tasks/direct")
-async def run_direct_pipeline(request: DirectAPITaskRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+async def run_direct_pipeline(request: DirectAPITaskRequest, background_tasks: BackgroundTasks):
     task_id = str(uuid.uuid4())
     task_def = request.dict()
     task_def["task_id"] = task_id
@@ -108,30 +155,34 @@ async def run_direct_pipeline(request: DirectAPITaskRequest, background_tasks: B
     if request.sync:
         executor = DirectAPIPipelineExecutor()
         result = await executor.execute(task_def)
-        visited_ids = result.get("visited_asset_ids", [])
-        outputs = result.get("outputs", {})
-        created_asset_ids = {}
-
-        for key, value in outputs.items():
-            if isinstance(value, str) and len(value) > 100:
-                if value.startswith("iVBOR") or value.startswith("/9j/") or value.startswith("data:image"):
-                    try:
-                        asset_id = save_image_from_base64(value, db, source_ids=visited_ids)
-                        created_asset_ids[key] = asset_id
-                    except Exception as e:
-                        print(f"Failed to save image for {key}: {e}")
-
-        result["created_assets"] = created_asset_ids
+        result["created_assets"] = await _save_pipeline_outputs(result)
         tasks[task_id] = {"status": "completed", "result": result}
         return result
     else:
         background_tasks.add_task(_run_pipeline_background, task_id, task_def)
         return {"task_id": task_id, "status": "queued"}
 
+async def _save_pipeline_outputs(result: dict) -> Dict[str, int]:
+    """把管道输出中的图片落盘为资产，并以 visited_asset_ids 作为血缘来源"""
+    visited_ids = result.get("visited_asset_ids", [])
+    outputs = result.get("outputs", {})
+    created_asset_ids = {}
+
+    for key, value in outputs.items():
+        if isinstance(value, str) and len(value) > 100:
+            if value.startswith("iVBOR") or value.startswith("/9j/") or value.startswith("data:image"):
+                try:
+                    asset_id = await save_image_from_base64_async(value, source_ids=visited_ids)
+                    created_asset_ids[key] = asset_id
+                except Exception as e:
+                    print(f"Failed to save image for {key}: {e}")
+    return created_asset_ids
+
 async def _run_pipeline_background(task_id: str, task_def: dict):
     executor = DirectAPIPipelineExecutor()
     try:
         result = await executor.execute(task_def)
+        result["created_assets"] = await _save_pipeline_outputs(result)
         tasks[task_id] = {"status": "completed", "result": result}
     except Exception as e:
         tasks[task_id] = {"status": "failed", "error": str(e)}
@@ -191,13 +242,107 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     except WebSocketDisconnect:
         manager.disconnect(websocket,client_id)
 
-# 2. 真正的后台异步兵工厂 (在这里调用算力引擎)
-async def run_adapter_task(adapter, request_params: dict, client_id: str):
+async def _generate_with_metrics(adapter, request_params: dict, key_id: int, ctx: CallContext) -> dict:
+    """调用算力引擎并把耗时 / 成败 / 用量记入 Key 指标与调用流水（内存累加，定时落库）；被中断的任务不计入"""
+    start = time.time()
+    provider_id = adapter.provider.id if getattr(adapter, "provider", None) else ""
+    model, req_type = request_params.get("model", ""), request_params.get("type", "")
     try:
-        # 🌟 兵工厂开工第一件事：登记入册，让大管家知道这个 client_id 对应的算力引擎实例
-        active_adapters[client_id] = adapter
+        result = await adapter.generate(request_params, ctx)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        latency = (time.time() - start) * 1000
+        key_metrics.record(key_id, latency, success=False)
+        call_log.add(key_id, provider_id, model, req_type, False, latency)
+        raise
+    latency = (time.time() - start) * 1000
+    success = bool(isinstance(result, dict) and result.get("success"))
+    call_usage = (result.get("usage") or {}) if isinstance(result, dict) else {}
+    # 🌟 按 Key 的 quota_unit 折算真实消耗（token / 张 / 秒），不再一律记 1 次
+    key = getattr(adapter, "api_key", None)
+    quota_used = quota_cost(key.quota_unit if key else None, call_usage, latency) if success else 0
+    key_metrics.record(key_id, latency, success=success, quota_used=quota_used)
+    call_log.add(key_id, provider_id, model, req_type, success, latency, call_usage, quota_used,
+                 result.get("status_code") if isinstance(result, dict) else None)
+    return result
+
+async def _run_generation(adapter, request_params: dict, key_id: int, ctx: CallContext,
+                          hedge: Optional[tuple] = None) -> dict:
+    """
+    hedge 为 (备用 adapter, 备用 key_id, 触发秒数, 备用模型名) 时走对冲调用，否则直接调用；
+    两路共用一个调用上下文，一次中断两路都停。备用请求不经过故障转移，熔断器记账单独做
+    """
+    if hedge is None:
+        return await _generate_with_metrics(adapter, request_params, key_id, ctx)
+    backup_adapter, backup_key_id, delay, backup_model = hedge
+    backup_params = dict(request_params, model=backup_model) if backup_model else dict(request_params)
+    return await hedged_call(
+        lambda: _generate_with_metrics(adapter, dict(request_params), key_id, ctx),
+        lambda: call_with_breaker(backup_adapter.provider.id, backup_key_id, lambda: _generate_with_metrics(
+            backup_adapter, backup_params, backup_key_id, ctx)),
+        delay,
+    )
+
+async def _prepare_hedge(db: AsyncSession, request: "GenerateRequest", key_record: APIKey,
+                         provider_record: Provider) -> Optional[tuple]:
+    """
+    为对冲挑一个备用 Key（优先同 Provider 的其它 Key），挑不到就不对冲。
+    换 Provider 时原模型名基本不可用，必须显式给 hedge_model，否则只在同 Provider 内对冲
+    """
+    if not request.hedge or request.type not in HEDGEABLE_TYPES:
+        return None
+    candidates = [(request.provider, None)]
+    if request.hedge_provider and request.hedge_provider != request.provider and request.hedge_model:
+        candidates.append((request.hedge_provider, request.hedge_model))
+    backup_provider, backup_key_id, backup_model = provider_record, None, None
+    for provider_id, model in candidates:
+        backup_key_id = await db.run_sync(lambda s: KeyRouter(s).select_key_id(
+            provider_id, strategy=RoutingStrategy.ADAPTIVE, exclude_ids={key_record.id}))
+        if backup_key_id is not None:
+            if provider_id != request.provider:
+                backup_provider = await config_cache.aprovider(db, provider_id)
+            backup_model = model
+            break
+    if backup_key_id is None or backup_provider is None:
+        return None
+    backup_key = await config_cache.akey(db, backup_key_id)
+    backup_adapter = AdapterFactory.acquire(backup_provider, backup_key)
+    delay = hedge_delay_seconds(key_record.id, key_metrics.merged(key_record)["avg_latency"])
+    return backup_adapter, backup_key_id, delay, backup_model
+
+async def _generate_with_failover(request_params: dict, provider_record: Provider, key_record: APIKey,
+                                  hedge: Optional[tuple] = None, client_id: Optional[str] = None) -> dict:
+    """可重试的失败（429 / 5xx / 网络错误）自动换 KeyRouter 选出的下一个 Key 再试，熔断中的 Key 直接跳过"""
+    provider_id = provider_record.id
+    ctx = CallContext(client_id)
+    if client_id:
+        # 🌟 登记本次调用的上下文，中断时找得到（换 Key 重试也沿用同一个）
+        active_calls[client_id] = ctx
+
+    async def call(key_id: int, attempt: int) -> dict:
+        key = key_record
+        if key_id != key_record.id:
+            # 后台任务里请求级会话已关闭，换 Key 时单独开一个
+            async with AsyncSessionLocal() as db:
+                key = await config_cache.akey(db, key_id)
+        if ctx.interrupted:
+            return {"success": False, "error": "任务被手动中断"}
+        adapter = AdapterFactory.acquire(provider_record, key)
+        return await _run_generation(adapter, request_params, key_id, ctx, hedge if attempt == 0 else None)
+
+    async def pick_next(tried: set) -> Optional[tuple]:
+        async with AsyncSessionLocal() as db:
+            key_id = await db.run_sync(lambda s: KeyRouter(s).select_key_id(
+                provider_id, strategy=RoutingStrategy.ADAPTIVE, exclude_ids=tried))
+        return (provider_id, key_id) if key_id is not None else None
+
+    return await call_with_failover(provider_id, key_record.id, call, pick_next)
 
-        result = await adapter.generate(request_params)
+# 2. 真正的后台异步兵工厂 (在这里调用算力引擎)
+async def run_adapter_task(generate, client_id: str):
+    try:
+        result = await generate()
         if result.get("success"):
             await manager.send_message({"type": "result", "data": result}, client_id)
         else:
@@ -212,26 +357,24 @@ async def run_adapter_task(adapter, request_params: dict, client_id: str):
         await manager.send_message({"type": "error", "message": f"引擎异常: {str(e)}"}, client_id)
     finally:
         # 🌟 无论成功、失败还是被中断，结束时必须擦除记录，防止内存泄漏
-        active_adapters.pop(client_id, None)
+        active_calls.pop(client_id, None)
         active_tasks.pop(client_id, None)
 
 # 3. 终极版 Generate 路由 (负责发牌和 HTTP 秒回)
 # ⚠️ 注意：去掉了参数里的 background_tasks
 # ⚠️ 注意：去掉了参数里的 background_tasks
 @app.post("/api/generate")
-async def generate_content(request: GenerateRequest, db: Session = Depends(get_db)):
-    key_record = db.query(APIKey).filter(APIKey.id == request.api_key_id).first()
+async def generate_content(request: GenerateRequest, db: AsyncSession = Depends(get_async_db)):
+    # 🌟 Provider / Key 配置走内存快照，命中时不查库
+    key_record = await config_cache.akey(db, request.api_key_id)
     if not key_record or not key_record.is_active:
         raise HTTPException(status_code=400, detail="无效或未启用的 API Key")
 
-    provider_record = db.query(Provider).filter(Provider.id == request.provider).first()
+    provider_record = await config_cache.aprovider(db, request.provider)
     if not provider_record:
         raise HTTPException(status_code=400, detail="未找到 Provider 运行配置")
 
     try:
-        adapter_class = AdapterFactory.get_adapter(provider_record.id, db)
-        adapter = adapter_class(provider=provider_record, api_key=key_record)
-
         request_params = {
             "model": request.model,
             "type": request.type,
@@ -245,14 +388,22 @@ async def generate_content(request: GenerateRequest, db: Session = Depends(get_d
             request_params.update(request.params)
 
         client_id = request.params.get("client_id") if request.params else None
+        hedge = await _prepare_hedge(db, request, key_record, provider_record)
+        idempotency_key = request.idempotency_key
+
+        def generate():
+            return idempotency_cache.run(idempotency_key, lambda: _generate_with_failover(
+                request_params, provider_record, key_record, hedge, client_id))
 
         if client_id:
+            if idempotency_key and idempotency_cache.in_flight(idempotency_key):
+                return {"success": True, "message": "相同请求已在处理中"}
             # 🚀 核弹级修复：彻底弃用 background_tasks，改用 asyncio.create_task 抓取实体！
-            task = asyncio.create_task(run_adapter_task(adapter, request_params, client_id))
+            task = asyncio.create_task(run_adapter_task(generate, client_id))
             active_tasks[client_id] = task  # 登记入册，暴露给中断刀斧手
             return {"success": True, "message": "任务已交由后台引擎处理"}
         else:
-            result = await adapter.generate(request_params)
+            result = await generate()
             if not result.get("success"):
                 raise HTTPException(status_code=500, detail=result.get("error", "未知生成错误"))
             return result
@@ -272,9 +423,8 @@ async def interrupt_task(client_id: str):
     killed = False
 
     # 1. 第一重斩杀：发送物理显存释放指令
-    if client_id in active_adapters:
-        adapter = active_adapters[client_id]
-        physical_success = await adapter.interrupt()
+    if client_id in active_calls:
+        physical_success = await active_calls[client_id].interrupt()
         print(f"  👉 [中断步骤 1] 物理释放 GPU 显存: {'成功' if physical_success else '忽略'}")
 
     # 2. 第二重斩杀：直接杀死 Python 底层死等的网络连接 (拔网线)
@@ -1,6 +1,43 @@
 # backend/core/adapters/base.py
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+
+class CallContext:
+    """
+    单次生成调用的状态（中断标志、中断回调）。
+    适配器实例按 (Provider, Key, 配置版本) 池化复用，同一实例上可能同时跑多个调用，
+    所以凡是“这一次调用”的状态都放这里，不再挂在适配器实例上。
+    """
+    __slots__ = ("client_id", "interrupted", "_handlers")
+
+    def __init__(self, client_id: Optional[str] = None):
+        self.client_id = client_id
+        self.interrupted = False
+        self._handlers: List[Callable[[], Awaitable[bool]]] = []
+
+    def on_interrupt(self, handler: Callable[[], Awaitable[bool]]) -> Callable[[], None]:
+        """
+        适配器登记中断时要做的事（如通知物理机释放显存）；回调返回 True 表示真正中断成功。
+        返回注销函数：这次尝试结束（含失败转移到别的 Key）后必须注销，否则中断会打到已经不相干的机器上。
+        """
+        self._handlers.append(handler)
+
+        def unregister() -> None:
+            if handler in self._handlers:
+                self._handlers.remove(handler)
+        return unregister
+
+    async def interrupt(self) -> bool:
+        self.interrupted = True
+        success = False
+        for handler in list(self._handlers):
+            try:
+                success = await handler() or success
+            except Exception as e:
+                print(f"⚠️ [CallContext] 中断回调执行失败: {e}")
+        return success
+
 
 class BaseAdapter(ABC):
     @abstractmethod
@@ -24,5 +61,6 @@ class BaseAdapter(ABC):
         """
         尝试物理级中断当前正在运行的任务。
         默认返回 False，具体的引擎适配器需重写此方法。
+        池化的适配器改为在 generate 里向 CallContext 登记中断回调，按调用中断。
         """
         return False
\ No newline at end of file
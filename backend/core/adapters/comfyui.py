@@ -5,8 +5,8 @@ import json
 import base64
 import uuid
 import urllib.parse
-from typing import Dict, Any
-from .base import BaseAdapter
+from typing import Dict, Any, Optional
+from .base import BaseAdapter, CallContext
 from backend.core.registry import ProviderRegistry
 from backend.models.provider import Provider
 from backend.models.api_key import APIKey
@@ -18,24 +18,33 @@ class ComfyUIAdapter(BaseAdapter):
     """
     大一统的 ComfyUI 物理引擎适配器
     设计哲学：绝对的配置驱动。页面配置了什么 URL，就请求什么 URL。不做任何硬编码兜底。
+    🌟 实例可池化复用：网关地址在构造时算好，单次调用的中断状态放在 CallContext
     """
+    poolable = True
 
     def __init__(self, provider: Provider, api_key: APIKey = None):
         self.provider = provider
         self.api_key = api_key
-        # 🌟 新增：追踪状态与网关地址，用于 interrupt 方法
-        self._is_interrupted = False
-        self._current_base_url = None
 
-    # 🌟 新增：真正的物理级释放 GPU 方法
-    async def interrupt(self) -> bool:
-        self._is_interrupted = True
-        if not self._current_base_url:
-            return False
+        base_url = None
+        if self.api_key and self.api_key.base_url:
+            base_url = self.api_key.base_url
+        elif self.provider and self.provider.default_base_url:
+            base_url = self.provider.default_base_url
+
+        self.base_url: Optional[str] = None
+        if base_url:
+            actual_base_url = str(base_url).strip().rstrip('/')
+            api_key_value = self.api_key.key if self.api_key else ""
+            if "runninghub" in actual_base_url.lower() and api_key_value and not actual_base_url.endswith(api_key_value):
+                actual_base_url = f"{actual_base_url}/{api_key_value}"
+            self.base_url = actual_base_url
 
+    # 🌟 新增：真正的物理级释放 GPU 方法
+    async def _interrupt_call(self) -> bool:
         try:
             # 向局域网或云端物理机发送真实的 /interrupt 请求
-            interrupt_url = f"{self._current_base_url}/interrupt"
+            interrupt_url = f"{self.base_url}/interrupt"
             print(f"🛑 [ComfyUI Engine] 正在强行中断显存计算: {interrupt_url}")
             async with httpx.AsyncClient() as client:
                 res = await client.post(interrupt_url, timeout=5.0)
@@ -44,7 +53,16 @@ class ComfyUIAdapter(BaseAdapter):
             print(f"⚠️ [ComfyUI Engine] 物理机释放指令发送失败: {e}")
             return False
 
-    async def generate(self, request_params: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate(self, request_params: Dict[str, Any], ctx: Optional[CallContext] = None) -> Dict[str, Any]:
+        # 🌟 关键：每次调用独立的中断状态，登记物理中断回调，确立战线；调用结束即注销
+        ctx = ctx or CallContext(request_params.get("client_id"))
+        unregister = ctx.on_interrupt(self._interrupt_call)
+        try:
+            return await self._generate(request_params, ctx)
+        finally:
+            unregister()
+
+    async def _generate(self, request_params: Dict[str, Any], ctx: CallContext) -> Dict[str, Any]:
         prompt = request_params.get("prompt")
         req_type = request_params.get("type", "image")
         client_id = request_params.get("client_id")
@@ -53,30 +71,15 @@ class ComfyUIAdapter(BaseAdapter):
             if client_id:
                 await manager.send_message({"type": "status", "message": text}, client_id)
 
-        base_url = None
-        if self.api_key and self.api_key.base_url:
-            base_url = self.api_key.base_url
-        elif self.provider and self.provider.default_base_url:
-            base_url = self.provider.default_base_url
-
-        if not base_url:
+        if not self.base_url:
             error_msg = f"未配置算力网关！请前往 [凭证管理] 页面正确填写 Base URL。"
             await notify(f"❌ 启动失败: {error_msg}")
             return {"success": False, "error": error_msg}
 
-        actual_base_url = str(base_url).strip().rstrip('/')
-        api_key_value = self.api_key.key if self.api_key else ""
-
-        if "runninghub" in actual_base_url.lower() and api_key_value and not actual_base_url.endswith(api_key_value):
-            actual_base_url = f"{actual_base_url}/{api_key_value}"
-
+        actual_base_url = self.base_url
         prompt_url = f"{actual_base_url}/prompt"
         history_url = f"{actual_base_url}/history"
 
-        # 🌟 关键：在此处登记当前网关地址，并重置地雷状态，确立战线
-        self._current_base_url = actual_base_url
-        self._is_interrupted = False
-
         try:
             parsed_prompt = json.loads(prompt) if isinstance(prompt, str) else prompt
             actual_workflow = parsed_prompt.get("workflow_json", parsed_prompt) if isinstance(parsed_prompt,
@@ -94,7 +97,7 @@ class ComfyUIAdapter(BaseAdapter):
 
             try:
                 # 🌟 提交前第一道防线检查
-                if self._is_interrupted:
+                if ctx.interrupted:
                     return {"success": False, "error": "任务被手动中断"}
 
                 print(f"🚀 [ComfyUI Engine] 提交任务至: {prompt_url}")
@@ -125,14 +128,14 @@ class ComfyUIAdapter(BaseAdapter):
 
                 for i in range(1200):
                     # 🌟 循环防线 1：睡前检查
-                    if self._is_interrupted:
+                    if ctx.interrupted:
                         await notify("🛑 已拦截！正在强行释放 GPU...")
                         return {"success": False, "error": "任务被手动中断 (显存已释放)"}
 
                     await asyncio.sleep(5)
 
                     # 🌟 循环防线 2：睡醒检查（防止在 sleep 的这 5 秒内被点击中止）
-                    if self._is_interrupted:
+                    if ctx.interrupted:
                         await notify("🛑 已拦截！正在强行释放 GPU...")
                         return {"success": False, "error": "任务被手动中断 (显存已释放)"}
 
@@ -1,5 +1,10 @@
 # backend/core/adapters/factory.py
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
 from backend.core.registry import ProviderRegistry
+from backend.core.config_cache import config_cache, ConfigSnapshot
 from backend.models.provider import Provider
 from sqlalchemy.orm import Session
 
@@ -7,15 +12,87 @@ from sqlalchemy.orm import Session
 import backend.core.adapters.universal_proxy
 import backend.core.adapters.comfyui
 
+# 池里最多保留这么多个适配器实例（按最近使用淘汰）
+ADAPTER_POOL_SIZE = 256
+
+
+class AdapterPool:
+    """
+    适配器实例池，按 (Provider, Key, 两边的配置快照版本) 复用。
+    配置一改快照版本就变，旧实例自然不再命中，并在同一对 (Provider, Key) 放入新实例时被清掉。
+    """
+
+    def __init__(self, max_size: int = ADAPTER_POOL_SIZE):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._adapters: "OrderedDict[Tuple, Any]" = OrderedDict()
+
+    def get(self, adapter_class, provider_info: ConfigSnapshot, key_info: Optional[ConfigSnapshot]):
+        key_id = key_info.id if key_info is not None else None
+        key_version = key_info.version if key_info is not None else None
+        pool_key = (provider_info.id, key_id, provider_info.version, key_version)
+        with self._lock:
+            adapter = self._adapters.get(pool_key)
+            if adapter is not None:
+                self._adapters.move_to_end(pool_key)
+                return adapter
+
+        adapter = adapter_class(provider=provider_info, api_key=key_info)
+        with self._lock:
+            stale = [k for k in self._adapters if k[:2] == pool_key[:2] and k != pool_key]
+            for k in stale:
+                del self._adapters[k]
+            adapter = self._adapters.setdefault(pool_key, adapter)
+            while len(self._adapters) > self._max_size:
+                self._adapters.popitem(last=False)
+        return adapter
+
+    def clear(self) -> None:
+        with self._lock:
+            self._adapters.clear()
+
+    def __len__(self) -> int:
+        return len(self._adapters)
+
+
+adapter_pool = AdapterPool()
+
+
 class AdapterFactory:
     @classmethod
     def get_adapter(cls, provider_id: str, db: Session):
-        # 1. 先从数据库获取厂商配置，这是“配置驱动”的核心！
-        provider_info = db.query(Provider).filter(Provider.id == provider_id).first()
+        # 1. 先取厂商配置（走内存快照，未命中才查库），这是“配置驱动”的核心！
+        provider_info = config_cache.provider(db, provider_id)
 
         if not provider_info:
             raise ValueError(f"数据库中未找到供应商 [{provider_id}] 的配置")
 
+        return cls.adapter_class_for(provider_info)
+
+    @classmethod
+    def adapter_class_for(cls, provider_info):
+        """配置快照按版本缓存解析结果；直接传 ORM 记录时照常现场解析"""
+        if isinstance(provider_info, ConfigSnapshot):
+            return config_cache.adapter_class(provider_info, lambda: cls.resolve_adapter(provider_info))
+        return cls.resolve_adapter(provider_info)
+
+    @classmethod
+    def acquire(cls, provider_info, key_info=None):
+        """
+        拿一个可直接调用的适配器实例：配置快照 + 可池化的适配器走实例池，否则现场构造。
+        池化实例会被并发调用共享，调用方需要为每次调用传入自己的 CallContext。
+        """
+        adapter_class = cls.adapter_class_for(provider_info)
+        snapshots = isinstance(provider_info, ConfigSnapshot) and (key_info is None or isinstance(key_info, ConfigSnapshot))
+        if snapshots and getattr(adapter_class, "poolable", False):
+            return adapter_pool.get(adapter_class, provider_info, key_info)
+        return adapter_class(provider=provider_info, api_key=key_info)
+
+    @classmethod
+    def resolve_adapter(cls, provider_info: Provider):
+        """根据已查出的 Provider 配置选适配器类；异步路由自己查库后直接调用，不再需要同步会话"""
+        provider_id = provider_info.id
+
         # 🌟 2. 按 service_type 智能路由 (彻底解绑 ID)
         # 只要类型是 comfyui，无论 ID 叫什么，都走物理引擎！
         if provider_info.service_type == "comfyui":
@@ -29,4 +106,4 @@ class AdapterFactory:
         try:
             return ProviderRegistry.get_adapter(provider_id)
         except ValueError:
-            raise ValueError(f"无法为供应商 [{provider_id}] (类型: {provider_info.service_type}) 找到合适的算力适配器")
\ No newline at end of file
+            raise ValueError(f"无法为供应商 [{provider_id}] (类型: {provider_info.service_type}) 找到合适的算力适配器")
@@ -1,11 +1,42 @@
 # backend/core/adapters/universal_proxy.py
 import httpx
 import asyncio
-from typing import Dict, Any, Union
-from .base import BaseAdapter
+from typing import Dict, Any, Optional, Union
+from .base import BaseAdapter, CallContext
 from backend.core.registry import ProviderRegistry
 from backend.models.provider import Provider
 from backend.models.api_key import APIKey
+from backend.core.usage import DEFAULT_USAGE_PATHS
+
+# 换一个 Key 可能成功的 HTTP 状态：鉴权失效、超时、限流、上游故障
+RETRYABLE_STATUS = {401, 403, 408, 429, 500, 502, 503, 504}
+# 请求还没送到上游的网络错误，重发是安全的
+SAFE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# 异步任务轮询的默认策略，可在路由 DSL 里用 poll_interval_seconds / poll_max_attempts 覆盖
+DEFAULT_POLL_INTERVAL_SECONDS = 10
+DEFAULT_POLL_MAX_ATTEMPTS = 60
+
+# 没有配置路由时按任务类型兜底的 OpenAI 后缀
+DEFAULT_ENDPOINT_SUFFIXES = {
+    "chat": "/chat/completions", "vision": "/chat/completions",
+    "text_to_image": "/images/generations", "image_to_image": "/images/generations",
+    "text_to_video": "/videos/generations", "image_to_video": "/videos/generations"
+}
+
+
+class ResolvedRoute:
+    """某个任务类型解析好的路由：URL、合并后的请求头、轮询策略，适配器构造后只算一次"""
+    __slots__ = ("config", "endpoint", "headers", "poll_url", "poll_interval", "poll_max_attempts")
+
+    def __init__(self, config: Union[str, Dict[str, Any]], endpoint: str, headers: Dict[str, str]):
+        self.config = config
+        self.endpoint = endpoint
+        self.headers = headers
+        dsl = config if isinstance(config, dict) else {}
+        self.poll_url = dsl.get("poll_url")
+        self.poll_interval = dsl.get("poll_interval_seconds", DEFAULT_POLL_INTERVAL_SECONDS)
+        self.poll_max_attempts = dsl.get("poll_max_attempts", DEFAULT_POLL_MAX_ATTEMPTS)
 
 
 @ProviderRegistry.register_adapter("universal_openai")
@@ -13,7 +44,9 @@ class UniversalProxyAdapter(BaseAdapter):
     """
     极致纯净版配置驱动引擎 (Pure Config-Driven)
     🌟 支持模态级的局部 Header 注入，完美解决大厂同步/异步混合接口冲突！
+    🌟 实例可池化复用：鉴权头、网关地址、各任务类型的路由在构造时算好，单次调用的状态放在 CallContext
     """
+    poolable = True
 
     def __init__(self, provider: Provider, api_key: APIKey = None):
         self.provider = provider
@@ -22,17 +55,17 @@ class UniversalProxyAdapter(BaseAdapter):
             self.api_key.base_url if self.api_key and self.api_key.base_url else self.provider.default_base_url)
         if self.base_url and self.base_url.endswith("/"):
             self.base_url = self.base_url[:-1]
-            # 🌟 1. 新增：本地逻辑中断标志位
-            self._is_interrupted = False
-
-        # 🌟 2. 新增：物理/逻辑中断接口
-    async def interrupt(self) -> bool:
-            """
-            云端 API 中断逻辑：触发本地协程自杀，切断长轮询
-            """
-            self._is_interrupted = True
-            print(f"🛑 [Universal Proxy] 收到中断指令，即将切断 Provider [{self.provider.id}] 的 HTTP 等待与轮询链...")
-            return True
+        self.headers = self._build_headers()
+        self._routes: Dict[str, ResolvedRoute] = {
+            req_type: self._resolve_route(req_type) for req_type in DEFAULT_ENDPOINT_SUFFIXES
+        }
+
+    async def _interrupt_call(self) -> bool:
+        """
+        云端 API 中断逻辑：触发本地协程自杀，切断长轮询
+        """
+        print(f"🛑 [Universal Proxy] 收到中断指令，即将切断 Provider [{self.provider.id}] 的 HTTP 等待与轮询链...")
+        return True
 
     def _build_headers(self) -> Dict[str, str]:
         headers = {"Content-Type": "application/json"}
@@ -59,6 +92,29 @@ class UniversalProxyAdapter(BaseAdapter):
 
         return ""
 
+    def _resolve_route(self, req_type: str) -> ResolvedRoute:
+        route_config = self._get_route_config(req_type)
+        headers = self.headers
+        # 🌟 核心修复点：如果有路由级别的局部 Header，在这里覆盖注入！
+        if isinstance(route_config, dict) and "headers" in route_config:
+            headers = {**headers, **route_config["headers"]}
+
+        endpoint_suffix = route_config.get("url", "") if isinstance(route_config, dict) else str(route_config)
+
+        # 智能兜底 OpenAI 后缀
+        if not endpoint_suffix or endpoint_suffix.strip() in ["", "/"]:
+            endpoint_suffix = DEFAULT_ENDPOINT_SUFFIXES.get(req_type, "/chat/completions")
+
+        endpoint = endpoint_suffix if endpoint_suffix.startswith("http") else f"{self.base_url}{endpoint_suffix}"
+        return ResolvedRoute(route_config, endpoint, headers)
+
+    def route(self, req_type: str) -> ResolvedRoute:
+        route = self._routes.get(req_type)
+        if route is None:
+            # 非标准任务类型按需解析一次后记住
+            route = self._routes[req_type] = self._resolve_route(req_type)
+        return route
+
     def _render_template(self, template: Any, params: Dict[str, Any]) -> Any:
         if isinstance(template, dict):
             rendered = {}
@@ -131,10 +187,41 @@ class UniversalProxyAdapter(BaseAdapter):
                 return None
         return val
 
-    async def generate(self, request_params: Dict[str, Any]) -> Dict[str, Any]:
-        # 🌟 每次全新运行前，重置标志位
-        self._is_interrupted = False
-
+    def _extract_usage(self, data: Any, route_config: Union[str, Dict[str, Any]], req_type: str,
+                       response_bytes: int) -> Dict[str, int]:
+        """按 DSL 的 usage_extractors（缺省走 DEFAULT_USAGE_PATHS）提取本次调用的用量"""
+        custom = route_config.get("usage_extractors", {}) if isinstance(route_config, dict) else {}
+        usage = {"response_bytes": response_bytes}
+        if not isinstance(data, dict):
+            return usage
+        for field, paths in DEFAULT_USAGE_PATHS.items():
+            candidates = [custom[field]] if field in custom else paths
+            for path in candidates:
+                val = self._extract_value_by_path(data, path)
+                if isinstance(val, (int, float)) and not isinstance(val, bool):
+                    usage[field] = int(val)
+                    break
+        if "total_tokens" not in usage and ("prompt_tokens" in usage or "completion_tokens" in usage):
+            usage["total_tokens"] = usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+
+        # 没有显式用量时，按返回的产物个数计
+        if "image" in req_type and "image_units" not in usage:
+            items = data.get("data") if isinstance(data.get("data"), list) else (data.get("output") or {}).get("results")
+            usage["image_units"] = len(items) if isinstance(items, list) and items else 1
+        if "video" in req_type and "video_units" not in usage:
+            usage["video_units"] = 1
+        return usage
+
+    async def generate(self, request_params: Dict[str, Any], ctx: Optional[CallContext] = None) -> Dict[str, Any]:
+        # 🌟 每次调用一个独立的上下文，同一实例上的并发调用互不干扰
+        ctx = ctx or CallContext()
+        unregister = ctx.on_interrupt(self._interrupt_call)
+        try:
+            return await self._generate(request_params, ctx)
+        finally:
+            unregister()
+
+    async def _generate(self, request_params: Dict[str, Any], ctx: CallContext) -> Dict[str, Any]:
         if not self.base_url:
             return {"success": False, "error": f"Provider [{self.provider.id}] 未配置基础网关"}
 
@@ -151,38 +238,24 @@ class UniversalProxyAdapter(BaseAdapter):
                 request_params["image_url"] = f"data:{mime};base64,{b64}"
 
         req_type = request_params.get("type", "text")
-        route_config = self._get_route_config(req_type)
-        headers = self._build_headers()
-
-        # 🌟 核心修复点：如果有路由级别的局部 Header，在这里覆盖注入！
-        if isinstance(route_config, dict) and "headers" in route_config:
-            headers.update(route_config["headers"])
-
-        endpoint_suffix = route_config.get("url", "") if isinstance(route_config, dict) else str(route_config)
-
-        # 智能兜底 OpenAI 后缀
-        if not endpoint_suffix or endpoint_suffix.strip() in ["", "/"]:
-            defaults = {
-                "chat": "/chat/completions", "vision": "/chat/completions",
-                "text_to_image": "/images/generations", "image_to_image": "/images/generations",
-                "text_to_video": "/videos/generations", "image_to_video": "/videos/generations"
-            }
-            endpoint_suffix = defaults.get(req_type, "/chat/completions")
-
-        endpoint = endpoint_suffix if endpoint_suffix.startswith("http") else f"{self.base_url}{endpoint_suffix}"
+        route = self.route(req_type)
+        route_config, headers, endpoint = route.config, route.headers, route.endpoint
         payload = self._build_payload(request_params, req_type, route_config)
         is_image_or_video = req_type in ["image", "video", "text_to_image", "image_to_image", "text_to_video",
                                          "image_to_video"]
 
         # 🌟 中断防线 1：发出首次请求前的最后检查
-        if self._is_interrupted:
+        if ctx.interrupted:
             return {"success": False, "error": "任务被手动中断"}
 
 
+        # 拿到上游 task_id 后任务已被受理，之后的失败不能再换 Key 重发（会重复扣费）
+        submitted = False
         async with httpx.AsyncClient(timeout=300.0) as client:
             try:
                 # ====== 这里是我们开始与云端通信 ======
                 response = await client.post(endpoint, headers=headers, json=payload)
+                response_bytes = len(response.content)
                 response.raise_for_status()
                 data = response.json()
 
@@ -201,27 +274,27 @@ class UniversalProxyAdapter(BaseAdapter):
 
                 # ====== 🌟 核心拦截区：漫长的异步轮询 ======
                 if task_id and status in ["pending", "processing", "submitted", "in_progress", "queued"]:
-                    poll_url_template = route_config.get("poll_url") if isinstance(route_config, dict) else None
-                    if poll_url_template:
-                        poll_endpoint = poll_url_template.replace("{{task_id}}", str(task_id))
+                    submitted = True
+                    if route.poll_url:
+                        poll_endpoint = route.poll_url.replace("{{task_id}}", str(task_id))
                     else:
                         poll_endpoint = f"{endpoint}/{task_id}"
 
-                    max_attempts = 60
-                    for _ in range(max_attempts):
+                    for _ in range(route.poll_max_attempts):
                         # 🌟 中断防线 2：进入长睡眠前检查
-                        if self._is_interrupted:
+                        if ctx.interrupted:
                             print(f"🛑 [Universal Proxy] 已强行切断任务 {task_id} 的轮询。")
                             return {"success": False, "error": "任务被手动中断 (云端渲染可能继续，但本地连接已释放)"}
 
-                        await asyncio.sleep(10)
+                        await asyncio.sleep(route.poll_interval)
 
                         # 🌟 中断防线 3：睡醒之后再次检查，防止在 sleep 期间被用户点击中断
-                        if self._is_interrupted:
+                        if ctx.interrupted:
                             print(f"🛑 [Universal Proxy] 已强行切断任务 {task_id} 的轮询。")
                             return {"success": False, "error": "任务被手动中断 (云端渲染可能继续，但本地连接已释放)"}
 
                         poll_resp = await client.get(poll_endpoint, headers=headers)
+                        response_bytes += len(poll_resp.content)
                         poll_resp.raise_for_status()
                         poll_data = poll_resp.json()
 
@@ -283,10 +356,20 @@ class UniversalProxyAdapter(BaseAdapter):
                         elif len(content) > 200 and re.match(r'^[A-Za-z0-9+/=\s]+$', content[:100]):
                             content = f"data:image/png;base64,{content.strip()}"
 
-                return {"success": True, "type": req_type, "content": content, "raw_response": data}
+                return {"success": True, "type": req_type, "content": content, "raw_response": data,
+                        "usage": self._extract_usage(data, route_config, req_type, response_bytes)}
 
             except httpx.HTTPStatusError as e:
+                code = e.response.status_code
                 return {"success": False,
-                        "error": f"HTTP {e.response.status_code} 拒绝访问 [{endpoint}]: {e.response.text}"}
+                        "error": f"HTTP {code} 拒绝访问 [{endpoint}]: {e.response.text}",
+                        "status_code": code,
+                        "usage": {"response_bytes": len(e.response.content)},
+                        "retryable": not submitted and code in RETRYABLE_STATUS}
             except Exception as e:
-                return {"success": False, "error": f"请求异常 [{endpoint}]: {str(e)}"}
\ No newline at end of file
+                # 读超时等情况上游可能已经在处理，只有对话类请求才值得重发
+                retryable = not submitted and (
+                    isinstance(e, SAFE_TRANSPORT_ERRORS)
+                    or (isinstance(e, httpx.TransportError) and req_type in ("chat", "vision", "text"))
+                )
+                return {"success": False, "error": f"请求异常 [{endpoint}]: {str(e)}", "retryable": retryable}
\ No newline at end of file
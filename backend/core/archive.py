@@ -0,0 +1,478 @@
+# backend/core/archive.py
+import io
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import hashlib
+import tarfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..models.asset import Asset
+from ..models.project import Project
+from ..models.asset_lineage import AssetLineage
+from ..models.media_blob import MediaBlob
+from ..models.asset_version import AssetVersionHead
+from .asset_versions import resolve_asset_data, register_version_head, find_version_root
+from .lineage import record_lineage
+from .tag_index import sync_entity_tags, ENTITY_ASSET, ENTITY_PROJECT
+from .phash import index_image_asset
+
+ARCHIVE_FORMAT = "comfyforge-archive"
+ARCHIVE_VERSION = 1
+
+IMAGES_DIR = "data/assets/images"
+VIDEOS_DIR = "data/assets/videos"
+TEMP_DIR = "data/temp"
+VIDEO_EXTS = {".mp4", ".webm", ".mov", ".avi", ".mkv", ".gif"}
+
+CHUNK_SIZE = 1 << 20          # 文件读写与哈希的分块大小
+EXPORT_BATCH_SIZE = 200       # 导出时每批从数据库取多少条资产
+IMPORT_BATCH_SIZE = 200       # 导入时每多少条资产提交一次事务
+STREAM_QUEUE_SIZE = 64        # 导出流的背压队列长度（tarfile 每块约 10KB）
+
+
+# ================= 内容哈希 =================
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_sha_for_path(db: Session, path: str) -> str:
+    """取本地文件的 sha256：size + mtime 未变时直接命中 MediaBlob 缓存，否则重算并登记"""
+    st = os.stat(path)
+    row = db.query(MediaBlob).filter(MediaBlob.file_path == path).first()
+    if row and row.size == st.st_size and row.mtime == st.st_mtime:
+        return row.sha256
+
+    sha = file_sha256(path)
+    if row and row.sha256 != sha:
+        db.delete(row)
+        db.flush()
+    existing = db.query(MediaBlob).filter(MediaBlob.sha256 == sha).first()
+    if existing:
+        # 同内容已登记在别的路径上：旧路径失效时改指向当前文件
+        if existing.file_path != path and not os.path.isfile(existing.file_path):
+            existing.file_path = path
+        if existing.file_path == path:
+            existing.size, existing.mtime = st.st_size, st.st_mtime
+    else:
+        db.add(MediaBlob(sha256=sha, file_path=path, size=st.st_size, mtime=st.st_mtime))
+        db.flush()  # 会话不自动 flush：同一路径紧接着再查时要能查到这条登记
+    return sha
+
+
+def _local_media_paths(asset: Asset, data: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """资产引用的本地媒体文件：[(字段, 路径)]，字段为 data.file_path / file_path / thumbnail"""
+    refs = []
+    candidates = [
+        ("data.file_path", data.get("file_path") if isinstance(data, dict) else None),
+        ("file_path", asset.file_path),
+        ("thumbnail", asset.thumbnail),
+    ]
+    for field, path in candidates:
+        if isinstance(path, str) and path and not path.startswith(("http", "data:")) and os.path.isfile(path):
+            refs.append((field, path))
+    return refs
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+# ================= 导出：后台线程写 tar，生成器按块吐出 =================
+
+class _QueueWriter(io.RawIOBase):
+    """tarfile 的输出端：把写入的字节块塞进有界队列，消费端慢时自然形成背压"""
+
+    def __init__(self, q: "queue.Queue", cancelled: threading.Event):
+        self._q = q
+        self._cancelled = cancelled
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        while data:
+            try:
+                self._q.put(data, timeout=1.0)
+                break
+            except queue.Full:
+                if self._cancelled.is_set():
+                    raise IOError("客户端已断开，导出中止")
+        return len(b)
+
+
+def _add_json(tar: tarfile.TarFile, name: str, payload: Any) -> None:
+    raw = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    info = tarfile.TarInfo(name)
+    info.size = len(raw)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(raw))
+
+
+def _write_archive(tar: tarfile.TarFile, db: Session, project_ids: List[int], include_global: bool) -> None:
+    projects = db.query(Project).filter(Project.id.in_(project_ids)).all() if project_ids else []
+    scope = []
+    if project_ids:
+        scope.append(Asset.project_id.in_(project_ids))
+    if include_global:
+        scope.append(Asset.project_id.is_(None))
+    asset_ids = [row.id for row in db.query(Asset.id).filter(or_(*scope)).order_by(Asset.id).all()] if scope else []
+    exported = set(asset_ids)
+
+    _add_json(tar, "manifest.json", {
+        "format": ARCHIVE_FORMAT,
+        "version": ARCHIVE_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "project_ids": [p.id for p in projects],
+        "include_global": include_global,
+        "asset_count": len(asset_ids),
+    })
+    for p in projects:
+        _add_json(tar, f"projects/{p.id}.json", {
+            "id": p.id, "name": p.name, "description": p.description, "tags": p.tags or [],
+            "canvas_data": p.canvas_data or {},
+        })
+
+    written_media = set()
+    for start in range(0, len(asset_ids), EXPORT_BATCH_SIZE):
+        batch = asset_ids[start:start + EXPORT_BATCH_SIZE]
+        edges = db.query(AssetLineage).filter(AssetLineage.child_asset_id.in_(batch)).all()
+        parents_of: Dict[int, List[Dict[str, Any]]] = {}
+        for e in edges:
+            if e.parent_asset_id in exported:
+                parents_of.setdefault(e.child_asset_id, []).append(
+                    {"parent": e.parent_asset_id, "relation": e.relation})
+
+        for asset in db.query(Asset).filter(Asset.id.in_(batch)).order_by(Asset.id).all():
+            data = resolve_asset_data(db, asset)
+            media = {}
+            for field, path in _local_media_paths(asset, data):
+                sha = blob_sha_for_path(db, path)
+                arcname = f"media/{sha}{os.path.splitext(path)[1].lower()}"
+                if arcname not in written_media:
+                    # 媒体文件先于引用它的资产记录写出，导入端可以边读边落盘
+                    tar.add(path, arcname=arcname, recursive=False)
+                    written_media.add(arcname)
+                media[field] = arcname
+
+            _add_json(tar, f"assets/{asset.id}.json", {
+                "id": asset.id,
+                "type": asset.type,
+                "name": asset.name,
+                "description": asset.description,
+                "tags": asset.tags or [],
+                "data": data,
+                "file_path": asset.file_path,
+                "thumbnail": asset.thumbnail,
+                "version": asset.version,
+                "parent_id": asset.parent_id if asset.parent_id in exported else None,
+                "source_asset_ids": [i for i in (asset.source_asset_ids or []) if i in exported],
+                "project_id": asset.project_id,
+                "created_at": asset.created_at,
+                "media": media,
+                "lineage": parents_of.get(asset.id, []),
+            })
+        db.commit()  # 落盘本批新算出的文件哈希缓存
+
+
+def stream_archive(project_ids: List[int], include_global: bool = False, compress: bool = True) -> Iterator[bytes]:
+    """
+    流式导出归档：后台线程用 tarfile 流模式边查库边写，主线程从有界队列取块返回给客户端。
+    全程内存占用与队列长度成正比，与归档大小无关。
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    cancelled = threading.Event()
+    done = object()
+
+    def put(item) -> None:
+        # 与 _QueueWriter.write 一样带超时重试：客户端断开后队列不会再被消费，不能死等
+        while not cancelled.is_set():
+            try:
+                q.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def worker():
+        db = SessionLocal()
+        try:
+            mode = "w|gz" if compress else "w|"
+            with tarfile.open(fileobj=_QueueWriter(q, cancelled), mode=mode) as tar:
+                _write_archive(tar, db, project_ids, include_global)
+        except Exception as e:
+            if not cancelled.is_set():
+                print(f"❌ [Archive] 导出失败: {e}")
+                put(e)
+        finally:
+            db.close()
+            put(done)
+
+    threading.Thread(target=worker, name="archive-export", daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+
+# ================= 导入：流式读 tar，按内容哈希去重，分批提交 =================
+
+def _local_copy_with_sha(db: Session, sha: str, size: int, target_dir: str,
+                        size_index: Dict[str, Dict[int, List[str]]]) -> Optional[str]:
+    """资产目录里已有同内容的文件（未必登记过 MediaBlob）时返回其路径；目录按文件大小建一次索引，只哈希同大小的候选"""
+    by_size = size_index.get(target_dir)
+    if by_size is None:
+        by_size = size_index[target_dir] = {}
+        if os.path.isdir(target_dir):
+            for entry in os.scandir(target_dir):
+                if entry.is_file():
+                    by_size.setdefault(entry.stat().st_size, []).append(entry.path.replace("\\", "/"))
+    for path in by_size.get(size, []):
+        if os.path.isfile(path) and blob_sha_for_path(db, path) == sha:
+            return path
+    return None
+
+
+def _store_media(db: Session, src, arcname: str, stats: Dict[str, int],
+                 size_index: Optional[Dict[str, Dict[int, List[str]]]] = None) -> str:
+    """边读边哈希写入临时文件；同内容已存在（登记过的或资产目录里现成的）则复用原文件，否则移入资产目录"""
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    ext = os.path.splitext(arcname)[1].lower()
+    if not ext.replace(".", "").isalnum():
+        ext = ""
+    tmp_path = os.path.join(TEMP_DIR, f"import_{uuid.uuid4().hex}{ext}")
+    digest = hashlib.sha256()
+    size = 0
+    with open(tmp_path, "wb") as out:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    sha = digest.hexdigest()
+    target_dir = VIDEOS_DIR if ext in VIDEO_EXTS else IMAGES_DIR
+    size_index = {} if size_index is None else size_index
+
+    reuse = None
+    existing = db.query(MediaBlob).filter(MediaBlob.sha256 == sha).first()
+    # 登记的文件可能已被改写：按 size + mtime 校验一次（变了会重算哈希）
+    if existing and os.path.isfile(existing.file_path) and blob_sha_for_path(db, existing.file_path) == sha:
+        reuse = existing.file_path
+    else:
+        reuse = _local_copy_with_sha(db, sha, size, target_dir, size_index)
+    if reuse:
+        os.remove(tmp_path)
+        stats["media_deduped"] += 1
+        return reuse
+
+    os.makedirs(target_dir, exist_ok=True)
+    final_path = os.path.join(target_dir, f"{uuid.uuid4().hex}{ext}").replace("\\", "/")
+    shutil.move(tmp_path, final_path)
+    st = os.stat(final_path)
+    size_index.setdefault(target_dir, {}).setdefault(size, []).append(final_path)
+    # 上面的校验可能删改过登记，重新取一次
+    existing = db.query(MediaBlob).filter(MediaBlob.sha256 == sha).first()
+    if existing:
+        existing.file_path, existing.size, existing.mtime = final_path, st.st_size, st.st_mtime
+    else:
+        db.add(MediaBlob(sha256=sha, file_path=final_path, size=size, mtime=st.st_mtime))
+        db.flush()
+    stats["media_written"] += 1
+    stats["bytes_written"] += size
+    return final_path
+
+
+def _find_duplicate(db: Session, asset_type: str, name: str, data: Dict[str, Any],
+                    file_path: Optional[str]) -> Optional[int]:
+    """按内容判重：媒体资产看是否已有同类型资产引用同一文件，其余按 (类型, 名称, data) 比较"""
+    if file_path:
+        row = db.query(Asset.id).filter(
+            Asset.type == asset_type,
+            or_(Asset.file_path == file_path, func.json_extract(Asset.data, "$.file_path") == file_path),
+        ).first()
+        return row.id if row else None
+
+    target = _canonical(data)
+    for candidate in db.query(Asset).filter(Asset.type == asset_type, Asset.name == name).all():
+        if _canonical(resolve_asset_data(db, candidate)) == target:
+            return candidate.id
+    return None
+
+
+def _remap_canvas(value: Any, id_map: Dict[int, int], path_map: Dict[str, str], path_dirs: List[str]) -> Any:
+    """画布里嵌着资产快照（node.data.asset）与媒体路径：资产 ID 按 id_map、文件路径（含 URL 形式）按 path_map 换成导入后的"""
+    if isinstance(value, dict):
+        remapped = {k: _remap_canvas(v, id_map, path_map, path_dirs) for k, v in value.items()}
+        asset = remapped.get("asset")
+        if isinstance(asset, dict) and isinstance(asset.get("id"), int) and asset["id"] in id_map:
+            asset["id"] = id_map[asset["id"]]
+        if isinstance(remapped.get("asset_id"), int) and remapped["asset_id"] in id_map:
+            remapped["asset_id"] = id_map[remapped["asset_id"]]
+        return remapped
+    if isinstance(value, list):
+        return [_remap_canvas(v, id_map, path_map, path_dirs) for v in value]
+    if isinstance(value, str) and path_map:
+        if value in path_map:
+            return path_map[value]
+        for d in path_dirs:
+            idx = value.find(d)
+            if idx > 0 and value[idx:] in path_map:
+                return value[:idx] + path_map[value[idx:]]
+    return value
+
+
+def import_archive(fileobj, db: Session) -> Dict[str, Any]:
+    """
+    从文件对象流式导入归档（tarfile 'r|*' 顺序读取，无需 seek，自动识别 gzip）。
+    资产 ID / 项目 ID 全部重新分配，版本链、来源与血缘边按映射表重建。
+    """
+    stats = {"projects": 0, "assets_created": 0, "assets_deduped": 0,
+             "media_written": 0, "media_deduped": 0, "bytes_written": 0}
+    media_map: Dict[str, str] = {}
+    size_index: Dict[str, Dict[int, List[str]]] = {}
+    project_map: Dict[int, int] = {}
+    id_map: Dict[int, int] = {}
+    path_map: Dict[str, str] = {}
+    created: List[Tuple[int, Dict[str, Any]]] = []
+    canvases: List[Tuple[int, Any]] = []
+    pending_commit = 0
+
+    with tarfile.open(fileobj=fileobj, mode="r|*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = member.name
+            src = tar.extractfile(member)
+
+            if name == "manifest.json":
+                manifest = json.loads(src.read().decode("utf-8"))
+                if manifest.get("format") != ARCHIVE_FORMAT:
+                    raise ValueError("不是 ComfyForge 导出的归档文件")
+                if manifest.get("version", 0) > ARCHIVE_VERSION:
+                    raise ValueError(f"归档版本 {manifest.get('version')} 高于当前支持的 {ARCHIVE_VERSION}")
+
+            elif name.startswith("projects/"):
+                record = json.loads(src.read().decode("utf-8"))
+                # 画布引用的资产 ID / 媒体路径要等资产都导入完才能映射，先建空画布，第二遍再写
+                project = Project(name=record["name"], description=record.get("description", ""),
+                                  tags=record.get("tags", []), canvas_data={})
+                db.add(project)
+                db.flush()
+                sync_entity_tags(db, ENTITY_PROJECT, project.id, project.tags)
+                project_map[record["id"]] = project.id
+                canvases.append((project.id, record.get("canvas_data") or {}))
+                stats["projects"] += 1
+
+            elif name.startswith("media/"):
+                media_map[name] = _store_media(db, src, name, stats, size_index)
+
+            elif name.startswith("assets/"):
+                record = json.loads(src.read().decode("utf-8"))
+                data = record.get("data") or {}
+                file_path = record.get("file_path")
+                thumbnail = record.get("thumbnail")
+                for field, arcname in (record.get("media") or {}).items():
+                    local = media_map.get(arcname)
+                    if not local:
+                        continue
+                    if field == "data.file_path" and isinstance(data, dict):
+                        original = data.get("file_path")
+                        data["file_path"] = local
+                    elif field == "file_path":
+                        original, file_path = file_path, local
+                    elif field == "thumbnail":
+                        original, thumbnail = thumbnail, local
+                    else:
+                        continue
+                    if isinstance(original, str) and original:
+                        path_map[original] = local
+                media_path = data.get("file_path") if isinstance(data, dict) else None
+
+                duplicate_id = _find_duplicate(db, record["type"], record["name"], data, media_path or file_path)
+                if duplicate_id:
+                    id_map[record["id"]] = duplicate_id
+                    stats["assets_deduped"] += 1
+                    continue
+
+                asset = Asset(
+                    type=record["type"],
+                    name=record["name"],
+                    description=record.get("description", ""),
+                    tags=record.get("tags", []),
+                    data=data,
+                    thumbnail=thumbnail,
+                    version=record.get("version", 1),
+                    file_path=file_path,
+                    project_id=project_map.get(record.get("project_id")),
+                    source_asset_ids=[],
+                )
+                db.add(asset)
+                db.flush()
+                sync_entity_tags(db, ENTITY_ASSET, asset.id, asset.tags)
+                index_image_asset(db, asset)
+                id_map[record["id"]] = asset.id
+                created.append((asset.id, record))
+                stats["assets_created"] += 1
+                pending_commit += 1
+
+            if pending_commit >= IMPORT_BATCH_SIZE:
+                db.commit()
+                pending_commit = 0
+    db.commit()
+
+    # 第二遍：按 ID 映射重建版本链、来源与血缘边，并登记版本头
+    has_child = set()
+    for start in range(0, len(created), IMPORT_BATCH_SIZE):
+        for new_id, record in created[start:start + IMPORT_BATCH_SIZE]:
+            asset = db.query(Asset).filter(Asset.id == new_id).first()
+            asset.parent_id = id_map.get(record.get("parent_id"))
+            if asset.parent_id:
+                has_child.add(asset.parent_id)
+            asset.source_asset_ids = [id_map[i] for i in record.get("source_asset_ids", []) if i in id_map]
+            for edge in record.get("lineage", []):
+                parent_id = id_map.get(edge.get("parent"))
+                if parent_id:
+                    record_lineage(db, new_id, [parent_id], edge.get("relation", "source"))
+        db.commit()
+    for start in range(0, len(created), IMPORT_BATCH_SIZE):
+        for new_id, _ in created[start:start + IMPORT_BATCH_SIZE]:
+            if new_id in has_child:
+                continue
+            asset = db.query(Asset).filter(Asset.id == new_id).first()
+            root_id = find_version_root(db, asset)
+            if root_id == asset.id:
+                register_version_head(db, asset)
+            else:
+                # 父版本去重到了库里已有的资产时，它原来是链头：与 advance_version_head 一样先摘掉旧头
+                db.query(AssetVersionHead).filter(
+                    AssetVersionHead.head_asset_id == asset.parent_id).delete(synchronize_session=False)
+                db.add(AssetVersionHead(head_asset_id=asset.id, root_asset_id=root_id))
+        db.commit()
+
+    path_dirs = sorted({os.path.dirname(p) + "/" for p in path_map if os.path.dirname(p)})
+    for project_id, canvas_data in canvases:
+        project = db.query(Project).filter(Project.id == project_id).first()
+        project.canvas_data = _remap_canvas(canvas_data, id_map, path_map, path_dirs)
+    db.commit()
+
+    stats["project_id_map"] = project_map
+    return stats
@@ -3,12 +3,21 @@ import os
 import uuid
 import base64
 import re
+import json
+import shutil
+import asyncio
+import subprocess
 from datetime import datetime
 from PIL import Image
 import io
+from typing import Any, Dict, Optional
 from sqlalchemy.orm import Session
 from ..models.asset import Asset
 from ..models.schemas import VideoData
+from .lineage import record_lineage, RELATION_SOURCE
+from .asset_versions import register_version_head
+from .phash import compute_dhash, upsert_image_hash
+from .db_writer import db_writer
 
 # 配置图像存储目录
 IMAGES_DIR = "data/assets/images"
@@ -18,14 +27,12 @@ VIDEOS_DIR = "data/assets/videos"
 os.makedirs(VIDEOS_DIR, exist_ok=True)
 
 
-def save_image_from_base64(base64_str: str, db: Session, source_ids: list = None) -> int:
+def prepare_image_file(base64_str: str) -> Dict[str, Any]:
     """
-    将 base64 图像保存为文件，并在数据库中创建 image 类型资产。
+    解码 base64 图像并落盘（纯文件/CPU 操作，不碰数据库，异步路径放进线程池执行）。
 
     :param base64_str: 图像的 base64 字符串（可能带 data URL 前缀）
-    :param db: SQLAlchemy 数据库会话
-    :param source_ids: 来源资产 ID 列表（用于血缘追踪）
-    :return: 新创建的资产 ID
+    :return: 建资产记录所需的信息：file_path / data / dhash
     """
     # 1. 提取纯 base64 数据（去掉 data URL 头，如果有）
     if base64_str.startswith("data:image"):
@@ -62,6 +69,13 @@ def save_image_from_base64(base64_str: str, db: Session, source_ids: list = None
     except Exception as e:
         raise ValueError(f"Invalid image data: {e}")
 
+    # 🌟 顺手算好感知哈希（复用已解码的图像），用于相似图检索与去重
+    try:
+        dhash = compute_dhash(img)
+    except Exception as e:
+        print(f"⚠️ [pHash] 哈希计算失败: {e}")
+        dhash = None
+
     # 4. 生成唯一文件名
     filename = f"{uuid.uuid4().hex}.{ext}"
     file_path = os.path.join(IMAGES_DIR, filename)
@@ -70,33 +84,65 @@ def save_image_from_base64(base64_str: str, db: Session, source_ids: list = None
     with open(file_path, "wb") as f:
         f.write(image_bytes)
 
-    # 6. 创建资产记录
-    asset = Asset(
-        type="image",
-        name=f"Image {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        description="Automatically saved from pipeline output",
-        tags=[],  # 可留空或由前端后续编辑
-        data={
+    return {
+        "file_path": file_path,
+        "data": {
             "file_path": file_path,
             "width": width,
             "height": height,
             "format": format,
             "original_base64_preview": base64_data[:100]  # 存储前100字符用于预览，但不存储全部
         },
+        "dhash": dhash,
+    }
+
+
+def create_image_asset(db: Session, prepared: Dict[str, Any], source_ids: list = None) -> Asset:
+    """根据 prepare_image_file 的结果创建 image 资产及其索引（不提交事务）"""
+    file_path = prepared["file_path"]
+    asset = Asset(
+        type="image",
+        name=f"Image {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+        description="Automatically saved from pipeline output",
+        tags=[],  # 可留空或由前端后续编辑
+        data=prepared["data"],
         thumbnail=file_path,  # 直接使用文件路径作为缩略图，前端可读取
         source_asset_ids=source_ids or [],
         file_path=file_path
     )
     db.add(asset)
-    db.commit()
-    db.refresh(asset)
+    db.flush()
+    # 🌟 血缘边入索引表，溯源查询不再解析 JSON
+    record_lineage(db, asset.id, source_ids, RELATION_SOURCE)
+    register_version_head(db, asset)
+    if prepared.get("dhash") is not None:
+        upsert_image_hash(db, asset.id, prepared["dhash"])
+    return asset
 
+
+def save_image_from_base64(base64_str: str, db: Session, source_ids: list = None) -> int:
+    """
+    将 base64 图像保存为文件，并在数据库中创建 image 类型资产。
+
+    :param base64_str: 图像的 base64 字符串（可能带 data URL 前缀）
+    :param db: SQLAlchemy 数据库会话
+    :param source_ids: 来源资产 ID 列表（用于血缘追踪）
+    :return: 新创建的资产 ID
+    """
+    prepared = prepare_image_file(base64_str)
+    asset = create_image_asset(db, prepared, source_ids)
+    db.commit()
     return asset.id
 
 
+async def save_image_from_base64_async(base64_str: str, source_ids: list = None) -> int:
+    """save_image_from_base64 的异步版：解码落盘走线程池，建记录交给单写线程组提交"""
+    prepared = await asyncio.to_thread(prepare_image_file, base64_str)
+    return await db_writer.write(lambda db: create_image_asset(db, prepared, source_ids).id)
+
+
 def get_video_info(file_path: str):
     """使用 ffprobe 获取视频信息"""
-    import json
     cmd = [
         'ffprobe', '-v', 'quiet', '-print_format', 'json',
         '-show_streams', file_path
@@ -112,15 +158,14 @@ def get_video_info(file_path: str):
     return width, height, duration, fps
 
 
-def save_video_as_asset(video_path: str, db, name=None, source_ids=None, project_id=None):
-    """保存视频文件为资产，并记录血缘"""
+def prepare_video_file(video_path: str) -> Dict[str, Any]:
+    """复制视频到资产目录并用 ffprobe 读取元信息（阻塞操作，异步路径放进线程池执行）"""
     # 生成唯一文件名
     ext = os.path.splitext(video_path)[1]
     new_filename = f"{uuid.uuid4().hex}{ext}"
     new_path = os.path.join(VIDEOS_DIR, new_filename)
 
     # 复制或移动文件（这里用复制）
-    import shutil
     shutil.copy2(video_path, new_path)
 
     # 获取视频信息
@@ -135,20 +180,39 @@ def save_video_as_asset(video_path: str, db, name=None, source_ids=None, project
         fps=fps,
         format=ext[1:].lower()
     ).dict()
+    return {"file_path": new_path, "data": data}
+
 
-    # 创建资产记录
+def create_video_asset(db: Session, prepared: Dict[str, Any], name: Optional[str] = None,
+                       source_ids: list = None, project_id: Optional[int] = None) -> Asset:
+    """根据 prepare_video_file 的结果创建 video 资产及其索引（不提交事务）"""
     asset = Asset(
         type="video",
         name=name or f"Video {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
         description="Automatically saved from pipeline output",
         tags=[],
-        data=data,
+        data=prepared["data"],
         thumbnail=None,
         source_asset_ids=source_ids or [],
-        file_path=new_path,
+        file_path=prepared["file_path"],
         project_id=project_id
     )
     db.add(asset)
+    db.flush()
+    record_lineage(db, asset.id, source_ids, RELATION_SOURCE)
+    register_version_head(db, asset)
+    return asset
+
+
+def save_video_as_asset(video_path: str, db, name=None, source_ids=None, project_id=None):
+    """保存视频文件为资产，并记录血缘"""
+    prepared = prepare_video_file(video_path)
+    asset = create_video_asset(db, prepared, name, source_ids, project_id)
     db.commit()
-    db.refresh(asset)
-    return asset.id
\ No newline at end of file
+    return asset.id
+
+
+async def save_video_as_asset_async(video_path: str, name=None, source_ids=None, project_id=None) -> int:
+    """save_video_as_asset 的异步版：复制与 ffprobe 走线程池，建记录交给单写线程组提交"""
+    prepared = await asyncio.to_thread(prepare_video_file, video_path)
+    return await db_writer.write(lambda db: create_video_asset(db, prepared, name, source_ids, project_id).id)
@@ -0,0 +1,228 @@
+# backend/core/asset_versions.py
+import copy
+import json
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from ..models.asset import Asset
+from ..models.asset_version import AssetVersionHead, AssetDelta
+
+# data 序列化后超过该体积才做差量压缩（小 JSON 压了也省不了多少）
+DELTA_MIN_BYTES = 2048
+# 差量至少要比原文小这么多才值得替换
+DELTA_MAX_RATIO = 0.8
+
+# 被压缩的历史版本，data 列只保留这个占位结构（外加 file_path，方便文件引用检查）
+DELTA_MARKER = "__delta_base__"
+
+
+def _json_size(value: Any) -> int:
+    return len(json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+def compute_delta(base: Any, target: Any) -> Dict[str, Any]:
+    """计算 base -> target 的结构化差量：$set / $unset / $patch（递归）/ $replace"""
+    if not (isinstance(base, dict) and isinstance(target, dict)):
+        return {"$replace": target}
+
+    sets, patches = {}, {}
+    for k, v in target.items():
+        if k not in base:
+            sets[k] = v
+        elif base[k] == v:
+            continue
+        elif isinstance(v, dict) and isinstance(base[k], dict):
+            patches[k] = compute_delta(base[k], v)
+        else:
+            sets[k] = v
+    unsets = [k for k in base if k not in target]
+
+    delta = {}
+    if sets:
+        delta["$set"] = sets
+    if unsets:
+        delta["$unset"] = unsets
+    if patches:
+        delta["$patch"] = patches
+    return delta
+
+
+def apply_delta(base: Any, delta: Dict[str, Any]) -> Any:
+    """compute_delta 的逆操作，不修改 base 本身"""
+    if "$replace" in delta:
+        return copy.deepcopy(delta["$replace"])
+    result = dict(base) if isinstance(base, dict) else {}
+    for k in delta.get("$unset", []):
+        result.pop(k, None)
+    for k, v in delta.get("$set", {}).items():
+        result[k] = copy.deepcopy(v)
+    for k, sub in delta.get("$patch", {}).items():
+        result[k] = apply_delta(result.get(k, {}), sub)
+    return result
+
+
+def is_delta_stub(data: Any) -> bool:
+    return isinstance(data, dict) and DELTA_MARKER in data
+
+
+def resolve_asset_data(db: Session, asset: Asset) -> Dict[str, Any]:
+    """获取资产的完整 data：普通行直接返回，被压缩的历史版本沿差量链还原"""
+    if not is_delta_stub(asset.data):
+        return asset.data
+
+    chain: List[AssetDelta] = []
+    current_id = asset.id
+    seen = set()
+    while True:
+        record = db.query(AssetDelta).filter(AssetDelta.asset_id == current_id).first()
+        if not record or record.base_asset_id in seen:
+            break
+        chain.append(record)
+        seen.add(current_id)
+        current_id = record.base_asset_id
+        base = db.query(Asset.data).filter(Asset.id == current_id).scalar()
+        if base is None:
+            raise ValueError(f"资产 {asset.id} 的差量基准版本 {current_id} 已丢失")
+        if not is_delta_stub(base):
+            break
+
+    data = base if chain else asset.data
+    for record in reversed(chain):
+        data = apply_delta(data, record.delta)
+    return data
+
+
+def find_version_root(db: Session, asset: Asset) -> int:
+    """沿 parent_id 回溯到版本链起点"""
+    current_id, parent_id = asset.id, asset.parent_id
+    seen = {current_id}
+    while parent_id is not None and parent_id not in seen:
+        row = db.query(Asset.id, Asset.parent_id).filter(Asset.id == parent_id).first()
+        if not row:
+            break
+        seen.add(row.id)
+        current_id, parent_id = row.id, row.parent_id
+    return current_id
+
+
+def register_version_head(db: Session, asset: Asset) -> None:
+    """新建资产（version=1）时登记为自己版本链的头"""
+    db.add(AssetVersionHead(head_asset_id=asset.id, root_asset_id=asset.id))
+
+
+def advance_version_head(db: Session, original: Asset, new_asset: Asset) -> None:
+    """update_asset 生成新版本后移动头指针，并尝试把旧版本压缩为差量"""
+    old_head = db.query(AssetVersionHead).filter(AssetVersionHead.head_asset_id == original.id).first()
+    if old_head:
+        root_id = old_head.root_asset_id
+        db.delete(old_head)
+    else:
+        # 从历史版本分叉出的新分支，或升级前的老数据
+        root_id = find_version_root(db, original)
+    db.add(AssetVersionHead(head_asset_id=new_asset.id, root_asset_id=root_id))
+    compact_version(db, original, new_asset)
+
+
+def compact_version(db: Session, original: Asset, new_asset: Asset) -> bool:
+    """把旧版本的完整 data 替换为相对新版本的反向差量（仅对大 JSON 生效）"""
+    old_data = original.data
+    if is_delta_stub(old_data) or not isinstance(old_data, dict):
+        return False
+    old_size = _json_size(old_data)
+    if old_size < DELTA_MIN_BYTES:
+        return False
+
+    delta = compute_delta(new_asset.data, old_data)
+    if _json_size(delta) > old_size * DELTA_MAX_RATIO:
+        return False
+
+    db.add(AssetDelta(asset_id=original.id, base_asset_id=new_asset.id, delta=delta))
+    stub = {DELTA_MARKER: new_asset.id}
+    if old_data.get("file_path"):
+        stub["file_path"] = old_data["file_path"]
+    original.data = stub
+    return True
+
+
+def release_asset_version(db: Session, asset: Asset) -> None:
+    """
+    删除资产前调用：
+    1. 以它为差量基准的历史版本先还原为完整 data；
+    2. 版本子节点挂到它的父版本上（保持版本树连通）；
+    3. 维护头指针：它若是头，则父版本在没有其它子版本时接任。
+    """
+    for record in db.query(AssetDelta).filter(AssetDelta.base_asset_id == asset.id).all():
+        dependent = db.query(Asset).filter(Asset.id == record.asset_id).first()
+        if dependent:
+            dependent.data = resolve_asset_data(db, dependent)
+        db.delete(record)
+    db.flush()
+    db.query(AssetDelta).filter(AssetDelta.asset_id == asset.id).delete(synchronize_session=False)
+
+    children = db.query(Asset).filter(Asset.parent_id == asset.id).all()
+    for child in children:
+        child.parent_id = asset.parent_id
+
+    head = db.query(AssetVersionHead).filter(AssetVersionHead.head_asset_id == asset.id).first()
+    if head:
+        root_id = head.root_asset_id
+        db.delete(head)
+        if asset.parent_id is not None:
+            siblings = db.query(Asset.id).filter(
+                Asset.parent_id == asset.parent_id, Asset.id != asset.id
+            ).first()
+            if siblings is None and not children:
+                db.add(AssetVersionHead(head_asset_id=asset.parent_id, root_asset_id=root_id))
+    # 删除的是版本链起点：剩余头指针按新的版本树重新定位起点
+    if asset.parent_id is None and children:
+        db.flush()
+        for row in db.query(AssetVersionHead).filter(AssetVersionHead.root_asset_id == asset.id).all():
+            head_asset = db.query(Asset).filter(Asset.id == row.head_asset_id).first()
+            if head_asset:
+                row.root_asset_id = find_version_root(db, head_asset)
+
+
+def version_history(db: Session, asset: Asset) -> List[Asset]:
+    """沿 parent_id 回溯，返回从最早到当前的版本列表"""
+    chain = [asset]
+    seen = {asset.id}
+    parent_id = asset.parent_id
+    while parent_id is not None and parent_id not in seen:
+        parent = db.query(Asset).filter(Asset.id == parent_id).first()
+        if not parent:
+            break
+        chain.append(parent)
+        seen.add(parent.id)
+        parent_id = parent.parent_id
+    chain.reverse()
+    return chain
+
+
+def rebuild_version_heads(db: Session) -> int:
+    """全量重建头指针：没有任何子版本的资产即为头"""
+    db.query(AssetVersionHead).delete(synchronize_session=False)
+    parent_of = {row.id: row.parent_id for row in db.query(Asset.id, Asset.parent_id).all()}
+    has_child = {pid for pid in parent_of.values() if pid is not None}
+
+    def root_of(asset_id: int) -> int:
+        seen = set()
+        while parent_of.get(asset_id) in parent_of and asset_id not in seen:
+            seen.add(asset_id)
+            asset_id = parent_of[asset_id]
+        return asset_id
+
+    rows = [{"head_asset_id": aid, "root_asset_id": root_of(aid)} for aid in parent_of if aid not in has_child]
+    if rows:
+        db.bulk_insert_mappings(AssetVersionHead, rows)
+    db.commit()
+    return len(rows)
+
+
+def ensure_version_heads(db: Session) -> None:
+    """启动时调用：头指针表为空但已有资产时回填一次"""
+    if db.query(AssetVersionHead.head_asset_id).first() is not None:
+        return
+    if db.query(Asset.id).first() is None:
+        return
+    count = rebuild_version_heads(db)
+    print(f"🗂️ [Versions] 已回填 {count} 个版本头指针")
@@ -0,0 +1,206 @@
+# backend/core/capability_classifier.py
+"""
+数据驱动的模型能力分类器，所有同步器共用。
+
+规则存在 capability_rules 表里（可通过 /api/capability-rules 编辑），加载时编译成一条正则：
+每条规则是一个命名分组，整体包在零宽前瞻里逐位置扫描，一遍下来就能拿到所有命中的规则，
+再取 priority 最小的那条——语义与原来各同步器里的 if/elif 子串链一致，但只扫一遍、在 C 里完成。
+分类结果按模型 ID 记忆化，大目录重复同步时基本不再做匹配。
+"""
+import re
+import time
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from ..models.capability_rule import CapabilityRule
+from ..models.model_config import CAPABILITY_COLUMNS
+
+CAPABILITY_KEYS = tuple(CAPABILITY_COLUMNS)
+FALLBACK_CAPABILITIES = ("chat",)
+MEMO_SIZE = 8192
+
+# 默认规则：合并自原 UniversalOpenAISyncer / GeminiSyncer / QwenSyncer 的硬编码判断
+DEFAULT_CAPABILITY_RULES: List[Dict[str, Any]] = [
+    {"name": "图生视频", "priority": 10, "capabilities": ["image_to_video"],
+     "keywords": ["i2v", "image-to-video", "img2vid"]},
+    {"name": "文生视频", "priority": 20, "capabilities": ["text_to_video"],
+     "keywords": ["sora", "kling", "runway", "veo", "cogvideo", "vid", "t2v", "text-to-video",
+                  "wanx-video", "wan2"]},
+    {"name": "图生图", "priority": 30, "capabilities": ["image_to_image"],
+     "keywords": ["i2i", "img2img", "cosplay", "background"]},
+    {"name": "文生图", "priority": 40, "capabilities": ["text_to_image"],
+     "keywords": ["dall-e", "midjourney", "mj-", "stable-diffusion", "sdxl", "cogview", "wanx", "z-image",
+                  "draw", "t2i", "image", "imagen", "banana"]},
+    {"name": "多模态理解", "priority": 50, "capabilities": ["chat", "vision"],
+     "keywords": ["vision", "vl", "gpt-4o", "claude-3-5", "claude-3-opus", "gemini", "pixtral"]},
+]
+
+
+# 规则拼进同一条正则后分组编号会整体错位：编号反向引用 \1、条件分组 (?(1)...)、命名分组都不能用
+_GROUP_REFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]|\(\?P|\(\?\(")
+
+
+def unsupported_regex_reason(regex: str) -> Optional[str]:
+    """规则正则里有拼接后会失效的写法时返回原因，否则返回 None"""
+    match = _GROUP_REFERENCE.search(regex)
+    if match is None:
+        return None
+    token = match.group().lstrip("\\")
+    if token.isdigit():
+        return f"不能使用编号反向引用 \\{token}"
+    if token == "(?P":
+        return "不能使用命名分组 (?P...) 或 (?P=...)"
+    return "不能使用条件分组 (?(...)...)"
+
+
+def _rule_pattern(keywords: Iterable[str], regex: Optional[str]) -> Optional[str]:
+    parts = [re.escape(k.lower()) for k in keywords or [] if k]
+    if regex:
+        parts.append(f"(?:{regex})")
+    return "|".join(parts) or None
+
+
+class CapabilityClassifier:
+    def __init__(self, rules: Sequence[Dict[str, Any]]):
+        ordered = sorted((r for r in rules if r.get("enabled", True)), key=lambda r: r.get("priority", 100))
+        self._capabilities: List[tuple] = []
+        groups = []
+        for rule in ordered:
+            pattern = _rule_pattern(rule.get("keywords"), rule.get("regex"))
+            if pattern is None:
+                continue
+            index = len(self._capabilities)
+            # 分组顺序即优先级：同一位置多条规则都能命中时，正则引擎先试到的就是更优先的那条
+            groups.append(f"(?P<r{index}>{pattern})")
+            self._capabilities.append(tuple(c for c in rule.get("capabilities", []) if c in CAPABILITY_KEYS))
+        self.rule_count = len(self._capabilities)
+        self._matcher = re.compile(f"(?=(?:{'|'.join(groups)}))") if groups else None
+        self._classify = lru_cache(maxsize=MEMO_SIZE)(self._classify_uncached)
+
+    def _classify_uncached(self, model_id: str) -> tuple:
+        best = None
+        if self._matcher is not None:
+            for match in self._matcher.finditer(model_id):
+                index = int(match.lastgroup[1:])
+                if best is None or index < best:
+                    best = index
+                    if best == 0:
+                        break
+        return self._capabilities[best] if best is not None else FALLBACK_CAPABILITIES
+
+    def classify(self, model_id: str) -> Dict[str, bool]:
+        """返回完整的能力矩阵（新 dict，调用方可随意修改）"""
+        enabled = self._classify(model_id.lower())
+        return {key: key in enabled for key in CAPABILITY_KEYS}
+
+    def cache_info(self):
+        return self._classify.cache_info()
+
+
+def rule_to_dict(rule: CapabilityRule) -> Dict[str, Any]:
+    return {
+        "keywords": rule.keywords or [],
+        "regex": rule.regex,
+        "capabilities": rule.capabilities or [],
+        "priority": rule.priority if rule.priority is not None else 100,
+        "enabled": rule.enabled,
+    }
+
+
+def load_rules(db: Session, exclude_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    query = db.query(CapabilityRule)
+    if exclude_id is not None:
+        query = query.filter(CapabilityRule.id != exclude_id)
+    return [rule_to_dict(r) for r in query.all()]
+
+
+class _ClassifierHolder:
+    """全局分类器：规则变更后整体替换（旧实例的记忆缓存随之作废）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._classifier: Optional[CapabilityClassifier] = None
+
+    def get(self) -> CapabilityClassifier:
+        classifier = self._classifier
+        if classifier is None:
+            with self._lock:
+                if self._classifier is None:
+                    # 还没从数据库加载过（如离线脚本），先用默认规则
+                    self._classifier = CapabilityClassifier(DEFAULT_CAPABILITY_RULES)
+                classifier = self._classifier
+        return classifier
+
+    def reload(self, db: Session) -> CapabilityClassifier:
+        """重新编译库里的规则；编译失败（如库里被直接写进了坏正则）保留上一个分类器，不让启动 / 请求崩掉"""
+        try:
+            classifier = CapabilityClassifier(load_rules(db))
+        except Exception as e:
+            print(f"⚠️ [Capabilities] 能力规则编译失败，继续使用上一版规则: {e}")
+            return self.get()
+        with self._lock:
+            self._classifier = classifier
+        return classifier
+
+
+capability_classifier = _ClassifierHolder()
+
+
+def classify_model(model_id: str) -> Dict[str, bool]:
+    return capability_classifier.get().classify(model_id)
+
+
+def ensure_capability_rules(db: Session) -> None:
+    """启动时调用：规则表为空则写入默认规则，然后编译加载"""
+    if db.query(CapabilityRule.id).first() is None:
+        for rule in DEFAULT_CAPABILITY_RULES:
+            db.add(CapabilityRule(**rule))
+        db.commit()
+        print(f"🧠 [Capabilities] 已写入 {len(DEFAULT_CAPABILITY_RULES)} 条默认能力规则")
+    capability_classifier.reload(db)
+
+
+def _naive_classify(rules: Sequence[Dict[str, Any]], model_id: str) -> Dict[str, bool]:
+    """对照组：原同步器的写法，按优先级逐条规则逐个关键字做子串扫描"""
+    m = model_id.lower()
+    for rule in sorted(rules, key=lambda r: r.get("priority", 100)):
+        if any(k in m for k in rule.get("keywords", [])):
+            enabled = rule.get("capabilities", [])
+            return {key: key in enabled for key in CAPABILITY_KEYS}
+    return {key: key in FALLBACK_CAPABILITIES for key in CAPABILITY_KEYS}
+
+
+def benchmark(model_ids: Sequence[str], rounds: int = 5) -> Dict[str, Any]:
+    """微基准：逐条子串扫描 vs 编译后的单遍匹配（冷缓存）vs 记忆化命中，单位均为微秒/模型"""
+    rules = DEFAULT_CAPABILITY_RULES
+    total = max(1, len(model_ids) * rounds)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for model_id in model_ids:
+            _naive_classify(rules, model_id)
+    naive = time.perf_counter() - start
+
+    cold = 0.0
+    warm = 0.0
+    for _ in range(rounds):
+        classifier = CapabilityClassifier(rules)
+        start = time.perf_counter()
+        for model_id in model_ids:
+            classifier.classify(model_id)
+        cold += time.perf_counter() - start
+        start = time.perf_counter()
+        for model_id in model_ids:
+            classifier.classify(model_id)
+        warm += time.perf_counter() - start
+
+    return {
+        "models": len(model_ids),
+        "rounds": rounds,
+        "naive_us": round(naive / total * 1e6, 3),
+        "compiled_cold_us": round(cold / total * 1e6, 3),
+        "compiled_memo_us": round(warm / total * 1e6, 3),
+    }
@@ -0,0 +1,90 @@
+# backend/core/catalog_refresher.py
+"""
+模型目录后台刷新。
+
+每个 tick 找出“到期”的 Key（按所属 Provider 的 catalog_refresh_minutes，为空用默认值，0 不刷新），
+并发拉取远程 /models；目录指纹没变的直接跳过数据库差分，所以大多数轮次几乎零开销。
+目录有变化时通过 WebSocket 广播 model_catalog_changed 事件，前端据此重新拉模型列表。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+
+from ..db import AsyncSessionLocal
+from ..models.api_key import APIKey
+from ..models.provider import Provider
+from ..models.model_catalog_snapshot import ModelCatalogSnapshot
+from .services.model_syncer import ModelSyncer
+from .ws import manager
+
+DEFAULT_REFRESH_MINUTES = 360
+TICK_SECONDS = 60
+# 拉取失败后的重试间隔：从这里起按连续失败次数翻倍，最长不超过正常的刷新间隔
+RETRY_BASE_MINUTES = 5
+
+
+def _refresh_minutes(provider: Provider) -> int:
+    minutes = provider.catalog_refresh_minutes
+    return DEFAULT_REFRESH_MINUTES if minutes is None else minutes
+
+
+def _wait_minutes(minutes: int, failures: int) -> float:
+    """距上次尝试要等多久：成功后按刷新间隔；连续失败时指数退避，封顶为刷新间隔"""
+    if not failures:
+        return minutes
+    return min(minutes, RETRY_BASE_MINUTES * 2 ** (failures - 1))
+
+
+async def refresh_due_catalogs() -> List[Dict[str, Any]]:
+    """刷新一轮到期的目录，返回各 Key 的同步报告"""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as db:
+        keys = (await db.execute(select(APIKey).where(APIKey.is_active == True))).scalars().all()
+        providers = {p.id: p for p in (await db.execute(select(Provider))).scalars().all()}
+        attempts = {
+            row.api_key_id: row for row in (await db.execute(select(
+                ModelCatalogSnapshot.api_key_id, ModelCatalogSnapshot.last_attempt_at,
+                ModelCatalogSnapshot.fetched_at, ModelCatalogSnapshot.failure_count,
+            ))).all()
+        }
+
+        due = set()
+        for key in keys:
+            provider = providers.get(key.provider)
+            if not provider or not provider.is_active:
+                continue
+            minutes = _refresh_minutes(provider)
+            if minutes <= 0:
+                continue
+            attempt = attempts.get(key.id)
+            # 按最近一次“尝试”算到期，失败的 Key 也不会每个 tick 都被重拉
+            last = (attempt.last_attempt_at or attempt.fetched_at) if attempt else None
+            failures = attempt.failure_count if attempt else 0
+            if last is None or now - last >= timedelta(minutes=_wait_minutes(minutes, failures)):
+                due.add(key.id)
+        if not due:
+            return []
+        reports = await ModelSyncer.sync_all(db, key_ids=due)
+
+    changed = [r for r in reports if r.get("changed")]
+    for report in changed:
+        await manager.broadcast({
+            "type": "model_catalog_changed",
+            "data": {"key_id": report["key_id"], "provider": report["provider"],
+                     "created": report["created"], "model_count": report["fetched"]},
+        })
+    if changed:
+        print(f"📚 [Catalog] 本轮刷新 {len(reports)} 个 Key，{len(changed)} 个目录有变化")
+    return reports
+
+
+async def start_catalog_refresher(tick_seconds: int = TICK_SECONDS):
+    """后台刷新循环"""
+    while True:
+        await asyncio.sleep(tick_seconds)
+        try:
+            await refresh_due_catalogs()
+        except Exception as e:
+            print(f"⚠️ [Catalog] 目录刷新失败: {e}")
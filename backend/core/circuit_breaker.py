@@ -0,0 +1,163 @@
+# backend/core/circuit_breaker.py
+"""
+Key / Provider 两级熔断器。
+
+closed：正常放行，连续可重试失败（429 / 5xx / 连接错误）达到阈值后转 open；
+open：冷却期内不再放行，冷却结束转 half_open；
+half_open：只放行一个探测请求，成功则 closed，失败则重新 open 且冷却时间翻倍（有上限）。
+Key 级熔断隔离单个失效 Key，Provider 级熔断应对整个厂商宕机。
+"""
+import time
+import threading
+from typing import Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+KEY_FAILURE_THRESHOLD = 3
+KEY_COOLDOWN_SECONDS = 30
+PROVIDER_FAILURE_THRESHOLD = 10
+PROVIDER_COOLDOWN_SECONDS = 60
+MAX_COOLDOWN_SECONDS = 600
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown_seconds
+        self.cooldown = cooldown_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _refresh(self, now: float) -> None:
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+
+    def available(self, now: float) -> bool:
+        """只读检查（选 Key 时用），不占用 half_open 的探测名额"""
+        self._refresh(now)
+        return self.state == CLOSED or (self.state == HALF_OPEN and not self._probe_in_flight)
+
+    def allow(self, now: float) -> bool:
+        """真正发请求前调用；half_open 时只放行一个探测"""
+        self._refresh(now)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """归还 half_open 的探测名额，状态 / 失败计数 / 冷却时间都不动"""
+        self._probe_in_flight = False
+
+    def record_failure(self, now: float) -> None:
+        if self.state == HALF_OPEN:
+            # 探测失败：重新熔断，冷却翻倍
+            self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN_SECONDS)
+            self._open(now)
+            return
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open(now)
+
+    def _open(self, now: float) -> None:
+        self.state = OPEN
+        self.opened_at = now
+        self._probe_in_flight = False
+
+    def snapshot(self, now: float) -> Dict[str, object]:
+        self._refresh(now)
+        retry_in = max(0.0, self.cooldown - (now - self.opened_at)) if self.state == OPEN else 0.0
+        return {"state": self.state, "failures": self.failures, "retry_in_seconds": round(retry_in, 1)}
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[int, CircuitBreaker] = {}
+        self._providers: Dict[str, CircuitBreaker] = {}
+
+    def _key(self, key_id: int) -> CircuitBreaker:
+        breaker = self._keys.get(key_id)
+        if breaker is None:
+            breaker = self._keys[key_id] = CircuitBreaker(KEY_FAILURE_THRESHOLD, KEY_COOLDOWN_SECONDS)
+        return breaker
+
+    def _provider(self, provider: str) -> CircuitBreaker:
+        breaker = self._providers.get(provider)
+        if breaker is None:
+            breaker = self._providers[provider] = CircuitBreaker(PROVIDER_FAILURE_THRESHOLD, PROVIDER_COOLDOWN_SECONDS)
+        return breaker
+
+    def key_available(self, key_id: int) -> bool:
+        with self._lock:
+            breaker = self._keys.get(key_id)
+            return breaker is None or breaker.available(time.monotonic())
+
+    def provider_available(self, provider: str) -> bool:
+        with self._lock:
+            breaker = self._providers.get(provider)
+            return breaker is None or breaker.available(time.monotonic())
+
+    def allow(self, provider: str, key_id: int) -> bool:
+        """Provider 与 Key 两级都放行才可以发请求"""
+        now = time.monotonic()
+        with self._lock:
+            provider_breaker = self._provider(provider)
+            key_breaker = self._key(key_id)
+            if not provider_breaker.available(now) or not key_breaker.available(now):
+                return False
+            return provider_breaker.allow(now) and key_breaker.allow(now)
+
+    def record(self, provider: str, key_id: int, success: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for breaker in (self._provider(provider), self._key(key_id)):
+                if success:
+                    breaker.record_success()
+                else:
+                    breaker.record_failure(now)
+
+    def record_key(self, key_id: int, success: bool) -> None:
+        """只记 Key 级（后台探测用）：探测专挑空闲 / 熔断中的 Key，结果不能代表厂商整体，不计入 Provider 熔断"""
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._key(key_id)
+            if success:
+                breaker.record_success()
+            else:
+                breaker.record_failure(now)
+
+    def release(self, provider: str, key_id: int) -> None:
+        """
+        请求被中断或失败但不是服务端问题（如 400 参数错误）：既不能证明 Key 健康也不能证明它坏了，
+        只归还 half_open 的探测名额，熔断状态与连续失败计数保持原样
+        """
+        with self._lock:
+            for breaker in (self._provider(provider), self._key(key_id)):
+                breaker.release_probe()
+
+    def key_state(self, key_id: int) -> Optional[Dict[str, object]]:
+        with self._lock:
+            breaker = self._keys.get(key_id)
+            return breaker.snapshot(time.monotonic()) if breaker else None
+
+    def provider_state(self, provider: str) -> Optional[Dict[str, object]]:
+        with self._lock:
+            breaker = self._providers.get(provider)
+            return breaker.snapshot(time.monotonic()) if breaker else None
+
+
+breakers = BreakerRegistry()
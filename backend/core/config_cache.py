@@ -0,0 +1,130 @@
+# backend/core/config_cache.py
+"""
+Provider / APIKey 配置的内存缓存（带版本号）。
+
+/api/generate 每次都要查一遍 Provider 和 APIKey，适配器类也要按 service_type / api_format 重新判一次。
+这些配置只在 providers / keys 路由、Key 巡检、指标落盘时才会变，所以这里缓存一份只读快照：
+命中时分发开销只剩字典查找。每份快照带一个全局递增的 version，下游可以用它做派生缓存的键。
+"""
+import copy
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.api_key import APIKey
+from ..models.provider import Provider
+
+# 兜底过期时间：绕过 API 直接改库时，最多这么久后也能看到
+CONFIG_TTL_SECONDS = 60
+
+
+class ConfigSnapshot:
+    """ORM 记录的只读快照：列名即属性名，可直接替代 Provider / APIKey 传给适配器"""
+
+    def __init__(self, record, version: int):
+        for column in record.__table__.columns:
+            # JSON 列深拷贝一份，调用方改了也不会污染缓存
+            setattr(self, column.key, copy.deepcopy(getattr(record, column.key)))
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def __repr__(self):
+        return f"<ConfigSnapshot {getattr(self, 'id', None)} v{self.version}>"
+
+
+class ConfigCache:
+    def __init__(self, ttl_seconds: int = CONFIG_TTL_SECONDS):
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._version = 0
+        self._providers: Dict[str, ConfigSnapshot] = {}
+        self._keys: Dict[int, ConfigSnapshot] = {}
+        self._adapter_classes: Dict[str, Any] = {}
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def _fresh(self, snapshot: Optional[ConfigSnapshot]) -> Optional[ConfigSnapshot]:
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self._ttl:
+            return snapshot
+        return None
+
+    def _store(self, table: Dict, record_id, record, version: int) -> Optional[ConfigSnapshot]:
+        if record is None:
+            return None  # 不存在的记录不缓存，免得新建后还要等失效
+        snapshot = ConfigSnapshot(record, version)
+        with self._lock:
+            # 加载期间有人 invalidate 过，这份快照可能是旧的：照常返回但不入缓存
+            if version == self._version:
+                table[record_id] = snapshot
+        return snapshot
+
+    # ---------- 读取 ----------
+
+    def provider(self, db: Session, provider_id: str) -> Optional[ConfigSnapshot]:
+        snapshot = self._fresh(self._providers.get(provider_id))
+        if snapshot is None:
+            version = self._version
+            snapshot = self._store(self._providers, provider_id, db.get(Provider, provider_id), version)
+        return snapshot
+
+    def key(self, db: Session, key_id: int) -> Optional[ConfigSnapshot]:
+        snapshot = self._fresh(self._keys.get(key_id))
+        if snapshot is None:
+            version = self._version
+            snapshot = self._store(self._keys, key_id, db.get(APIKey, key_id), version)
+        return snapshot
+
+    async def aprovider(self, db: AsyncSession, provider_id: str) -> Optional[ConfigSnapshot]:
+        snapshot = self._fresh(self._providers.get(provider_id))
+        if snapshot is None:
+            version = self._version
+            snapshot = self._store(self._providers, provider_id, await db.get(Provider, provider_id), version)
+        return snapshot
+
+    async def akey(self, db: AsyncSession, key_id: int) -> Optional[ConfigSnapshot]:
+        snapshot = self._fresh(self._keys.get(key_id))
+        if snapshot is None:
+            version = self._version
+            snapshot = self._store(self._keys, key_id, await db.get(APIKey, key_id), version)
+        return snapshot
+
+    def adapter_class(self, provider: ConfigSnapshot, resolve: Callable[[], Any]):
+        """按快照版本缓存解析出的适配器类；Provider 配置一变，快照版本跟着变，自动重新解析"""
+        cached = self._adapter_classes.get(provider.id)
+        if cached is not None and cached[0] == provider.version:
+            return cached[1]
+        adapter_class = resolve()
+        with self._lock:
+            self._adapter_classes[provider.id] = (provider.version, adapter_class)
+        return adapter_class
+
+    # ---------- 失效 ----------
+
+    def invalidate_provider(self, provider_id: Optional[str] = None) -> None:
+        """provider_id 为空时清空全部 Provider"""
+        with self._lock:
+            self._version += 1
+            if provider_id is None:
+                self._providers.clear()
+                self._adapter_classes.clear()
+            else:
+                self._providers.pop(provider_id, None)
+                self._adapter_classes.pop(provider_id, None)
+
+    def invalidate_keys(self, key_ids: Optional[Iterable[int]] = None) -> None:
+        """key_ids 为空时清空全部 Key"""
+        with self._lock:
+            self._version += 1
+            if key_ids is None:
+                self._keys.clear()
+            else:
+                for key_id in key_ids:
+                    self._keys.pop(key_id, None)
+
+
+config_cache = ConfigCache()
@@ -0,0 +1,164 @@
+# backend/core/db_writer.py
+"""
+SQLite 单写线程 + 组提交。
+
+SQLite 同一时刻只允许一个写事务，大量小事务各自抢写锁、各自 fsync，
+高并发下就是 database is locked 和 fsync 风暴。这里把写操作统一排进一个队列，
+由专职线程把一小段时间窗口内到达的操作合并进同一个事务提交。
+
+写操作是形如 fn(db: Session, *args, **kwargs) 的普通函数：
+- 不要自己 commit，提交由写线程统一完成；
+- 返回值请用普通值（id、计数等），ORM 对象在提交后会过期；
+- 调用方通过 Future / await 拿到结果时，数据已经落盘。
+"""
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+
+MAX_BATCH_SIZE = 256      # 单个事务最多合并多少个写操作
+MAX_BATCH_WAIT_MS = 5     # 收到第一个写操作后再等多久凑批
+
+_STOP = object()
+
+WriteOp = Tuple[Callable[..., Any], tuple, dict, Future]
+
+
+class DBWriter:
+    def __init__(self, session_factory=SessionLocal,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_batch_wait_ms: int = MAX_BATCH_WAIT_MS):
+        self._session_factory = session_factory
+        self._max_batch_size = max_batch_size
+        self._max_batch_wait = max_batch_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"ops": 0, "batches": 0, "failed_ops": 0, "replayed_batches": 0}
+
+    # ---------- 生命周期 ----------
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """停止写线程；队列里已提交的写操作会先全部落盘"""
+        with self._lock:
+            thread = self._thread
+            if not thread or not thread.is_alive():
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    # ---------- 提交写操作 ----------
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """从任意线程提交写操作，返回在事务提交后才完成的 Future"""
+        if not self._thread or not self._thread.is_alive():
+            self.start()
+        future: Future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    async def write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """协程里使用：await 到返回时数据已提交"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def write_sync(self, fn: Callable[..., Any], *args, timeout: Optional[float] = 30.0, **kwargs) -> Any:
+        """线程池里的 def 路由使用：阻塞到提交完成"""
+        return self.submit(fn, *args, **kwargs).result(timeout)
+
+    # ---------- 写线程 ----------
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch: List[WriteOp] = [item]
+            stop_after = False
+            deadline = time.monotonic() + self._max_batch_wait
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop_after = True
+                    break
+                batch.append(nxt)
+            self._commit_batch(batch)
+            if stop_after:
+                self._drain()
+                return
+
+    def _drain(self) -> None:
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        for start in range(0, len(pending), self._max_batch_size):
+            self._commit_batch(pending[start:start + self._max_batch_size])
+
+    def _commit_batch(self, batch: List[WriteOp]) -> None:
+        batch = [op for op in batch if op[3].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        db: Session = self._session_factory()
+        try:
+            results = [fn(db, *args, **kwargs) for fn, args, kwargs, _ in batch]
+            db.commit()
+        except Exception:
+            # 批内任何一个操作失败：整批回滚，再逐个单独提交，把失败隔离在出错的那个操作上
+            db.rollback()
+            replay = True
+        else:
+            replay = False
+        finally:
+            db.close()
+
+        if replay:
+            self.stats["replayed_batches"] += 1
+            for op in batch:
+                self._commit_single(op)
+            return
+
+        self.stats["ops"] += len(batch)
+        self.stats["batches"] += 1
+        for (_, _, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_single(self, op: WriteOp) -> None:
+        fn, args, kwargs, future = op
+        db: Session = self._session_factory()
+        try:
+            result = fn(db, *args, **kwargs)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.stats["failed_ops"] += 1
+            future.set_exception(e)
+            return
+        finally:
+            db.close()
+        self.stats["ops"] += 1
+        self.stats["batches"] += 1
+        future.set_result(result)
+
+
+# 全局单例：整个进程只有这一个写线程
+db_writer = DBWriter()
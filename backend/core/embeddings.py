@@ -0,0 +1,334 @@
+# backend/core/embeddings.py
+import os
+import re
+import time
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models.asset import Asset
+from ..models.asset_version import AssetVersionHead
+
+EMBEDDINGS_DIR = "data/embeddings"
+PROMPT_INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "prompt_index.npz")
+
+# 参与语义检索的资产类型 -> 提取文本的字段
+SEARCHABLE_FIELDS = {
+    "prompt": "content",
+    "character": "core_prompt",
+}
+
+
+# ================= 1. 可插拔的本地 Embedder =================
+
+class BaseEmbedder(ABC):
+    name: str = "base"
+    dim: int = 0
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """返回 (len(texts), dim) 的 float32 矩阵，每行已做 L2 归一化"""
+        pass
+
+
+class EmbedderRegistry:
+    _embedders = {}
+
+    @classmethod
+    def register(cls, name: str):
+        """Embedder 注册装饰器（与 ProviderRegistry 同款用法）"""
+        def wrapper(embedder_class):
+            cls._embedders[name.lower()] = embedder_class
+            return embedder_class
+        return wrapper
+
+    @classmethod
+    def get(cls, name: Optional[str] = None) -> BaseEmbedder:
+        name = (name or os.environ.get("COMFYFORGE_EMBEDDER") or "hashing").lower()
+        embedder_cls = cls._embedders.get(name)
+        if not embedder_cls:
+            raise ValueError(f"未注册的 Embedder: {name}")
+        return embedder_cls()
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+
+
+@EmbedderRegistry.register("hashing")
+class HashingEmbedder(BaseEmbedder):
+    """
+    离线可用的确定性哈希 Embedder（feature hashing）：
+    英文/数字按词、中文按字，叠加相邻二元组，blake2b 映射到固定维度并带符号位。
+    不依赖任何模型文件，跨进程、跨机器结果一致。
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> Dict[int, float]:
+        tokens = _TOKEN_RE.findall((text or "").lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        features: Dict[int, float] = {}
+        for gram in grams:
+            digest = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+            idx = digest % self.dim
+            sign = 1.0 if (digest >> 63) & 1 else -1.0
+            features[idx] = features.get(idx, 0.0) + sign
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for idx, value in self._features(text).items():
+                # 次线性词频，削弱“masterpiece, best quality”这类高频堆叠词的权重
+                matrix[row, idx] = np.sign(value) * np.log1p(abs(value))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+# ================= 2. NumPy 向量索引 (暴力检索 + IVF) =================
+
+class VectorIndex:
+    """
+    余弦相似度向量索引。小规模直接暴力矩阵乘；超过 ivf_min_size 后构建 IVF
+    (球面 k-means 聚类)，查询时只扫描 nprobe 个最近的簇。
+    """
+
+    def __init__(self, dim: int, ivf_min_size: int = 4096, nprobe: int = 8):
+        self.dim = dim
+        self.ivf_min_size = ivf_min_size
+        self.nprobe = nprobe
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        self.assign: Optional[np.ndarray] = None
+        self._ivf_built_size = 0
+        self._rows: Dict[int, int] = {}  # id -> 行号，与 ids 同步维护
+
+    def _reindex(self) -> None:
+        self._rows = {item_id: row for row, item_id in enumerate(self.ids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def upsert(self, item_ids: Sequence[int], vectors: np.ndarray) -> None:
+        """按 id 分成更新与新增两批：更新原地写，新增整批一次 concatenate（同一批里重复的 id 以最后一条为准）"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        updates: Dict[int, int] = {}   # 已有行号 -> 输入下标
+        inserts: Dict[int, int] = {}   # 新 id -> 输入下标（dict 保序）
+        for src, item_id in enumerate(item_ids):
+            item_id = int(item_id)
+            row = self._rows.get(item_id)
+            if row is not None:
+                updates[row] = src
+            else:
+                inserts[item_id] = src
+
+        if updates:
+            rows = np.fromiter(updates.keys(), dtype=np.int64, count=len(updates))
+            src = np.fromiter(updates.values(), dtype=np.int64, count=len(updates))
+            self.vectors[rows] = vectors[src]
+            if self.assign is not None:
+                self.assign[rows] = self._nearest_centroid(vectors[src])
+        if inserts:
+            start = len(self.ids)
+            added = vectors[np.fromiter(inserts.values(), dtype=np.int64, count=len(inserts))]
+            self.ids = np.concatenate([self.ids, np.fromiter(inserts.keys(), dtype=np.int64, count=len(inserts))])
+            self.vectors = np.concatenate([self.vectors, added])
+            if self.assign is not None:
+                self.assign = np.concatenate([self.assign, self._nearest_centroid(added)])
+            self._rows.update((item_id, start + k) for k, item_id in enumerate(inserts))
+        self._maybe_rebuild_ivf()
+
+    def remove(self, item_ids: Iterable[int]) -> None:
+        keep = ~np.isin(self.ids, np.fromiter(item_ids, dtype=np.int64))
+        self.ids = self.ids[keep]
+        self.vectors = self.vectors[keep]
+        if self.assign is not None:
+            self.assign = self.assign[keep]
+        self._reindex()
+        self._maybe_rebuild_ivf()
+
+    def _nearest_centroid(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _maybe_rebuild_ivf(self) -> None:
+        n = len(self.ids)
+        if n < self.ivf_min_size:
+            self.centroids, self.assign, self._ivf_built_size = None, None, 0
+            return
+        # 数据量相对上次建簇变化超过 50% 才重新聚类，避免频繁写入时反复训练
+        if self.centroids is not None and 0.67 * self._ivf_built_size <= n <= 1.5 * self._ivf_built_size:
+            return
+        self.build_ivf()
+
+    def build_ivf(self, iterations: int = 10, seed: int = 42) -> None:
+        n = len(self.ids)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[rng.choice(n, size=min(n, nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids /= norms
+        self.centroids = centroids.astype(np.float32)
+        self.assign = self._nearest_centroid(self.vectors)
+        self._ivf_built_size = n
+
+    def search(self, query: np.ndarray, top_k: int = 10,
+               allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        if not len(self.ids):
+            return []
+        candidates = np.arange(len(self.ids))
+        if self.centroids is not None:
+            probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            candidates = np.flatnonzero(np.isin(self.assign, probe))
+        if allowed_ids is not None:
+            candidates = candidates[np.isin(self.ids[candidates], allowed_ids)]
+        if not len(candidates):
+            return []
+        scores = self.vectors[candidates] @ query
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[candidates[i]]), float(scores[i])) for i in top]
+
+    def save(self, path: str, meta: Dict[str, str]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        arrays = {"ids": self.ids, "vectors": self.vectors, "meta_keys": np.array(list(meta.keys())),
+                  "meta_values": np.array(list(meta.values()))}
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, assign=self.assign)
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)  # 原子替换，写一半崩溃也不会损坏旧索引
+
+    @classmethod
+    def load(cls, path: str, dim: int) -> Tuple["VectorIndex", Dict[str, str]]:
+        with np.load(path, allow_pickle=False) as f:
+            index = cls(dim)
+            index.ids = f["ids"].astype(np.int64)
+            index.vectors = f["vectors"].astype(np.float32)
+            if "centroids" in f:
+                index.centroids = f["centroids"]
+                index.assign = f["assign"]
+                index._ivf_built_size = len(index.ids)
+            index._reindex()
+            meta = dict(zip(f["meta_keys"].tolist(), f["meta_values"].tolist()))
+        return index, meta
+
+
+# ================= 3. 提示词语义检索服务 =================
+
+def asset_search_text(asset_type: str, name: str, data: Optional[dict]) -> Optional[str]:
+    field = SEARCHABLE_FIELDS.get(asset_type)
+    if not field or not isinstance(data, dict):
+        return None
+    content = data.get(field)
+    if not isinstance(content, str) or not content.strip():
+        return None
+    return f"{name or ''}\n{content}"
+
+
+class PromptSearchIndex:
+    """PromptData / 角色 core_prompt 的语义检索索引，持久化在 data/embeddings 下"""
+
+    def __init__(self, path: str = PROMPT_INDEX_PATH, flush_interval: float = 30.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.embedder = EmbedderRegistry.get()
+        self.index = VectorIndex(self.embedder.dim)
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._last_flush = 0.0
+
+    @property
+    def _meta(self) -> Dict[str, str]:
+        return {"embedder": self.embedder.name, "dim": str(self.embedder.dim)}
+
+    def load_or_rebuild(self, db: Session) -> None:
+        """启动时调用：加载磁盘索引，与数据库对账；Embedder 变更时全量重建"""
+        with self._lock:
+            if os.path.exists(self.path):
+                try:
+                    index, meta = VectorIndex.load(self.path, self.embedder.dim)
+                    if meta == self._meta:
+                        self.index = index
+                except Exception as e:
+                    print(f"⚠️ [Embeddings] 索引文件损坏，将重建: {e}")
+            self.reconcile(db)
+
+    def reconcile(self, db: Session) -> Dict[str, int]:
+        """补齐缺失的向量、剔除已删除/已过期版本的资产"""
+        with self._lock:
+            rows = db.query(Asset.id, Asset.type, Asset.name, Asset.data).join(
+                AssetVersionHead, AssetVersionHead.head_asset_id == Asset.id
+            ).filter(Asset.type.in_(list(SEARCHABLE_FIELDS))).all()
+            live = {r.id: r for r in rows}
+            indexed = set(self.index.ids.tolist())
+
+            stale = indexed - live.keys()
+            if stale:
+                self.index.remove(stale)
+            missing = [live[i] for i in live.keys() - indexed]
+            texts, ids = [], []
+            for r in missing:
+                text = asset_search_text(r.type, r.name, r.data)
+                if text:
+                    ids.append(r.id)
+                    texts.append(text)
+            if ids:
+                self.index.upsert(ids, self.embedder.embed(texts))
+            if stale or ids:
+                self._dirty = True
+                self.flush(force=True)
+            return {"added": len(ids), "removed": len(stale), "total": len(self.index)}
+
+    def upsert_asset(self, asset: Asset) -> None:
+        text = asset_search_text(asset.type, asset.name, asset.data)
+        with self._lock:
+            if not text:
+                self.index.remove([asset.id])
+            else:
+                self.index.upsert([asset.id], self.embedder.embed([text]))
+            self._dirty = True
+            self.flush()
+
+    def remove_asset(self, asset_id: int) -> None:
+        with self._lock:
+            self.index.remove([asset_id])
+            self._dirty = True
+            self.flush()
+
+    def search(self, query: str, top_k: int = 10,
+               allowed_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float]]:
+        vec = self.embedder.embed([query])[0]
+        allowed = None if allowed_ids is None else np.fromiter(allowed_ids, dtype=np.int64)
+        with self._lock:
+            return self.index.search(vec, top_k, allowed)
+
+    def flush(self, force: bool = False) -> None:
+        """落盘节流：距上次写盘不足 flush_interval 秒时只标脏，关机或 force 时强制写"""
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and time.time() - self._last_flush < self.flush_interval:
+                return
+            self.index.save(self.path, self._meta)
+            self._dirty = False
+            self._last_flush = time.time()
+
+
+prompt_index = PromptSearchIndex()
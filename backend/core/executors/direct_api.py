@@ -2,13 +2,19 @@
 import re
 import asyncio
 import time  # 新增导入
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Set, Tuple
+
+from sqlalchemy import select
 
 from backend.core.adapters.factory import AdapterFactory
 from .base import BaseExecutor
 from backend.models.asset import Asset
-from backend.db import SessionLocal
-from backend.core.router import KeyRouter, RoutingStrategy  # 新增导入
+from backend.db import AsyncSessionLocal
+from backend.core.router import RoutingStrategy  # 新增导入
+from backend.core.key_metrics import key_metrics
+from backend.core.asset_versions import resolve_asset_data
+
+ASSET_REF_ID_RE = re.compile(r'\{asset:(\d+)')
 
 
 class DirectAPIPipelineExecutor(BaseExecutor):
@@ -18,19 +24,24 @@ class DirectAPIPipelineExecutor(BaseExecutor):
     """
 
     async def execute(self, task_def: Dict[str, Any]) -> Dict[str, Any]:
-        db = SessionLocal()  # 创建数据库会话，用于资产查询和 Key 路由
         visited_asset_ids = set()  # 记录本次执行引用的资产 ID
-        try:
+        # 异步会话：资产查询和 Key 路由都不再阻塞事件循环
+        async with AsyncSessionLocal() as db:
             pipeline = task_def["pipeline"]
             api_keys = task_def.get("api_keys", {})
             context = {}  # 存储中间变量
+            # 🌟 一次性批量预取整条管道引用到的资产，避免逐个 {asset:id} 查库
+            asset_cache: Dict[int, Tuple[Asset, Any]] = {}
+            await self._prefetch_assets(db, self._collect_asset_ids(pipeline), asset_cache)
 
             for step in pipeline:
                 provider = step["provider"]
                 # 获取适配器，传入数据库会话和路由策略（这里使用默认策略）
-                adapter = AdapterFactory.get_adapter(provider, db_session=db, strategy=RoutingStrategy.BALANCED)
+                adapter = await db.run_sync(
+                    lambda s: AdapterFactory.get_adapter(provider, db_session=s, strategy=RoutingStrategy.BALANCED)
+                )
 
-                step_inputs = self._resolve_inputs(step, context, db, visited_asset_ids)
+                step_inputs = await self._resolve_inputs(step, context, db, asset_cache, visited_asset_ids)
                 parts = self._build_parts(step_inputs)
 
                 # 记录开始时间
@@ -57,15 +68,13 @@ class DirectAPIPipelineExecutor(BaseExecutor):
                     success = False
                     # 记录失败指标
                     if hasattr(adapter, 'key_id') and adapter.key_id:
-                        router = KeyRouter(db)
-                        router.record_call_metrics(adapter.key_id, latency, success=False)
+                        key_metrics.record(adapter.key_id, latency, success=False)
                     raise e  # 重新抛出异常，任务失败
 
                 # 记录成功指标
                 if hasattr(adapter, 'key_id') and adapter.key_id:
-                    router = KeyRouter(db)
                     # 假设每次调用消耗 1 单位配额，可根据实际情况调整
-                    router.record_call_metrics(adapter.key_id, latency, success=True, quota_used=1)
+                    key_metrics.record(adapter.key_id, latency, success=True, quota_used=1)
 
                 # 保存输出到上下文
                 if "output_var" in step:
@@ -76,11 +85,31 @@ class DirectAPIPipelineExecutor(BaseExecutor):
             # 所有步骤执行完毕，返回结果
             return {"status": "completed", "outputs": context, "visited_asset_ids": list(visited_asset_ids)}
 
-        finally:
-            db.close()  # 确保会话关闭
+    @staticmethod
+    def _collect_asset_ids(values: Any) -> Set[int]:
+        """递归收集文本中出现的 {asset:id} 引用"""
+        ids = set()
+        if isinstance(values, str):
+            ids.update(int(m) for m in ASSET_REF_ID_RE.findall(values))
+        elif isinstance(values, dict):
+            for v in values.values():
+                ids |= DirectAPIPipelineExecutor._collect_asset_ids(v)
+        elif isinstance(values, list):
+            for v in values:
+                ids |= DirectAPIPipelineExecutor._collect_asset_ids(v)
+        return ids
 
-    def _resolve_inputs(self, step: Dict, context: Dict, db, visited_asset_ids: set) -> Dict:
-        """（原有代码保持不变）"""
+    async def _prefetch_assets(self, db, asset_ids: Set[int], cache: Dict[int, Tuple[Asset, Any]]) -> None:
+        """批量加载资产并还原差量版本的完整 data，结果写入 cache"""
+        missing = [i for i in asset_ids if i not in cache]
+        if not missing:
+            return
+        rows = (await db.execute(select(Asset).where(Asset.id.in_(missing)))).scalars().all()
+        for asset in rows:
+            cache[asset.id] = (asset, await db.run_sync(resolve_asset_data, asset))
+
+    async def _resolve_inputs(self, step: Dict, context: Dict, db, asset_cache: Dict, visited_asset_ids: set) -> Dict:
+        """变量替换后再替换资产引用；上一步输出里新出现的资产引用在这里补一次批量预取"""
         resolved = {}
         for key, value in step.items():
             if isinstance(value, str):
@@ -89,24 +118,27 @@ class DirectAPIPipelineExecutor(BaseExecutor):
                     lambda m: str(context.get(m.group(1), m.group(0))),
                     value
                 )
-                value = self._replace_asset_refs(value, db, visited_asset_ids)
                 resolved[key] = value
             else:
                 resolved[key] = value
+        await self._prefetch_assets(db, self._collect_asset_ids(resolved), asset_cache)
+        for key, value in resolved.items():
+            if isinstance(value, str):
+                resolved[key] = self._replace_asset_refs(value, asset_cache, visited_asset_ids)
         return resolved
 
-    def _replace_asset_refs(self, text: str, db, visited_ids: set) -> str:
-        """（原有代码保持不变）"""
+    def _replace_asset_refs(self, text: str, asset_cache: Dict, visited_ids: set) -> str:
+        """（原有代码保持不变，资产改从预取缓存读取）"""
         pattern = r'\{asset:(\d+)(?:\.([\w\.]+))?\}'
         def replacer(match):
             asset_id = int(match.group(1))
             visited_ids.add(asset_id)
             field_path = match.group(2)
-            asset = db.query(Asset).filter(Asset.id == asset_id).first()
+            asset, data = asset_cache.get(asset_id, (None, None))
             if not asset:
                 print(f"Warning: Asset {asset_id} not found.")
                 return match.group(0)
-            data = asset.data
+            asset_data = data
             if field_path:
                 parts = field_path.split('.')
                 for part in parts:
@@ -121,9 +153,9 @@ class DirectAPIPipelineExecutor(BaseExecutor):
                 return str(data)
             else:
                 if asset.type == 'prompt':
-                    return asset.data.get('content', '')
+                    return asset_data.get('content', '')
                 elif asset.type == 'character':
-                    return asset.data.get('core_prompt', '')
+                    return asset_data.get('core_prompt', '')
                 elif asset.type == 'workflow':
                     return f"workflow_{asset_id}"
                 else:
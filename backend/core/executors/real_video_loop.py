@@ -1,15 +1,17 @@
 # backend/core/executors/real_video_loop.py
 import os
 import copy
+import asyncio
 import subprocess
 import uuid
 import logging
 from typing import Dict, Any, List, Optional
 from .base import BaseExecutor
 from .local_comfy import LocalComfyExecutor
-from ...db import SessionLocal
+from ...db import AsyncSessionLocal
 from ...models.asset import Asset
-from ...core.asset_utils import save_video_as_asset
+from ...core.asset_utils import save_video_as_asset_async
+from ...core.asset_versions import resolve_asset_data
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -76,12 +78,11 @@ class RealVideoLoopExecutor(BaseExecutor):
             raise ValueError("segments 不能为空")
 
         # 加载工作流模板
-        db = SessionLocal()
-        try:
-            asset = db.query(Asset).filter(Asset.id == workflow_asset_id).first()
+        async with AsyncSessionLocal() as db:
+            asset = await db.get(Asset, workflow_asset_id)
             if not asset or asset.type != "workflow":
                 raise ValueError(f"工作流资产 {workflow_asset_id} 不存在或类型错误")
-            workflow_data = asset.data
+            workflow_data = await db.run_sync(resolve_asset_data, asset)
             base_workflow = workflow_data.get("workflow_json", {})
             parameters_def = workflow_data.get("parameters", {})
             # 验证必要参数
@@ -90,8 +91,6 @@ class RealVideoLoopExecutor(BaseExecutor):
                 if param not in parameters_def:
                     raise ValueError(f"工作流模板必须定义参数 '{param}'")
             logger.info(f"加载工作流模板成功，ID: {workflow_asset_id}")
-        finally:
-            db.close()
 
         segment_paths = []
         final_video = None
@@ -108,11 +107,10 @@ class RealVideoLoopExecutor(BaseExecutor):
                     raise ValueError(f"第 {i+1} 段缺少必要资产 ID")
 
                 # 加载资产
-                db = SessionLocal()
-                try:
-                    frame_a_asset = db.query(Asset).filter(Asset.id == frame_a_id).first()
-                    frame_b_asset = db.query(Asset).filter(Asset.id == frame_b_id).first()
-                    prompt_asset = db.query(Asset).filter(Asset.id == prompt_id).first()
+                async with AsyncSessionLocal() as db:
+                    frame_a_asset = await db.get(Asset, frame_a_id)
+                    frame_b_asset = await db.get(Asset, frame_b_id)
+                    prompt_asset = await db.get(Asset, prompt_id)
                     if not all([frame_a_asset, frame_b_asset, prompt_asset]):
                         raise ValueError(f"第 {i+1} 段资产未找到")
 
@@ -125,11 +123,9 @@ class RealVideoLoopExecutor(BaseExecutor):
                     # 获取数据
                     frame_a_path = frame_a_asset.data.get("file_path")
                     frame_b_path = frame_b_asset.data.get("file_path")
-                    prompt_text = prompt_asset.data.get("content")
+                    prompt_text = (await db.run_sync(resolve_asset_data, prompt_asset)).get("content")
                     if not frame_a_path or not frame_b_path or not prompt_text:
                         raise ValueError("资产数据不完整（缺少 file_path 或 content）")
-                finally:
-                    db.close()
 
                 # 复制图像到 ComfyUI 输入目录
                 input_files = self.comfy.prepare_input_files({
@@ -159,17 +155,14 @@ class RealVideoLoopExecutor(BaseExecutor):
                 logger.info("只有一个片段，跳过拼接")
             else:
                 logger.info(f"开始拼接 {len(segment_paths)} 个片段")
-                final_video = self._stitch_segments(segment_paths)
+                # ffmpeg 拼接是阻塞子进程，放进线程池
+                final_video = await asyncio.to_thread(self._stitch_segments, segment_paths)
                 logger.info(f"拼接完成，最终视频: {final_video}")
 
             # 保存为资产
             if project_id is not None:
-                db = SessionLocal()
-                try:
-                    asset_id = save_video_as_asset(final_video, db, source_ids=source_ids, project_id=project_id)
-                    logger.info(f"视频已保存为资产，ID: {asset_id}")
-                finally:
-                    db.close()
+                asset_id = await save_video_as_asset_async(final_video, source_ids=source_ids, project_id=project_id)
+                logger.info(f"视频已保存为资产，ID: {asset_id}")
         except Exception as e:
             logger.error(f"视频生成失败: {e}", exc_info=True)
             raise  # 重新抛出，由上层处理
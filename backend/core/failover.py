@@ -0,0 +1,136 @@
+# backend/core/failover.py
+"""
+跨 Key 的自动重试 / 故障转移，以及幂等保护。
+
+适配器失败结果里带 retryable=True（429、5xx、鉴权失败、请求未送达等）时，
+换 KeyRouter 选出的下一个 Key 再试，直到成功、不可重试或次数用尽；每次结果都喂给熔断器。
+已经被上游受理的任务（拿到 task_id 之后的轮询失败）适配器不会标 retryable，避免重复扣费。
+同一个 idempotency_key 的重复提交共享同一次执行，用户连点不会多跑一遍。
+"""
+import time
+import random
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from .circuit_breaker import breakers
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE_SECONDS = 0.3
+BACKOFF_MAX_SECONDS = 2.0
+IDEMPOTENCY_TTL_SECONDS = 600
+
+
+def _backoff(attempt: int) -> float:
+    # 带抖动的指数退避，避免一批请求同时砸向下一个 Key
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+async def call_with_failover(
+    provider: str,
+    first_key_id: int,
+    call: Callable[[int, int], Awaitable[Dict[str, Any]]],
+    pick_next: Callable[[Set[int]], Awaitable[Optional[Tuple[str, int]]]],
+    max_attempts: int = MAX_ATTEMPTS,
+) -> Dict[str, Any]:
+    """
+    :param call: call(key_id, attempt) 发起一次调用，返回适配器结果 dict
+    :param pick_next: pick_next(已尝试的 key_id 集合) 返回下一个 (provider, key_id)，没有则 None
+    :return: 最后一次调用的结果，附带 attempts 字段
+    """
+    tried: Set[int] = set()
+    candidate: Optional[Tuple[str, int]] = (provider, first_key_id)
+    result: Dict[str, Any] = {"success": False, "error": "所有可用 Key 均处于熔断状态，请稍后再试", "retryable": True}
+    attempt = 0
+    while candidate is not None and attempt < max_attempts:
+        provider_id, key_id = candidate
+        tried.add(key_id)
+        if not breakers.allow(provider_id, key_id):
+            # 熔断中的 Key 不占用重试次数，直接换下一个
+            candidate = await pick_next(tried)
+            continue
+        if attempt:
+            await asyncio.sleep(_backoff(attempt))
+        try:
+            result = await call(key_id, attempt)
+        except asyncio.CancelledError:
+            # 被中断不代表 Key 有问题，归还 half_open 的探测名额
+            breakers.release(provider_id, key_id)
+            raise
+        except Exception:
+            breakers.release(provider_id, key_id)
+            raise
+        attempt += 1
+        if result.get("success"):
+            breakers.record(provider_id, key_id, success=True)
+            break
+        if not result.get("retryable"):
+            breakers.release(provider_id, key_id)
+            break
+        breakers.record(provider_id, key_id, success=False)
+        print(f"🔁 [Failover] Key {key_id} 调用失败（{result.get('status_code') or '网络错误'}），尝试切换下一个 Key...")
+        candidate = await pick_next(tried)
+    result["attempts"] = attempt
+    return result
+
+
+async def call_with_breaker(
+    provider: str,
+    key_id: int,
+    call: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """单次调用、不换 Key（如对冲的备用请求），熔断器的放行与结果记账与 call_with_failover 的每一次尝试一致"""
+    if not breakers.allow(provider, key_id):
+        return {"success": False, "error": "Key 处于熔断状态", "retryable": True}
+    try:
+        result = await call()
+    except BaseException:
+        # 被取消（对冲输掉的一方）或异常都不代表 Key 有问题，只归还探测名额
+        breakers.release(provider, key_id)
+        raise
+    if result.get("success"):
+        breakers.record(provider, key_id, success=True)
+    elif not result.get("retryable"):
+        breakers.release(provider, key_id)
+    else:
+        breakers.record(provider, key_id, success=False)
+    return result
+
+
+class IdempotencyCache:
+    """idempotency_key -> 进行中或已成功的执行；失败结果不缓存，方便用户重试"""
+
+    def __init__(self, ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS):
+        self._ttl = ttl_seconds
+        self._entries: Dict[str, Tuple[float, "asyncio.Future"]] = {}
+
+    def _evict(self, now: float) -> None:
+        expired = [k for k, (created, fut) in self._entries.items() if fut.done() and now - created > self._ttl]
+        for k in expired:
+            self._entries.pop(k, None)
+
+    def in_flight(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and not entry[1].done()
+
+    async def run(self, key: Optional[str], factory: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        if not key:
+            return await factory()
+        now = time.monotonic()
+        self._evict(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            # 重复提交：等同一份执行的结果（shield 防止某个等待方被取消时连带取消执行本体）
+            return await asyncio.shield(entry[1])
+        future = asyncio.ensure_future(factory())
+        self._entries[key] = (now, future)
+
+        def _drop_failed(fut: "asyncio.Future") -> None:
+            if fut.cancelled() or fut.exception() is not None or not fut.result().get("success"):
+                if self._entries.get(key, (None, None))[1] is fut:
+                    self._entries.pop(key, None)
+
+        future.add_done_callback(_drop_failed)
+        return await future
+
+
+idempotency_cache = IdempotencyCache()
@@ -0,0 +1,239 @@
+# backend/core/file_gc.py
+import os
+import re
+import time
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..models.asset import Asset
+from ..models.project import Project
+from ..models.asset_version import AssetDelta
+from ..models.media_blob import MediaBlob
+
+ASSET_DIRS = ["data/assets/images", "data/assets/videos"]
+TEMP_DIR = "data/temp"
+
+# 资产目录下的文件至少存在这么久才会被回收，避开“文件已落盘、事务还没提交”的窗口
+DEFAULT_MIN_AGE_SECONDS = 3600
+# data/temp 下未被引用的文件超过该时长即回收
+DEFAULT_TEMP_MAX_AGE_SECONDS = 24 * 3600
+# data/temp 总体积上限；超出时从最旧的文件开始回收
+DEFAULT_TEMP_QUOTA_BYTES = 2 * 1024 ** 3
+# 配额回收也不碰最近这么久内写入的文件（可能是正在拼接的视频片段）
+TEMP_QUOTA_GRACE_SECONDS = 600
+
+DEFAULT_INTERVAL_MINUTES = 360
+# 启动后先等这么久再做第一次（演练）扫描：数据目录配错或数据库只恢复了一半时，不至于一开机就删文件
+DEFAULT_INITIAL_DELAY_SECONDS = 600
+REPORT_SAMPLE_LIMIT = 200
+# 超过该长度的字符串视为 base64 等内联内容，不当作文件引用解析
+MAX_REF_LENGTH = 1024
+
+_SPLIT_RE = re.compile(r"[\\/]")
+_gc_lock = threading.Lock()
+last_report: Optional[Dict[str, Any]] = None
+
+
+def _iter_strings(value: Any) -> Iterable[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _iter_strings(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _iter_strings(v)
+
+
+def _ref_name(value: str) -> Optional[str]:
+    """把路径 / URL 归一为文件名；资产文件都是 uuid 命名，按文件名比对足够且偏保守"""
+    if not value or len(value) > MAX_REF_LENGTH or value.startswith("data:"):
+        return None
+    name = _SPLIT_RE.split(value.split("?", 1)[0].split("#", 1)[0])[-1]
+    return name if "." in name else None
+
+
+def collect_live_refs(db: Session) -> Set[str]:
+    """
+    标记阶段：收集数据库中所有可能指向文件的引用（文件名集合）。
+    来源：Asset.file_path / thumbnail / data、历史版本差量、项目画布。
+    """
+    live: Set[str] = set()
+
+    def mark(values: Iterable[str]):
+        for v in values:
+            name = _ref_name(v)
+            if name:
+                live.add(name)
+
+    for row in db.query(Asset.file_path, Asset.thumbnail, Asset.data).yield_per(500):
+        mark(v for v in (row.file_path, row.thumbnail) if v)
+        mark(_iter_strings(row.data))
+    for row in db.query(AssetDelta.delta).yield_per(500):
+        mark(_iter_strings(row.delta))
+    for row in db.query(Project.canvas_data).yield_per(100):
+        mark(_iter_strings(row.canvas_data))
+    return live
+
+
+def is_file_shared(db: Session, path: str, exclude_asset_id: int) -> bool:
+    """除 exclude_asset_id 外是否还有资产引用该文件（版本链上的资产共享同一个文件）"""
+    return db.query(Asset.id).filter(
+        Asset.id != exclude_asset_id,
+        or_(
+            Asset.file_path == path,
+            Asset.thumbnail == path,
+            func.json_extract(Asset.data, "$.file_path") == path,
+        ),
+    ).first() is not None
+
+
+def _scan(directory: str) -> List[Dict[str, Any]]:
+    files = []
+    if not os.path.isdir(directory):
+        return files
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append({"path": path.replace("\\", "/"), "name": name, "bytes": st.st_size, "mtime": st.st_mtime})
+    return files
+
+
+def _remove(entry: Dict[str, Any]) -> bool:
+    try:
+        os.remove(entry["path"])
+        return True
+    except OSError as e:
+        print(f"⚠️ [GC] 删除失败 {entry['path']}: {e}")
+        return False
+
+
+def run_gc(db: Session, dry_run: bool = True,
+           min_age_seconds: int = DEFAULT_MIN_AGE_SECONDS,
+           temp_max_age_seconds: int = DEFAULT_TEMP_MAX_AGE_SECONDS,
+           temp_quota_bytes: int = DEFAULT_TEMP_QUOTA_BYTES) -> Dict[str, Any]:
+    """
+    标记-清除：
+    1. data/assets 下未被任何资产引用、且早于 min_age 的文件；
+    2. data/temp 下未被引用、且超过 temp_max_age 的文件；
+    3. data/temp 仍超出 temp_quota 时，按最旧优先继续回收（跳过宽限期内的文件）。
+    dry_run 只出报告不删除。
+    """
+    global last_report
+    if not _gc_lock.acquire(blocking=False):
+        return {"skipped": True, "reason": "已有 GC 任务在运行"}
+    try:
+        started = time.time()
+        now = time.time()
+        live = collect_live_refs(db)
+        candidates: List[Dict[str, Any]] = []
+        scanned = 0
+
+        for directory in ASSET_DIRS:
+            files = _scan(directory)
+            scanned += len(files)
+            for f in files:
+                if f["name"] not in live and now - f["mtime"] >= min_age_seconds:
+                    candidates.append({**f, "reason": "orphan"})
+
+        temp_files = sorted(_scan(TEMP_DIR), key=lambda f: f["mtime"])
+        scanned += len(temp_files)
+        temp_kept = []
+        for f in temp_files:
+            if f["name"] not in live and now - f["mtime"] >= temp_max_age_seconds:
+                candidates.append({**f, "reason": "temp_expired"})
+            else:
+                temp_kept.append(f)
+
+        temp_bytes = sum(f["bytes"] for f in temp_kept)
+        for f in temp_kept:
+            if temp_bytes <= temp_quota_bytes:
+                break
+            if f["name"] in live or now - f["mtime"] < TEMP_QUOTA_GRACE_SECONDS:
+                continue
+            candidates.append({**f, "reason": "temp_quota"})
+            temp_bytes -= f["bytes"]
+
+        deleted = 0
+        reclaimed = 0
+        removed_paths = []
+        for f in candidates:
+            if dry_run or _remove(f):
+                reclaimed += f["bytes"]
+                if not dry_run:
+                    deleted += 1
+                    removed_paths.append(f["path"])
+
+        # 清掉指向已删除文件的内容哈希缓存
+        if removed_paths:
+            for start in range(0, len(removed_paths), 500):
+                db.query(MediaBlob).filter(MediaBlob.file_path.in_(removed_paths[start:start + 500])).delete(
+                    synchronize_session=False)
+            db.commit()
+
+        by_reason: Dict[str, int] = {}
+        for f in candidates:
+            by_reason[f["reason"]] = by_reason.get(f["reason"], 0) + 1
+
+        report = {
+            "dry_run": dry_run,
+            "finished_at": datetime.utcnow().isoformat(),
+            "elapsed_ms": int((time.time() - started) * 1000),
+            "scanned_files": scanned,
+            "live_refs": len(live),
+            "candidates": len(candidates),
+            "by_reason": by_reason,
+            "deleted_files": deleted,
+            "reclaimed_bytes": reclaimed,
+            "temp_bytes_after": temp_bytes,
+            "temp_quota_bytes": temp_quota_bytes,
+            "sample": [
+                {"path": f["path"], "bytes": f["bytes"], "reason": f["reason"]}
+                for f in candidates[:REPORT_SAMPLE_LIMIT]
+            ],
+        }
+        last_report = report
+        return report
+    finally:
+        _gc_lock.release()
+
+
+def run_gc_once(**kwargs) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return run_gc(db, **kwargs)
+    finally:
+        db.close()
+
+
+async def start_file_gc(interval_minutes: int = DEFAULT_INTERVAL_MINUTES,
+                        initial_delay_seconds: int = DEFAULT_INITIAL_DELAY_SECONDS):
+    """
+    定时回收循环：放到线程里执行，避免文件扫描阻塞事件循环。
+    启动后延迟一段时间先演练一次（只打印、不删除），真正的删除从一个完整周期之后才开始。
+    """
+    await asyncio.sleep(initial_delay_seconds)
+    try:
+        report = await asyncio.to_thread(run_gc_once, dry_run=True)
+        print(f"🧹 [GC] 启动演练：{report['candidates']} 个待回收文件，"
+              f"共 {report['reclaimed_bytes'] / 1024 ** 2:.1f} MB，将在 {interval_minutes} 分钟后开始实际回收")
+    except Exception as e:
+        print(f"❌ [GC] 启动演练出错: {e}")
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            report = await asyncio.to_thread(run_gc_once, dry_run=False)
+            if report.get("deleted_files"):
+                print(f"🧹 [GC] 回收 {report['deleted_files']} 个文件，释放 {report['reclaimed_bytes'] / 1024 ** 2:.1f} MB")
+        except Exception as e:
+            print(f"❌ [GC] 回收任务出错: {e}")
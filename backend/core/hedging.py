@@ -0,0 +1,89 @@
+# backend/core/hedging.py
+"""
+对冲请求（hedged requests），只用于短小的 chat / vision 调用。
+
+首个请求在该 Key 观测到的 p95 之内还没返回，就向另一个 Key / Provider 再发一份，
+谁先成功用谁，另一份直接取消。对冲次数受令牌预算限制：每个请求攒 HEDGE_RATIO 个令牌、
+每次对冲花 1 个，长期对冲比例不超过 HEDGE_RATIO，尾延迟下降但成本不会翻倍。
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from .key_scoring import key_scoreboard
+
+HEDGEABLE_TYPES = {"chat", "vision"}
+HEDGE_RATIO = 0.05            # 最多 5% 的请求会被对冲
+HEDGE_BURST = 10              # 令牌上限，允许短时间内的小突发
+MIN_HEDGE_DELAY_SECONDS = 0.2
+MAX_HEDGE_DELAY_SECONDS = 30.0
+
+
+class HedgeBudget:
+    def __init__(self, ratio: float = HEDGE_RATIO, burst: float = HEDGE_BURST):
+        self._ratio = ratio
+        self._burst = burst
+        self._tokens = burst
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "denied": 0}
+
+    def on_request(self) -> None:
+        self.stats["requests"] += 1
+        self._tokens = min(self._burst, self._tokens + self._ratio)
+
+    def try_acquire(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            self.stats["hedged"] += 1
+            return True
+        self.stats["denied"] += 1
+        return False
+
+
+# 所有对冲调用都在事件循环里，共用一份预算即可
+hedge_budget = HedgeBudget()
+
+
+def hedge_delay_seconds(key_id: int, fallback_latency_ms: float = 0.0) -> float:
+    """对冲触发时间：该 Key 的 p95 延迟"""
+    p95 = key_scoreboard.stats(key_id, fallback_latency_ms)["p95"] / 1000
+    return min(max(p95, MIN_HEDGE_DELAY_SECONDS), MAX_HEDGE_DELAY_SECONDS)
+
+
+def _is_success(result: Any) -> bool:
+    return bool(isinstance(result, dict) and result.get("success"))
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[Any]],
+    backup: Optional[Callable[[], Awaitable[Any]]],
+    delay: float,
+    budget: HedgeBudget = hedge_budget,
+) -> Any:
+    """
+    先发 primary，delay 秒内没返回且预算允许时再发 backup。
+    先成功的结果胜出并取消另一份；两份都失败时返回 primary 的结果（或抛出其异常）。
+    """
+    budget.on_request()
+    first = asyncio.ensure_future(primary())
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done or backup is None or not budget.try_acquire():
+            return await first
+
+        second = asyncio.ensure_future(backup())
+        tasks.append(second)
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None and _is_success(task.result()):
+                    if task is second:
+                        budget.stats["hedge_wins"] += 1
+                    return task.result()
+        # 两份都没成功，以原请求的结果为准
+        return first.result()
+    finally:
+        # 输掉的那份（以及外层被取消时的全部）直接取消，底层 HTTP 连接随之断开
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,109 @@
+# backend/core/key_health.py
+"""
+被动健康追踪：用真实调用结果判断 Key 是否健康，主动探测只兜底。
+
+- 最近有成功的真实调用 → 视为健康，本轮不探测；
+- 熔断中（open / half_open）的 Key → 探测，成功即可提前闭合熔断，不必拿用户请求试错；
+- 长时间空闲的 Key → 按 PROBE_INTERVAL 探测；
+- 探测连续失败的 Key 按指数退避拉长下次探测间隔，少烧配额。
+"""
+import time
+import threading
+from typing import Dict, Optional
+
+from .circuit_breaker import breakers, CLOSED
+
+LIVE_FRESH_SECONDS = 30 * 60       # 这么久内有成功调用就不用探测
+PROBE_INTERVAL_SECONDS = 60 * 60   # 空闲 Key 的探测间隔
+BACKOFF_BASE_SECONDS = 5 * 60
+BACKOFF_MAX_SECONDS = 6 * 60 * 60
+
+REASON_BREAKER = "breaker"
+REASON_IDLE = "idle"
+
+
+class _Health:
+    __slots__ = ("last_success", "last_failure", "live_failures", "probe_failures", "next_probe_at", "last_probe")
+
+    def __init__(self):
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.live_failures = 0
+        self.probe_failures = 0
+        self.next_probe_at = 0.0
+        self.last_probe: Optional[float] = None
+
+
+class KeyHealthTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[int, _Health] = {}
+
+    def _get(self, key_id: int) -> _Health:
+        health = self._keys.get(key_id)
+        if health is None:
+            health = self._keys[key_id] = _Health()
+        return health
+
+    def record_live(self, key_id: int, success: bool) -> None:
+        """真实调用结果（由 key_metrics.record 喂入）"""
+        now = time.time()
+        with self._lock:
+            health = self._get(key_id)
+            if success:
+                health.last_success = now
+                health.live_failures = 0
+                # 真实流量已经证明 Key 恢复，探测退避清零
+                health.probe_failures = 0
+                health.next_probe_at = 0.0
+            else:
+                health.last_failure = now
+                health.live_failures += 1
+
+    def record_probe(self, key_id: int, valid: bool) -> None:
+        now = time.time()
+        with self._lock:
+            health = self._get(key_id)
+            health.last_probe = now
+            if valid:
+                health.probe_failures = 0
+                health.next_probe_at = 0.0
+            else:
+                health.probe_failures += 1
+                delay = BACKOFF_BASE_SECONDS * (2 ** (health.probe_failures - 1))
+                health.next_probe_at = now + min(delay, BACKOFF_MAX_SECONDS)
+
+    def needs_probe(self, key_id: int, seconds_since_check: Optional[float]) -> Optional[str]:
+        """返回探测原因；不需要探测时返回 None"""
+        now = time.time()
+        breaker = breakers.key_state(key_id)
+        with self._lock:
+            health = self._keys.get(key_id)
+            if health is not None and now < health.next_probe_at:
+                return None
+            if breaker is not None and breaker["state"] != CLOSED:
+                return REASON_BREAKER
+            if health is not None and health.last_success and now - health.last_success < LIVE_FRESH_SECONDS:
+                return None
+        if seconds_since_check is None or seconds_since_check >= PROBE_INTERVAL_SECONDS:
+            return REASON_IDLE
+        return None
+
+    def snapshot(self, key_id: int) -> Dict[str, object]:
+        now = time.time()
+        with self._lock:
+            health = self._keys.get(key_id)
+            if health is None:
+                return {"live": False}
+            ago = lambda ts: round(now - ts, 1) if ts else None
+            return {
+                "live": bool(health.last_success and now - health.last_success < LIVE_FRESH_SECONDS),
+                "last_success_seconds_ago": ago(health.last_success),
+                "last_failure_seconds_ago": ago(health.last_failure),
+                "live_failures": health.live_failures,
+                "probe_failures": health.probe_failures,
+                "next_probe_in_seconds": round(max(0.0, health.next_probe_at - now), 1),
+            }
+
+
+key_health = KeyHealthTracker()
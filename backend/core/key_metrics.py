@@ -0,0 +1,185 @@
+# backend/core/key_metrics.py
+"""
+Key 调用指标的写回缓冲（write-behind）。
+
+每次调用只在内存里累加成功/失败次数、延迟、配额消耗，不碰数据库；
+后台定时（以及进程退出时）把累加量合并写回 APIKey。读取方通过 merged() 拿到
+“数据库值 + 尚未落盘的增量”，看到的始终是实时数据。
+"""
+import asyncio
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models.api_key import APIKey
+from .db_writer import db_writer
+from .key_scoring import key_scoreboard
+from .key_health import key_health
+
+# 与原 record_call_metrics 相同的 EWMA 系数：avg = 0.9 * avg + 0.1 * latency
+EWMA_DECAY = 0.9
+DEFAULT_FLUSH_INTERVAL_SECONDS = 10
+
+
+class _KeyDelta:
+    """单个 Key 尚未落盘的增量。EWMA 以仿射变换 avg' = decay * avg + offset 的形式累积，合并结果与逐次更新完全一致"""
+    __slots__ = ("success", "failure", "quota_used", "latency_sum", "latency_count", "last_used",
+                 "first_latency", "decay_all", "offset_all", "decay_tail", "offset_tail")
+
+    def __init__(self):
+        self.success = 0
+        self.failure = 0
+        self.quota_used = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.last_used: Optional[datetime] = None
+        self.first_latency: Optional[float] = None
+        # 全部样本的变换（库里已有非零均值时用）
+        self.decay_all, self.offset_all = 1.0, 0.0
+        # 第一个样本之后的变换（库里均值为 0 时，原逻辑直接取第一个样本做初值）
+        self.decay_tail, self.offset_tail = 1.0, 0.0
+
+    def add(self, latency_ms: float, success: bool, quota_used: int) -> None:
+        self.last_used = datetime.utcnow()
+        if not success:
+            self.failure += 1
+            return
+        self.success += 1
+        self.quota_used += quota_used
+        self.latency_sum += latency_ms
+        self.latency_count += 1
+        step = (1 - EWMA_DECAY) * latency_ms
+        self.decay_all *= EWMA_DECAY
+        self.offset_all = EWMA_DECAY * self.offset_all + step
+        if self.first_latency is None:
+            self.first_latency = latency_ms
+        else:
+            self.decay_tail *= EWMA_DECAY
+            self.offset_tail = EWMA_DECAY * self.offset_tail + step
+
+    def merge_latency(self, base: float) -> float:
+        if self.first_latency is None:
+            return base
+        if not base:
+            return self.decay_tail * self.first_latency + self.offset_tail
+        return self.decay_all * base + self.offset_all
+
+    def absorb(self, newer: "_KeyDelta") -> None:
+        """把 newer（时间上更晚的增量）并入自身，用于写回失败时放回缓冲"""
+        self.success += newer.success
+        self.failure += newer.failure
+        self.quota_used += newer.quota_used
+        self.latency_sum += newer.latency_sum
+        self.latency_count += newer.latency_count
+        self.last_used = newer.last_used or self.last_used
+        if newer.first_latency is None:
+            return
+        if self.first_latency is None:
+            self.first_latency = newer.first_latency
+            self.decay_tail, self.offset_tail = newer.decay_tail, newer.offset_tail
+        else:
+            self.decay_tail *= newer.decay_all
+            self.offset_tail = newer.decay_all * self.offset_tail + newer.offset_all
+        self.decay_all *= newer.decay_all
+        self.offset_all = newer.decay_all * self.offset_all + newer.offset_all
+
+
+class KeyMetricsAggregator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, _KeyDelta] = {}
+
+    def record(self, key_id: int, latency_ms: float, success: bool, quota_used: int = 0) -> None:
+        """热路径：只做一次内存累加"""
+        with self._lock:
+            delta = self._pending.get(key_id)
+            if delta is None:
+                delta = self._pending[key_id] = _KeyDelta()
+            delta.add(latency_ms, success, quota_used)
+        # 延迟分布与错误率供 ADAPTIVE 策略使用，只在内存里
+        key_scoreboard.record(key_id, latency_ms, success)
+        key_health.record_live(key_id, success)
+
+    def merged(self, key: APIKey) -> Dict[str, Any]:
+        """数据库里的统计字段 + 尚未落盘的增量"""
+        with self._lock:
+            delta = self._pending.get(key.id)
+            values = {
+                "success_count": key.success_count or 0,
+                "failure_count": key.failure_count or 0,
+                "avg_latency": key.avg_latency or 0.0,
+                "quota_remaining": key.quota_remaining or 0,
+                "last_used": key.last_used,
+            }
+            if delta is None:
+                return values
+            values["success_count"] += delta.success
+            values["failure_count"] += delta.failure
+            values["avg_latency"] = delta.merge_latency(values["avg_latency"])
+            values["quota_remaining"] -= delta.quota_used
+            values["last_used"] = delta.last_used or values["last_used"]
+            return values
+
+    def pending_quota(self, key_id: int) -> int:
+        """尚未写回的配额消耗"""
+        with self._lock:
+            delta = self._pending.get(key_id)
+            return delta.quota_used if delta else 0
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _take(self) -> Dict[int, _KeyDelta]:
+        with self._lock:
+            snapshot, self._pending = self._pending, {}
+        return snapshot
+
+    def _restore(self, snapshot: Dict[int, _KeyDelta]) -> None:
+        with self._lock:
+            for key_id, older in snapshot.items():
+                newer = self._pending.get(key_id)
+                if newer is not None:
+                    older.absorb(newer)
+                self._pending[key_id] = older
+
+    def flush(self) -> int:
+        """把当前缓冲写回数据库（阻塞直到提交），返回写回的 Key 数"""
+        snapshot = self._take()
+        if not snapshot:
+            return 0
+        try:
+            db_writer.write_sync(_apply_deltas, snapshot)
+        except Exception as e:
+            print(f"⚠️ [KeyMetrics] 写回失败，保留到下次: {e}")
+            self._restore(snapshot)
+            return 0
+        # 配额 / 延迟已变，Key 池的预排序需要重建。
+        # 不动 config_cache：指标列不是适配器配置，失效会抬高全局版本号、白白重建池化的适配器
+        from .key_pool import key_pool
+        key_pool.invalidate()
+        return len(snapshot)
+
+
+def _apply_deltas(db: Session, snapshot: Dict[int, _KeyDelta]) -> None:
+    keys = db.query(APIKey).filter(APIKey.id.in_(list(snapshot))).all()
+    for key in keys:
+        delta = snapshot[key.id]
+        key.success_count = (key.success_count or 0) + delta.success
+        key.failure_count = (key.failure_count or 0) + delta.failure
+        key.avg_latency = delta.merge_latency(key.avg_latency or 0.0)
+        key.quota_remaining = (key.quota_remaining or 0) - delta.quota_used
+        if delta.last_used:
+            key.last_used = delta.last_used
+
+
+key_metrics = KeyMetricsAggregator()
+
+
+async def start_metrics_flusher(interval_seconds: int = DEFAULT_FLUSH_INTERVAL_SECONDS):
+    """定时写回循环；退出时由 lifespan 再调用一次 flush 兜底"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await asyncio.to_thread(key_metrics.flush)
@@ -1,53 +1,95 @@
 # backend/core/key_monitor.py
 import asyncio
 import logging
-import time  # 新增导入
-from datetime import datetime, timedelta
+from datetime import datetime
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from ..db import SessionLocal
+from ..db import AsyncSessionLocal
 from ..models.api_key import APIKey
-from .key_tester import test_key
+from ..models.provider import Provider
+from .key_probe import probe_keys
+from .db_writer import db_writer
+from .key_pool import key_pool
+from .config_cache import config_cache
+from .key_health import key_health
+from .circuit_breaker import breakers
 
 logger = logging.getLogger(__name__)
 
-async def check_keys_once():
+PROBE_BUDGET_PER_PROVIDER = 50  # 每轮每个 Provider 最多探测的 Key 数
+
+async def check_keys_once(force: bool = False):
     """执行一次Key检查，更新有效性和剩余配额，并测量延迟"""
-    db = SessionLocal()
+    # 读走异步会话、探测走 httpx 并发（全局 + 每 Provider 限流）；结果攒齐后交给单写线程一次提交
     try:
-        # 检查所有活跃Key
-        keys = db.query(APIKey).filter(APIKey.is_active == True).all()
+        async with AsyncSessionLocal() as db:
+            # 检查所有活跃Key，最久没检查的排前面
+            keys = (await db.execute(
+                select(APIKey).where(APIKey.is_active == True).order_by(APIKey.last_checked)
+            )).scalars().all()
+            providers = {p.id: p for p in (await db.execute(select(Provider))).scalars().all()}
+
+        pairs, budget, skipped_live = [], {}, 0
+        now = datetime.utcnow()
         for key in keys:
-            # 如果上次检查时间在最近1小时内，跳过（可选）
-            if key.last_checked and (datetime.utcnow() - key.last_checked) < timedelta(hours=1):
+            if not force:
+                # 🌟 被动健康：最近有真实成功调用的 Key 不探测；只探测空闲 / 熔断中的 Key（带失败退避）
+                since = (now - key.last_checked).total_seconds() if key.last_checked else None
+                if key_health.needs_probe(key.id, since) is None:
+                    skipped_live += 1
+                    continue
+            provider = providers.get(key.provider)
+            if not provider:
+                continue  # 跳过无效的供应商
+            # 每个 Provider 每轮最多探测这么多个，剩下的留到下一轮
+            if budget.get(key.provider, 0) >= PROBE_BUDGET_PER_PROVIDER:
                 continue
-            # 测量延迟
-            start = time.time()
-            result = test_key(key.provider, key.key)
-            latency = (time.time() - start) * 1000  # ms
-            if result["valid"]:
-                key.is_active = True
-                key.failure_count = 0
-                if result.get("quota_remaining") is not None:
-                    key.quota_remaining = result["quota_remaining"]
-                # 更新平均延迟
-                if key.avg_latency == 0:
-                    key.avg_latency = latency
-                else:
-                    key.avg_latency = 0.9 * key.avg_latency + 0.1 * latency
-            else:
-                key.failure_count += 1
-                if key.failure_count >= 3:
-                    key.is_active = False
-                # 失败时可以不更新平均延迟，或也计入（这里不更新）
-            key.last_checked = datetime.utcnow()
-            db.commit()
+            budget[key.provider] = budget.get(key.provider, 0) + 1
+            pairs.append((key, provider))
+
+        results = await probe_keys(pairs)
+        for key, result in results:
+            key_health.record_probe(key.id, result["valid"])
+            # 探测结果只喂给 Key 级熔断器：熔断中的 Key 探测成功即提前恢复
+            breakers.record_key(key.id, result["valid"])
+        checked_at = datetime.utcnow()
+        outcomes = [(key.id, result, result["latency"], checked_at) for key, result in results]
+        if outcomes:
+            await db_writer.write(apply_key_checks, outcomes)
+            # 探测可能改了 is_active / 延迟，让 Key 池重建
+            key_pool.invalidate()
+            config_cache.invalidate_keys([o[0] for o in outcomes])
+            print(f"🩺 [KeyMonitor] 本轮探测 {len(outcomes)} 个 Key，"
+                  f"有效 {sum(1 for o in outcomes if o[1]['valid'])} 个，免探测 {skipped_live} 个")
     except Exception as e:
         logger.error(f"Key monitoring error: {e}")
-    finally:
-        db.close()
 
-async def start_key_monitor(interval_minutes=60):
-    """启动定时监控循环"""
+def apply_key_checks(db: Session, outcomes: list) -> None:
+    """写操作本体：把一轮探测结果写回各 Key"""
+    keys = {k.id: k for k in db.query(APIKey).filter(APIKey.id.in_([o[0] for o in outcomes])).all()}
+    for key_id, result, latency, checked_at in outcomes:
+        key = keys.get(key_id)
+        if not key:
+            continue
+        if result["valid"]:
+            key.is_active = True
+            key.failure_count = 0
+            if result.get("quota_remaining") is not None:
+                key.quota_remaining = result["quota_remaining"]
+            # 更新平均延迟
+            if key.avg_latency == 0:
+                key.avg_latency = latency
+            else:
+                key.avg_latency = 0.9 * key.avg_latency + 0.1 * latency
+        else:
+            key.failure_count += 1
+            if key.failure_count >= 3:
+                key.is_active = False
+            # 失败时可以不更新平均延迟，或也计入（这里不更新）
+        key.last_checked = checked_at
+
+async def start_key_monitor(interval_minutes=5):
+    """启动定时监控循环；每轮只探测真正需要的 Key，所以可以跑得更勤"""
     while True:
         await check_keys_once()
         await asyncio.sleep(interval_minutes * 60)
@@ -57,21 +99,5 @@ def run_key_monitor_in_thread(interval_minutes=60):
     asyncio.run(start_key_monitor(interval_minutes))
 
 async def check_all_keys():
-    """批量检查所有Key（保留原有函数）"""
-    db = SessionLocal()
-    try:
-        keys = db.query(APIKey).filter(APIKey.is_active == True).all()
-        for key in keys:
-            result = test_key(key.provider, key.key)
-            if result["valid"]:
-                key.last_checked = datetime.utcnow()
-                if result.get("quota_remaining") is not None:
-                    key.quota_remaining = result["quota_remaining"]
-                key.failure_count = 0
-            else:
-                key.failure_count += 1
-                if key.failure_count >= 3:
-                    key.is_active = False
-            db.commit()
-    finally:
-        db.close()
\ No newline at end of file
+    """批量检查所有Key（保留原有函数）：忽略最近检查时间，立即全量探测"""
+    await check_keys_once(force=True)
@@ -0,0 +1,96 @@
+# backend/core/key_pool.py
+"""
+按 Provider 缓存的可用 Key 池。
+
+select_key 原先每次都查库、用 JSON contains 过滤标签、再在 Python 里排序。
+这里按 Provider 一次性载入活跃 Key，预先为每种 RoutingStrategy 排好序、按标签分桶，
+选 Key 只剩内存里的集合运算。Key / Provider 有改动时由对应路由与 key_monitor 调用 invalidate。
+"""
+import time
+import threading
+from typing import Dict, FrozenSet, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from ..models.api_key import APIKey
+from .key_metrics import key_metrics
+
+# 兜底过期时间：绕过 API 直接改库时，最多这么久后也能看到
+POOL_TTL_SECONDS = 60
+
+
+class KeyEntry:
+    __slots__ = ("id", "priority", "price_per_call", "avg_latency", "quota_remaining", "tags")
+
+    def __init__(self, key: APIKey):
+        self.id = key.id
+        self.priority = key.priority or 0
+        self.price_per_call = key.price_per_call or 0.0
+        self.avg_latency = key.avg_latency or 0.0
+        self.quota_remaining = key.quota_remaining or 0
+        self.tags: FrozenSet[str] = frozenset(key.tags or [])
+
+    def live_quota(self) -> int:
+        return self.quota_remaining - key_metrics.pending_quota(self.id)
+
+
+class ProviderPool:
+    def __init__(self, keys: List[APIKey]):
+        self.built_at = time.monotonic()
+        self.entries: Dict[int, KeyEntry] = {k.id: KeyEntry(k) for k in keys}
+        entries = list(self.entries.values())
+        # 与 KeyRouter 原有排序规则一一对应
+        self.orders: Dict[str, List[KeyEntry]] = {
+            "cost": sorted(entries, key=lambda e: (e.price_per_call, e.priority)),
+            "speed": sorted(entries, key=lambda e: (e.avg_latency, e.priority)),
+            "balanced": sorted(entries, key=lambda e: e.priority),
+            "random": entries,
+        }
+        self.by_tag: Dict[str, Set[int]] = {}
+        for e in entries:
+            for tag in e.tags:
+                self.by_tag.setdefault(tag, set()).add(e.id)
+
+    def candidates(self, required_tags: Optional[List[str]]) -> Optional[Set[int]]:
+        """满足全部标签的 Key id 集合；不要求标签时返回 None 表示不过滤"""
+        if not required_tags:
+            return None
+        buckets = [self.by_tag.get(tag, set()) for tag in required_tags]
+        buckets.sort(key=len)
+        result = set(buckets[0])
+        for bucket in buckets[1:]:
+            result &= bucket
+        return result
+
+
+class KeyPoolCache:
+    def __init__(self, ttl_seconds: int = POOL_TTL_SECONDS):
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._pools: Dict[str, ProviderPool] = {}
+        self._generation = 0
+
+    def get(self, db: Session, provider: str) -> ProviderPool:
+        pool = self._pools.get(provider)
+        if pool is not None and time.monotonic() - pool.built_at < self._ttl:
+            return pool
+        generation = self._generation
+        keys = db.query(APIKey).filter(APIKey.provider == provider, APIKey.is_active == True).all()
+        pool = ProviderPool(keys)
+        with self._lock:
+            # 构建期间发生过失效就不缓存这份（可能已过时），本次调用照常使用
+            if generation == self._generation:
+                self._pools[provider] = pool
+        return pool
+
+    def invalidate(self, provider: Optional[str] = None) -> None:
+        """Key / Provider 变更后调用；不传 provider 则清空全部"""
+        with self._lock:
+            self._generation += 1
+            if provider is None:
+                self._pools.clear()
+            else:
+                self._pools.pop(provider, None)
+
+
+key_pool = KeyPoolCache()
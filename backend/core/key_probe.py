@@ -0,0 +1,152 @@
+# backend/core/key_probe.py
+"""
+Key 有效性探测（按 Provider DSL 配置拼装请求）。
+
+build_probe_request 供同步的 /api/keys/{id}/test 与异步监控共用；探测通过后再按 build_quota_request
+查一次剩余额度（Provider.endpoints["quota"] 可配置，DashScope 未配置时走内置的余额接口）。
+probe_keys 用一个共享的 httpx.AsyncClient 并发探测：全局并发上限 + 每个 Provider 的并发预算，
+避免一轮巡检把某一家的限流打满，也不会阻塞事件循环。
+"""
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from ..models.api_key import APIKey
+from ..models.provider import Provider
+
+PROBE_TIMEOUT_SECONDS = 10
+MAX_CONCURRENCY = 32          # 全局同时在飞的探测数
+PER_PROVIDER_CONCURRENCY = 4  # 单个 Provider 同时在飞的探测数
+
+DASHSCOPE_HOST = "dashscope.aliyuncs.com"
+DEFAULT_QUOTA_EXTRACTOR = "data.available_quota"  # DashScope /api/v1/users/quota 的返回结构
+
+
+def build_probe_request(key_record: APIKey, provider_record: Provider) -> Tuple[Optional[str], Dict[str, str], Optional[str]]:
+    """返回 (探测 URL, 请求头, 错误信息)；配置不全时 URL 为 None"""
+    base_url = key_record.base_url or provider_record.default_base_url
+    if not base_url:
+        return None, {}, "网关地址 (Base URL) 未配置，无法测试"
+
+    base_url = base_url.rstrip("/")
+    # 动态组装探测 URL (OpenAI 标准通常有 /models 接口)
+    test_url = f"{base_url}/models" if provider_record.api_format == "openai_compatible" else f"{base_url}"
+
+    # 动态组装鉴权头
+    headers = {"Content-Type": "application/json"}
+    if key_record.key:
+        auth_type = (provider_record.auth_type or "Bearer").lower()
+        if auth_type == "bearer":
+            headers["Authorization"] = f"Bearer {key_record.key}"
+        elif auth_type == "x-api-key":
+            headers["x-api-key"] = key_record.key
+    return test_url, headers, None
+
+
+def build_quota_request(key_record: APIKey, provider_record: Provider) -> Tuple[Optional[str], Optional[str]]:
+    """
+    返回 (额度查询 URL, 额度字段路径)；不支持查额度时都为 None。
+    DSL：endpoints["quota"] = {"url": "/users/quota" 或完整 URL, "quota_extractor": "data.available_quota"}，
+    也可以直接写 URL 字符串
+    """
+    base_url = (key_record.base_url or provider_record.default_base_url or "").rstrip("/")
+    route = (provider_record.endpoints or {}).get("quota")
+    if isinstance(route, dict):
+        url, extractor = route.get("url"), route.get("quota_extractor") or DEFAULT_QUOTA_EXTRACTOR
+    elif isinstance(route, str):
+        url, extractor = route, DEFAULT_QUOTA_EXTRACTOR
+    elif DASHSCOPE_HOST in base_url:
+        # 兼容模式网关 (/compatible-mode/v1) 与原生接口同域，余额接口在 /api/v1 下
+        parsed = urlparse(base_url)
+        url, extractor = f"{parsed.scheme}://{parsed.netloc}/api/v1/users/quota", DEFAULT_QUOTA_EXTRACTOR
+    else:
+        return None, None
+    if not url or (not url.startswith("http") and not base_url):
+        return None, None
+    return (url if url.startswith("http") else f"{base_url}{url}"), extractor
+
+
+def interpret_quota(status_code: int, data: Any, extractor: str) -> Optional[int]:
+    """按字段路径取出剩余额度；查不到或不是数字返回 None（不影响 Key 有效性判断）"""
+    if status_code != 200:
+        return None
+    val = data
+    for key in extractor.split("."):
+        if isinstance(val, dict) and key in val:
+            val = val[key]
+        elif isinstance(val, list) and key.isdigit() and int(key) < len(val):
+            val = val[int(key)]
+        else:
+            return None
+    if isinstance(val, (int, float)) and not isinstance(val, bool):
+        return int(val)
+    return None
+
+
+def interpret_probe(status_code: int, text: str) -> Dict[str, Any]:
+    if status_code == 200:
+        return {"valid": True, "quota_remaining": None, "message": "测试成功：节点连接正常，API Key 有效！"}
+    return {"valid": False, "message": f"测试失败 (HTTP {status_code}): {text}", "status_code": status_code}
+
+
+async def probe_key(client: httpx.AsyncClient, key_record: APIKey, provider_record: Provider) -> Dict[str, Any]:
+    """单个 Key 的异步探测，结果里附带 latency（毫秒）"""
+    url, headers, error = build_probe_request(key_record, provider_record)
+    if url is None:
+        return {"valid": False, "message": error, "latency": 0.0}
+    start = time.perf_counter()
+    try:
+        resp = await client.get(url, headers=headers)
+        result = interpret_probe(resp.status_code, resp.text[:500])
+    except Exception as e:
+        result = {"valid": False, "message": f"请求异常: {str(e)}"}
+    result["latency"] = (time.perf_counter() - start) * 1000
+
+    quota_url, extractor = build_quota_request(key_record, provider_record)
+    if result["valid"] and quota_url:
+        try:
+            resp = await client.get(quota_url, headers=headers)
+            result["quota_remaining"] = interpret_quota(resp.status_code, resp.json(), extractor)
+        except Exception:
+            pass  # 额度查询失败不影响 Key 有效性
+    return result
+
+
+async def iter_probe_results(
+    pairs: Iterable[Tuple[APIKey, Provider]],
+    concurrency: int = MAX_CONCURRENCY,
+    per_provider: int = PER_PROVIDER_CONCURRENCY,
+) -> AsyncIterator[Tuple[APIKey, Dict[str, Any]]]:
+    """并发探测一批 (Key, Provider)，谁先完成先产出 (Key, 结果)；提前退出时未完成的探测会被取消"""
+    pairs = list(pairs)
+    if not pairs:
+        return
+    global_sem = asyncio.Semaphore(concurrency)
+    provider_sems: Dict[str, asyncio.Semaphore] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=PROBE_TIMEOUT_SECONDS, limits=limits) as client:
+        async def run(key_record: APIKey, provider_record: Provider):
+            sem = provider_sems.setdefault(provider_record.id, asyncio.Semaphore(per_provider))
+            async with sem, global_sem:
+                return key_record, await probe_key(client, key_record, provider_record)
+
+        tasks = [asyncio.ensure_future(run(k, p)) for k, p in pairs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def probe_keys(
+    pairs: Iterable[Tuple[APIKey, Provider]],
+    concurrency: int = MAX_CONCURRENCY,
+    per_provider: int = PER_PROVIDER_CONCURRENCY,
+) -> List[Tuple[APIKey, Dict[str, Any]]]:
+    """并发探测一批 (Key, Provider)，全部完成后一起返回（按完成顺序）"""
+    return [item async for item in iter_probe_results(pairs, concurrency, per_provider)]
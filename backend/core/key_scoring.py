@@ -0,0 +1,173 @@
+# backend/core/key_scoring.py
+"""
+自适应 Key 评分（RoutingStrategy.ADAPTIVE）。
+
+BALANCED 只看 priority，SPEED 只看一个 EWMA 均值，Key 开始超时后都反应不过来。
+这里为每个 Key 维护：
+- 滚动延迟直方图（两个时间窗轮换），取 p50 / p95；
+- 按半衰期衰减的错误率；
+再结合 price_per_call 算一个“越小越好”的分数，并用二选一随机（power of two choices）
+挑 Key：随机抽两个候选取分数低的那个，避免所有请求都压到同一个“最优” Key 上。
+"""
+import math
+import time
+import random
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# 直方图桶上界（毫秒），按对数间隔覆盖 10ms ~ 120s
+BUCKET_BOUNDS_MS = [10, 20, 50, 100, 200, 350, 500, 750, 1000, 1500, 2000, 3000, 5000,
+                    7500, 10000, 15000, 20000, 30000, 45000, 60000, 90000, 120000]
+HISTOGRAM_WINDOW_SECONDS = 300      # 每个窗口 5 分钟，统计覆盖最近 5~10 分钟
+ERROR_HALF_LIFE_SECONDS = 120       # 错误率半衰期
+MIN_SAMPLES = 5                     # 样本不足时退回数据库里的 avg_latency
+DEFAULT_LATENCY_MS = 1000.0         # 既无样本也无历史均值时的估计
+MAX_ERROR_RATE = 0.95               # 防止分数除零
+PRICE_WEIGHT = 0.5                  # 最贵的 Key 分数最多放大 1.5 倍
+
+
+class RollingHistogram:
+    """两个窗口轮换的延迟直方图：当前窗口写入，读取时合并上一窗口"""
+    __slots__ = ("current", "previous", "window_start")
+
+    def __init__(self, now: float):
+        self.current = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.previous = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.window_start = now
+
+    def _rotate(self, now: float) -> None:
+        elapsed = now - self.window_start
+        if elapsed < HISTOGRAM_WINDOW_SECONDS:
+            return
+        if elapsed < 2 * HISTOGRAM_WINDOW_SECONDS:
+            self.previous = self.current
+        else:
+            # 空闲超过两个窗口，旧数据全部作废
+            self.previous = [0] * len(self.current)
+        self.current = [0] * len(self.current)
+        self.window_start = now
+
+    def add(self, latency_ms: float, now: float) -> None:
+        self._rotate(now)
+        self.current[bisect.bisect_left(BUCKET_BOUNDS_MS, latency_ms)] += 1
+
+    def count(self, now: float) -> int:
+        self._rotate(now)
+        return sum(self.current) + sum(self.previous)
+
+    def percentile(self, q: float, now: float) -> Optional[float]:
+        self._rotate(now)
+        counts = [a + b for a, b in zip(self.current, self.previous)]
+        total = sum(counts)
+        if not total:
+            return None
+        target = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= target:
+                # 取桶上界（最后一个溢出桶取最大上界），宁可高估
+                return float(BUCKET_BOUNDS_MS[min(i, len(BUCKET_BOUNDS_MS) - 1)])
+        return float(BUCKET_BOUNDS_MS[-1])
+
+
+class DecayingRate:
+    """指数衰减的错误率：errors / total，两者按同一半衰期衰减"""
+    __slots__ = ("errors", "total", "updated_at")
+
+    def __init__(self, now: float):
+        self.errors = 0.0
+        self.total = 0.0
+        self.updated_at = now
+
+    def _decay(self, now: float) -> None:
+        dt = now - self.updated_at
+        if dt > 0:
+            factor = math.pow(0.5, dt / ERROR_HALF_LIFE_SECONDS)
+            self.errors *= factor
+            self.total *= factor
+            self.updated_at = now
+
+    def add(self, failed: bool, now: float) -> None:
+        self._decay(now)
+        self.total += 1
+        if failed:
+            self.errors += 1
+
+    def value(self, now: float) -> float:
+        self._decay(now)
+        return self.errors / self.total if self.total > 1e-6 else 0.0
+
+
+class _KeyScore:
+    __slots__ = ("histogram", "errors")
+
+    def __init__(self, now: float):
+        self.histogram = RollingHistogram(now)
+        self.errors = DecayingRate(now)
+
+
+class KeyScoreboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[int, _KeyScore] = {}
+
+    def record(self, key_id: int, latency_ms: float, success: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            score = self._keys.get(key_id)
+            if score is None:
+                score = self._keys[key_id] = _KeyScore(now)
+            # 失败的耗时也计入：超时正是要识别的信号
+            score.histogram.add(latency_ms, now)
+            score.errors.add(not success, now)
+
+    def stats(self, key_id: int, fallback_latency: float = 0.0) -> Dict[str, float]:
+        """p50 / p95（毫秒）与当前错误率；样本不足时 p50/p95 用 fallback_latency 兜底"""
+        now = time.monotonic()
+        with self._lock:
+            score = self._keys.get(key_id)
+            if score is None:
+                p50 = p95 = None
+                samples, error_rate = 0, 0.0
+            else:
+                samples = score.histogram.count(now)
+                p50 = score.histogram.percentile(0.5, now)
+                p95 = score.histogram.percentile(0.95, now)
+                error_rate = score.errors.value(now)
+        if samples < MIN_SAMPLES:
+            base = fallback_latency or DEFAULT_LATENCY_MS
+            p50 = p95 = base
+        return {"p50": p50, "p95": p95, "error_rate": error_rate, "samples": samples}
+
+    def score(self, entry, max_price: float) -> float:
+        """越小越好：期望延迟 ×（失败重试放大）×（价格放大）"""
+        s = self.stats(entry.id, entry.avg_latency)
+        latency = 0.5 * s["p50"] + 0.5 * s["p95"]
+        latency /= 1.0 - min(s["error_rate"], MAX_ERROR_RATE)
+        if max_price > 0:
+            latency *= 1.0 + PRICE_WEIGHT * (entry.price_per_call / max_price)
+        return latency
+
+    def choose(self, entries: Sequence) -> Optional[object]:
+        """power of two choices：随机抽两个候选，取分数低的"""
+        if not entries:
+            return None
+        if len(entries) == 1:
+            return entries[0]
+        max_price = max(e.price_per_call for e in entries)
+        a, b = random.sample(list(entries), 2)
+        return a if self.score(a, max_price) <= self.score(b, max_price) else b
+
+    def rank(self, entries: Sequence) -> List[object]:
+        """按分数排序的完整列表（用于展示 / 调试）"""
+        max_price = max((e.price_per_call for e in entries), default=0.0)
+        return sorted(entries, key=lambda e: self.score(e, max_price))
+
+    def forget(self, key_id: int) -> None:
+        with self._lock:
+            self._keys.pop(key_id, None)
+
+
+key_scoreboard = KeyScoreboard()
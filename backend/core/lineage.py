@@ -0,0 +1,168 @@
+# backend/core/lineage.py
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, literal, func
+from sqlalchemy.orm import Session
+
+from ..models.asset import Asset
+from ..models.asset_lineage import AssetLineage
+
+RELATION_SOURCE = "source"    # 生成来源：source_asset_ids
+RELATION_VERSION = "version"  # 版本演进：parent_id
+ALL_RELATIONS = (RELATION_SOURCE, RELATION_VERSION)
+
+DEFAULT_MAX_DEPTH = 20
+
+
+def record_lineage(db: Session, child_id: int, parent_ids: Optional[Iterable[int]],
+                   relation: str = RELATION_SOURCE) -> int:
+    """
+    写入 parent -> child 血缘边（不提交事务），自动忽略不存在的资产与重复边。
+    :return: 新写入的边数
+    """
+    wanted = {int(pid) for pid in (parent_ids or []) if pid is not None and int(pid) != child_id}
+    if not wanted:
+        return 0
+
+    existing_assets = {row.id for row in db.query(Asset.id).filter(Asset.id.in_(wanted)).all()}
+    existing_edges = {
+        row.parent_asset_id for row in db.query(AssetLineage.parent_asset_id).filter(
+            AssetLineage.child_asset_id == child_id,
+            AssetLineage.relation == relation,
+        ).all()
+    }
+    new_parents = (wanted & existing_assets) - existing_edges
+    for pid in sorted(new_parents):
+        db.add(AssetLineage(parent_asset_id=pid, child_asset_id=child_id, relation=relation))
+    return len(new_parents)
+
+
+def detach_asset_lineage(db: Session, asset_id: int) -> None:
+    """
+    删除资产前调用：把该节点从血缘图中“摘除”，同时把它的上游直接连到下游，
+    保证 A -> B -> C 删掉 B 之后仍能从 C 追溯到 A。
+    """
+    parents = db.query(AssetLineage).filter(AssetLineage.child_asset_id == asset_id).all()
+    children = db.query(AssetLineage).filter(AssetLineage.parent_asset_id == asset_id).all()
+
+    bridges = set()
+    for p in parents:
+        for c in children:
+            if p.parent_asset_id == c.child_asset_id:
+                continue
+            # 两段都是版本边时仍然是版本关系，否则降级为来源关系
+            relation = RELATION_VERSION if p.relation == c.relation == RELATION_VERSION else RELATION_SOURCE
+            bridges.add((p.parent_asset_id, c.child_asset_id, relation))
+
+    for edge in parents + children:
+        db.delete(edge)
+    db.flush()
+
+    for parent_id, child_id, relation in bridges:
+        exists = db.query(AssetLineage.id).filter(
+            AssetLineage.parent_asset_id == parent_id,
+            AssetLineage.child_asset_id == child_id,
+            AssetLineage.relation == relation,
+        ).first()
+        if not exists:
+            db.add(AssetLineage(parent_asset_id=parent_id, child_asset_id=child_id, relation=relation))
+
+
+def _walk(db: Session, asset_id: int, upstream: bool, max_depth: int,
+          relations: Iterable[str]) -> List[Tuple[int, int]]:
+    """递归 CTE 遍历血缘图，返回 [(asset_id, 最短深度)]"""
+    edges = AssetLineage.__table__
+    relations = list(relations)
+    if upstream:
+        start_col, next_col = edges.c.child_asset_id, edges.c.parent_asset_id
+    else:
+        start_col, next_col = edges.c.parent_asset_id, edges.c.child_asset_id
+
+    walk = select(next_col.label("asset_id"), literal(1).label("depth")).where(
+        start_col == asset_id,
+        edges.c.relation.in_(relations),
+    ).cte("lineage_walk", recursive=True)
+
+    step = select(next_col, walk.c.depth + 1).select_from(edges).join(
+        walk, start_col == walk.c.asset_id
+    ).where(
+        walk.c.depth < max_depth,
+        edges.c.relation.in_(relations),
+    )
+    # UNION（非 UNION ALL）配合深度上限，环路也能安全终止
+    walk = walk.union(step)
+
+    stmt = (select(walk.c.asset_id, func.min(walk.c.depth).label("depth"))
+            .where(walk.c.asset_id != asset_id)
+            .group_by(walk.c.asset_id)
+            .order_by("depth", walk.c.asset_id))
+    return [(row.asset_id, row.depth) for row in db.execute(stmt).all()]
+
+
+def _build_graph(db: Session, root_id: int, hits: List[Tuple[int, int]], relations: Iterable[str]) -> Dict:
+    depth_by_id = dict(hits)
+    ids = set(depth_by_id) | {root_id}
+    assets = db.query(Asset.id, Asset.type, Asset.name, Asset.version).filter(Asset.id.in_(ids)).all()
+    nodes = [
+        {"id": a.id, "type": a.type, "name": a.name, "version": a.version, "depth": depth_by_id.get(a.id, 0)}
+        for a in assets
+    ]
+    nodes.sort(key=lambda n: (n["depth"], n["id"]))
+    edges = db.query(AssetLineage).filter(
+        AssetLineage.parent_asset_id.in_(ids),
+        AssetLineage.child_asset_id.in_(ids),
+        AssetLineage.relation.in_(list(relations)),
+    ).all()
+    return {
+        "root_id": root_id,
+        "nodes": nodes,
+        "edges": [{"parent": e.parent_asset_id, "child": e.child_asset_id, "relation": e.relation} for e in edges],
+    }
+
+
+def get_ancestors(db: Session, asset_id: int, max_depth: int = DEFAULT_MAX_DEPTH,
+                  relations: Iterable[str] = ALL_RELATIONS) -> Dict:
+    """向上追溯：该资产由哪些资产派生而来"""
+    return _build_graph(db, asset_id, _walk(db, asset_id, True, max_depth, relations), relations)
+
+
+def get_descendants(db: Session, asset_id: int, max_depth: int = DEFAULT_MAX_DEPTH,
+                    relations: Iterable[str] = ALL_RELATIONS) -> Dict:
+    """向下展开：哪些产物派生自该资产"""
+    return _build_graph(db, asset_id, _walk(db, asset_id, False, max_depth, relations), relations)
+
+
+def rebuild_lineage_index(db: Session) -> int:
+    """从 Asset.parent_id / Asset.source_asset_ids 全量重建血缘边表"""
+    db.query(AssetLineage).delete(synchronize_session=False)
+    valid_ids = {row.id for row in db.query(Asset.id).all()}
+    rows = set()
+    for asset_id, parent_id, source_ids in db.query(Asset.id, Asset.parent_id, Asset.source_asset_ids).all():
+        if parent_id in valid_ids and parent_id != asset_id:
+            rows.add((parent_id, asset_id, RELATION_VERSION))
+        for sid in source_ids or []:
+            try:
+                sid = int(sid)
+            except (TypeError, ValueError):
+                continue
+            if sid in valid_ids and sid != asset_id:
+                rows.add((sid, asset_id, RELATION_SOURCE))
+    if rows:
+        db.bulk_insert_mappings(AssetLineage, [
+            {"parent_asset_id": p, "child_asset_id": c, "relation": r} for p, c, r in rows
+        ])
+    db.commit()
+    return len(rows)
+
+
+def ensure_lineage_index(db: Session) -> None:
+    """启动时调用：边表为空但已有带血缘的资产时做一次回填"""
+    if db.query(AssetLineage.id).first() is not None:
+        return
+    has_lineage = db.query(Asset.id).filter(
+        (Asset.parent_id.isnot(None)) | (func.json_array_length(Asset.source_asset_ids) > 0)
+    ).first()
+    if has_lineage is None:
+        return
+    count = rebuild_lineage_index(db)
+    if count:
+        print(f"🧬 [Lineage] 已从历史数据回填 {count} 条血缘边")
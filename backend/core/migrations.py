@@ -0,0 +1,110 @@
+# backend/core/migrations.py
+"""
+轻量级版本化迁移。
+
+create_all 只会建缺失的表，永远不会给已有表补索引 / 补列，
+所以凡是需要改动已有库结构的地方，都在这里追加一条迁移（版本号只增不改）。
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+
+def _hot_column_indexes(conn: Connection) -> None:
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_api_key_provider_active ON api_keys (provider, is_active)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_model_config_api_key ON model_configs (api_key_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_model_config_model_name ON model_configs (model_name)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_asset_project_created ON assets (project_id, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_asset_created ON assets (created_at)"))
+
+
+def _model_config_unique_key_model(conn: Connection) -> None:
+    # 历史同步可能留下同一 Key 下的重复模型：保留最早那条（用户改过的 ui 参数 / 收藏都在它身上）
+    conn.execute(text("""
+        DELETE FROM model_configs
+        WHERE api_key_id IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM model_configs
+              WHERE api_key_id IS NOT NULL
+              GROUP BY api_key_id, model_name
+          )
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_model_config_key_model ON model_configs (api_key_id, model_name)"
+    ))
+
+
+def _provider_catalog_refresh_minutes(conn: Connection) -> None:
+    tables = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))}
+    if "providers" not in tables:
+        return  # 新库由 create_all 按模型直接建出带该列的表
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(providers)"))}
+    if "catalog_refresh_minutes" not in columns:
+        conn.execute(text("ALTER TABLE providers ADD COLUMN catalog_refresh_minutes INTEGER"))
+
+
+def _model_config_capability_columns(conn: Connection) -> None:
+    from ..models.model_config import CAPABILITY_COLUMNS
+
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(model_configs)"))}
+    for cap, column in CAPABILITY_COLUMNS.items():
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE model_configs ADD COLUMN {column} BOOLEAN NOT NULL DEFAULT 0"))
+        # 从 capabilities JSON 回填（JSON true 经 json_extract 取出为 1）
+        conn.execute(text(
+            f"UPDATE model_configs SET {column} = COALESCE(json_extract(capabilities, '$.{cap}') = 1, 0)"
+        ))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS idx_model_config_{column} ON model_configs ({column}, api_key_id)"
+        ))
+
+
+def _catalog_snapshot_attempts(conn: Connection) -> None:
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(model_catalog_snapshots)"))}
+    if not columns:
+        return  # 新库由 create_all 按模型直接建出带这些列的表
+    if "last_attempt_at" not in columns:
+        conn.execute(text("ALTER TABLE model_catalog_snapshots ADD COLUMN last_attempt_at DATETIME"))
+        conn.execute(text("UPDATE model_catalog_snapshots SET last_attempt_at = fetched_at"))
+    if "failure_count" not in columns:
+        conn.execute(text("ALTER TABLE model_catalog_snapshots ADD COLUMN failure_count INTEGER NOT NULL DEFAULT 0"))
+    if "last_error" not in columns:
+        conn.execute(text("ALTER TABLE model_catalog_snapshots ADD COLUMN last_error VARCHAR(500)"))
+
+
+# (版本号, 名称, 迁移函数)；只能在末尾追加
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "hot_column_indexes", _hot_column_indexes),
+    (2, "model_config_unique_key_model", _model_config_unique_key_model),
+    (3, "provider_catalog_refresh_minutes", _provider_catalog_refresh_minutes),
+    (4, "model_config_capability_columns", _model_config_capability_columns),
+    (5, "catalog_snapshot_attempts", _catalog_snapshot_attempts),
+]
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """按版本号顺序执行未应用的迁移，每条迁移单独一个事务；返回本次应用的版本号"""
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at DATETIME NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))}
+
+    done = []
+    for version, name, migrate in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+        print(f"🛠️ [Migrations] 已应用 #{version} {name}")
+        done.append(version)
+    return done
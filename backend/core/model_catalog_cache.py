@@ -0,0 +1,74 @@
+# backend/core/model_catalog_cache.py
+"""
+GET /api/models 的响应缓存。
+
+画布每次打开、每个节点的下拉框都会拉一遍模型列表，而目录只在同步或手动编辑时才变。
+这里按 (key_id, mode) 缓存已经序列化好的 JSON 字节，命中时既不查库也不走 pydantic 校验。
+模型有改动时由 models 路由、keys 路由与 ModelSyncer 调用 invalidate。
+"""
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from ..models.model_config import ModelConfig, CAPABILITY_COLUMNS
+from ..models.schemas import ModelConfigOut
+
+# 兜底过期时间：绕过 API 直接改库时，最多这么久后也能看到
+CATALOG_TTL_SECONDS = 300
+
+_serializer = TypeAdapter(List[ModelConfigOut])
+_EMPTY = _serializer.dump_json([])
+
+
+class ModelCatalogCache:
+    def __init__(self, ttl_seconds: int = CATALOG_TTL_SECONDS):
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[Optional[int], Optional[str]], Tuple[float, bytes]] = {}
+        self._generation = 0
+
+    @staticmethod
+    def query(db: Session, key_id: Optional[int], mode: Optional[str]):
+        query = db.query(ModelConfig).filter(ModelConfig.is_active == True)
+        if key_id is not None:
+            query = query.filter(ModelConfig.api_key_id == key_id)
+        if mode:
+            column = CAPABILITY_COLUMNS.get(mode)
+            if column is None:
+                return None  # 未知能力：与原先 capabilities.get(mode) 的语义一致，什么都不匹配
+            query = query.filter(getattr(ModelConfig, column) == True)
+        return query
+
+    def get(self, db: Session, key_id: Optional[int], mode: Optional[str]) -> bytes:
+        cache_key = (key_id, mode)
+        entry = self._entries.get(cache_key)
+        if entry is not None and time.monotonic() - entry[0] < self._ttl:
+            return entry[1]
+
+        generation = self._generation
+        query = self.query(db, key_id, mode)
+        if query is None:
+            # 未知能力恒为空列表，不入缓存：否则任意 mode 查询串都会让缓存无限增长
+            return _EMPTY
+        payload = _serializer.dump_json(query.all())
+        with self._lock:
+            # 构建期间有人 invalidate 过，这份结果可能是旧的：照常返回但不入缓存
+            if generation == self._generation:
+                self._entries[cache_key] = (time.monotonic(), payload)
+        return payload
+
+    def invalidate(self, key_id: Optional[int] = None) -> None:
+        """key_id 为空时清空全部；否则清掉该 Key 以及不分 Key 的汇总视图"""
+        with self._lock:
+            self._generation += 1
+            if key_id is None:
+                self._entries.clear()
+            else:
+                for cache_key in [k for k in self._entries if k[0] is None or k[0] == key_id]:
+                    del self._entries[cache_key]
+
+
+model_catalog_cache = ModelCatalogCache()
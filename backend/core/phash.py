@@ -0,0 +1,243 @@
+# backend/core/phash.py
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from ..models.asset import Asset
+from ..models.image_hash import ImageHash
+
+IMAGES_DIR = "data/assets/images"
+
+HASH_BITS = 64
+BAND_COUNT = 4
+BAND_BITS = HASH_BITS // BAND_COUNT
+BAND_MASK = (1 << BAND_BITS) - 1
+# 4 段 band 索引能保证召回的最大汉明距离
+INDEXED_MAX_DISTANCE = BAND_COUNT - 1
+
+# 每个字节的 popcount 查表，用于向量化汉明距离
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def compute_dhash(image: Union[Image.Image, str]) -> int:
+    """
+    差值哈希 (dHash)：灰度缩放到 9x8，比较相邻像素明暗得到 64 位指纹。
+    对缩放、轻微压缩、色调变化不敏感，适合找“几乎一样”的生成结果。
+    """
+    if isinstance(image, str):
+        with Image.open(image) as img:
+            return compute_dhash(img)
+    gray = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << HASH_BITS) if value >= (1 << (HASH_BITS - 1)) else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
+
+
+def split_bands(value: int) -> List[int]:
+    value = to_unsigned(value)
+    return [(value >> (i * BAND_BITS)) & BAND_MASK for i in range(BAND_COUNT)]
+
+
+def hamming_distances(target: int, hashes: np.ndarray) -> np.ndarray:
+    """target 与一组 uint64 哈希的汉明距离（向量化）"""
+    xor = np.bitwise_xor(hashes.astype(np.uint64), np.uint64(to_unsigned(target)))
+    return _POPCOUNT_TABLE[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def asset_image_path(asset: Asset) -> Optional[str]:
+    data = asset.data if isinstance(asset.data, dict) else {}
+    path = data.get("file_path") or asset.file_path
+    if not path or path.startswith("http"):
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def upsert_image_hash(db: Session, asset_id: int, dhash: int) -> None:
+    """写入/覆盖某资产的哈希（不提交事务）"""
+    bands = split_bands(dhash)
+    row = db.query(ImageHash).filter(ImageHash.asset_id == asset_id).first()
+    if not row:
+        row = ImageHash(asset_id=asset_id)
+        db.add(row)
+    row.dhash = to_signed(dhash)
+    row.band0, row.band1, row.band2, row.band3 = bands
+
+
+def index_image_asset(db: Session, asset: Asset, image: Optional[Image.Image] = None) -> bool:
+    """为图片资产计算并登记感知哈希；图片不可读时静默跳过，不影响资产创建"""
+    if asset.type != "image":
+        return False
+    try:
+        if image is not None:
+            dhash = compute_dhash(image)
+        else:
+            path = asset_image_path(asset)
+            if not path:
+                return False
+            dhash = compute_dhash(path)
+    except Exception as e:
+        print(f"⚠️ [pHash] 资产 {asset.id} 哈希计算失败: {e}")
+        return False
+    upsert_image_hash(db, asset.id, dhash)
+    return True
+
+
+def remove_image_hash(db: Session, asset_id: int) -> None:
+    db.query(ImageHash).filter(ImageHash.asset_id == asset_id).delete(synchronize_session=False)
+
+
+def find_similar(db: Session, asset_id: int, max_distance: int = INDEXED_MAX_DISTANCE,
+                 limit: int = 50) -> List[Tuple[int, int]]:
+    """
+    查找与指定图片相似的资产，返回 [(asset_id, 汉明距离)]，距离升序。
+    max_distance <= 3 时走 band 索引只取候选集；更大的阈值退化为 NumPy 全量向量化扫描。
+    """
+    row = db.query(ImageHash).filter(ImageHash.asset_id == asset_id).first()
+    if not row:
+        return []
+
+    query = db.query(ImageHash.asset_id, ImageHash.dhash).filter(ImageHash.asset_id != asset_id)
+    if max_distance <= INDEXED_MAX_DISTANCE:
+        query = query.filter(or_(
+            ImageHash.band0 == row.band0,
+            ImageHash.band1 == row.band1,
+            ImageHash.band2 == row.band2,
+            ImageHash.band3 == row.band3,
+        ))
+    candidates = query.all()
+    if not candidates:
+        return []
+
+    ids = np.array([c.asset_id for c in candidates], dtype=np.int64)
+    hashes = np.array([to_unsigned(c.dhash) for c in candidates], dtype=np.uint64)
+    distances = hamming_distances(row.dhash, hashes)
+    mask = distances <= max_distance
+    order = np.argsort(distances[mask], kind="stable")[:limit]
+    return [(int(i), int(d)) for i, d in zip(ids[mask][order], distances[mask][order])]
+
+
+def _band_buckets(ids: np.ndarray, hashes: np.ndarray, band_count: int) -> List[List[int]]:
+    """按 band 分桶，返回所有大小 > 1 的桶（桶内元素为数组下标）"""
+    band_bits = HASH_BITS // band_count
+    mask = np.uint64((1 << band_bits) - 1)
+    buckets = []
+    for b in range(band_count):
+        keys = (hashes >> np.uint64(b * band_bits)) & mask
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        for group in np.split(order, boundaries):
+            if len(group) > 1:
+                buckets.append(group.tolist())
+    return buckets
+
+
+def duplicate_report(db: Session, max_distance: int = INDEXED_MAX_DISTANCE,
+                     images_dir: str = IMAGES_DIR) -> Dict:
+    """
+    近重复清理报告：把 images_dir 下汉明距离 <= max_distance 的图片聚成簇，
+    每簇保留最早的一张，其余列为可清理项并统计可回收字节数。只出报告，不删除任何东西。
+    """
+    prefix = os.path.abspath(images_dir)
+    rows = db.query(ImageHash.asset_id, ImageHash.dhash, Asset.data, Asset.file_path).join(
+        Asset, Asset.id == ImageHash.asset_id
+    ).order_by(ImageHash.asset_id).all()
+
+    entries = []
+    for r in rows:
+        data = r.data if isinstance(r.data, dict) else {}
+        path = data.get("file_path") or r.file_path
+        if path and os.path.abspath(path).startswith(prefix):
+            entries.append((r.asset_id, to_unsigned(r.dhash), path))
+    if len(entries) < 2:
+        return {"max_distance": max_distance, "clusters": [], "duplicate_count": 0, "reclaimable_bytes": 0}
+
+    ids = np.array([e[0] for e in entries], dtype=np.int64)
+    hashes = np.array([e[1] for e in entries], dtype=np.uint64)
+
+    # 鸽巢原理：分成 max_distance + 1 段，距离在阈值内的一对必然在某一段上完全相同
+    band_count = min(max(max_distance + 1, 1), HASH_BITS)
+    parent = list(range(len(entries)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for bucket in _band_buckets(ids, hashes, band_count):
+        for pos, i in enumerate(bucket):
+            others = np.array(bucket[pos + 1:], dtype=np.int64)
+            if not len(others):
+                continue
+            close = others[hamming_distances(int(hashes[i]), hashes[others]) <= max_distance]
+            for j in close:
+                ri, rj = find(i), find(int(j))
+                if ri != rj:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(entries)):
+        groups.setdefault(find(i), []).append(i)
+
+    clusters = []
+    reclaimable = 0
+    duplicate_count = 0
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        keeper = members[0]  # 下标有序，即最早的资产
+        keeper_hash = int(hashes[keeper])
+        duplicates = []
+        for m in members[1:]:
+            path = entries[m][2]
+            size = os.path.getsize(path) if os.path.isfile(path) else 0
+            reclaimable += size
+            duplicates.append({
+                "asset_id": entries[m][0],
+                "file_path": path,
+                "distance": int(hamming_distances(keeper_hash, hashes[[m]])[0]),
+                "bytes": size,
+            })
+        duplicate_count += len(duplicates)
+        clusters.append({
+            "keep_asset_id": entries[keeper][0],
+            "keep_file_path": entries[keeper][2],
+            "duplicates": duplicates,
+        })
+
+    clusters.sort(key=lambda c: len(c["duplicates"]), reverse=True)
+    return {
+        "max_distance": max_distance,
+        "clusters": clusters,
+        "duplicate_count": duplicate_count,
+        "reclaimable_bytes": reclaimable,
+    }
+
+
+def backfill_image_hashes(db: Session, batch_size: int = 200) -> Dict[str, int]:
+    """为尚未建立哈希的历史图片资产补算哈希，分批提交"""
+    indexed = db.query(ImageHash.asset_id)
+    pending = db.query(Asset).filter(Asset.type == "image", ~Asset.id.in_(indexed)).all()
+    done = skipped = 0
+    for asset in pending:
+        if index_image_asset(db, asset):
+            done += 1
+        else:
+            skipped += 1
+        if done and done % batch_size == 0:
+            db.commit()
+    db.commit()
+    return {"indexed": done, "skipped": skipped}
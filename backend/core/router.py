@@ -1,7 +1,11 @@
 # backend/core/router.py
-from typing import Optional, List
+from typing import Optional, List, Set
 from sqlalchemy.orm import Session
 from ..models.api_key import APIKey
+from .key_metrics import key_metrics
+from .key_pool import key_pool
+from .key_scoring import key_scoreboard
+from .circuit_breaker import breakers
 import random
 from datetime import datetime
 
@@ -10,6 +14,7 @@ class RoutingStrategy:
     SPEED_FIRST = "speed"        # 速度优先
     BALANCED = "balanced"        # 平衡（按优先级）
     RANDOM = "random"            # 随机（可用于负载均衡）
+    ADAPTIVE = "adaptive"        # 自适应（p50/p95 + 错误率 + 价格，二选一随机）
 
 class KeyRouter:
     """根据策略从数据库中选择最佳 Key"""
@@ -22,59 +27,57 @@ class KeyRouter:
         provider: str,
         required_tags: Optional[List[str]] = None,
         strategy: str = RoutingStrategy.BALANCED,
-        min_quota: int = 1
+        min_quota: int = 1,
+        exclude_ids: Optional[Set[int]] = None
     ) -> Optional[APIKey]:
         """
-        查询可用 Key，并按策略排序返回最优 Key。
+        从内存 Key 池按策略选出最优 Key。
         :param provider: 提供商名称
         :param required_tags: 必须包含的标签列表
         :param strategy: 选择策略
         :param min_quota: 最低剩余配额要求
+        :param exclude_ids: 本次要跳过的 Key（例如刚失败过的）
         :return: APIKey 对象或 None
         """
-        query = self.db.query(APIKey).filter(
-            APIKey.provider == provider,
-            APIKey.is_active == True,
-            APIKey.quota_remaining >= min_quota
-        )
-        if required_tags:
-            # SQLite 中 JSON 字段包含所有标签的简单判断
-            for tag in required_tags:
-                query = query.filter(APIKey.tags.contains([tag]))
+        key_id = self.select_key_id(provider, required_tags, strategy, min_quota, exclude_ids)
+        return self.db.get(APIKey, key_id) if key_id is not None else None
 
-        keys = query.all()
-        if not keys:
+    def select_key_id(
+        self,
+        provider: str,
+        required_tags: Optional[List[str]] = None,
+        strategy: str = RoutingStrategy.BALANCED,
+        min_quota: int = 1,
+        exclude_ids: Optional[Set[int]] = None
+    ) -> Optional[int]:
+        """只返回 Key id 的纯内存版本（Key 池未命中时才查一次库）；熔断中的 Key / Provider 不参与选择"""
+        if not breakers.provider_available(provider):
             return None
+        pool = key_pool.get(self.db, provider)
+        allowed = pool.candidates(required_tags)
+        order = pool.orders.get(strategy, pool.orders[RoutingStrategy.BALANCED])
 
-        # 按策略排序
-        if strategy == RoutingStrategy.COST_FIRST:
-            # 价格升序，同价格按优先级升序
-            keys.sort(key=lambda k: (k.price_per_call, k.priority))
-        elif strategy == RoutingStrategy.SPEED_FIRST:
-            # 平均延迟升序，同时考虑优先级
-            keys.sort(key=lambda k: (k.avg_latency, k.priority))
-        elif strategy == RoutingStrategy.RANDOM:
-            return random.choice(keys)
-        else:  # BALANCED
-            # 简单按优先级升序，可扩展为加权评分
-            keys.sort(key=lambda k: k.priority)
+        def eligible(entry) -> bool:
+            if allowed is not None and entry.id not in allowed:
+                return False
+            if exclude_ids and entry.id in exclude_ids:
+                return False
+            if not breakers.key_available(entry.id):
+                return False
+            # 配额以“库内值 - 未落盘消耗”为准
+            return entry.live_quota() >= min_quota
 
-        return keys[0]
+        if strategy == RoutingStrategy.ADAPTIVE:
+            chosen = key_scoreboard.choose([e for e in order if eligible(e)])
+            return chosen.id if chosen else None
+        if strategy == RoutingStrategy.RANDOM:
+            keys = [e for e in order if eligible(e)]
+            return random.choice(keys).id if keys else None
+        for entry in order:
+            if eligible(entry):
+                return entry.id
+        return None
 
     def record_call_metrics(self, key_id: int, latency_ms: float, success: bool, quota_used: int = 0):
-        """记录调用后更新 Key 的统计信息"""
-        key = self.db.query(APIKey).filter(APIKey.id == key_id).first()
-        if not key:
-            return
-        if success:
-            key.success_count += 1
-            # 更新平均延迟（指数移动平均，平滑处理）
-            if key.avg_latency == 0:
-                key.avg_latency = latency_ms
-            else:
-                key.avg_latency = 0.9 * key.avg_latency + 0.1 * latency_ms
-            key.quota_remaining -= quota_used
-        else:
-            key.failure_count += 1
-        key.last_used = datetime.utcnow()
-        self.db.commit()
\ No newline at end of file
+        """记录调用后更新 Key 的统计信息（只做内存累加，由 key_metrics 定时写回数据库）"""
+        key_metrics.record(key_id, latency_ms, success, quota_used)
@@ -1,31 +1,40 @@
 # backend/core/services/model_syncer.py
+import json
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Set
+from sqlalchemy import select, insert, update
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from backend.models.model_config import ModelConfig
+from backend.models.model_config import ModelConfig, capability_columns
 from backend.models.provider import Provider
 from backend.models.api_key import APIKey
+from backend.models.model_catalog_snapshot import ModelCatalogSnapshot
 from backend.core.registry import ProviderRegistry
+from backend.core.model_catalog_cache import model_catalog_cache
+from backend.core.capability_classifier import classify_model
 
 # 🌟 预热激活区
 import backend.core.services.syncers.gemini_syncer
 import backend.core.services.syncers.universal_syncer  # 🌟 引入万能同步器
 
 
-class ModelSyncer:
-    @classmethod
-    async def sync_provider(cls, db: Session, provider_id: str, key_id: int) -> int:
+# 全量同步时同时在飞的远程拉取数
+SYNC_ALL_CONCURRENCY = 8
 
-        # 1. 查出 Provider 和 API Key 的配置信息
-        provider_info = db.query(Provider).filter(Provider.id == provider_id).first()
-        api_key_info = db.query(APIKey).filter(APIKey.id == key_id).first()
 
-        if not provider_info or not api_key_info:
-            raise ValueError("Provider 或 API Key 不存在")
+def catalog_hash(remote_models: list) -> str:
+    """远程模型列表的内容指纹（与顺序无关）"""
+    items = sorted((m["id"], m.get("display_name") or "") for m in remote_models)
+    return hashlib.sha256(json.dumps(items, ensure_ascii=False).encode("utf-8")).hexdigest()
 
-        # 动态计算最终的 base_url (API Key 自定义优先)
-        base_url = api_key_info.base_url or provider_info.default_base_url
 
-        # 2. 动态获取 Syncer (极其严谨的容错机制)
+class ModelSyncer:
+    @classmethod
+    def resolve_syncer(cls, provider_info: Provider):
+        """按 Provider 选同步器：专属的优先，openai_compatible 兜底走万能同步器"""
+        provider_id = provider_info.id
         syncer = None  # 🌟 必须在这里初始化，防止 UnboundLocalError
 
         try:
@@ -43,60 +52,209 @@ class ModelSyncer:
 
         if syncer is None:
             raise ValueError(f"系统未找到适用于 [{provider_id}] 的同步器，请检查配置")
+        return syncer
 
-        # 3. 抓取远程模型列表 (兼容参数传递)
+    @classmethod
+    async def fetch_for_key(cls, syncer, provider_info: Provider, api_key_info: APIKey) -> list:
+        # 动态计算最终的 base_url (API Key 自定义优先)
+        base_url = api_key_info.base_url or provider_info.default_base_url
+        # 抓取远程模型列表 (兼容参数传递)
         try:
-            remote_models = await syncer.fetch_remote_models(api_key_info.key, base_url=base_url)
+            return await syncer.fetch_remote_models(api_key_info.key, base_url=base_url)
         except TypeError:
             # 兼容旧的无需 base_url 的定制 syncer
-            remote_models = await syncer.fetch_remote_models(api_key_info.key)
+            return await syncer.fetch_remote_models(api_key_info.key)
+
+    @classmethod
+    async def sync_provider(cls, db: AsyncSession, provider_id: str, key_id: int, force: bool = True) -> int:
+
+        # 1. 查出 Provider 和 API Key 的配置信息
+        provider_info = await db.get(Provider, provider_id)
+        api_key_info = await db.get(APIKey, key_id)
+
+        if not provider_info or not api_key_info:
+            raise ValueError("Provider 或 API Key 不存在")
+
+        # 2. 动态获取 Syncer，3. 抓取远程模型列表
+        syncer = cls.resolve_syncer(provider_info)
+        remote_models = await cls.fetch_for_key(syncer, provider_info, api_key_info)
 
         if not remote_models:
             return 0
 
-        # 4. 软删除机制：先把这个 Key 下的所有模型标记为未激活
-        db.query(ModelConfig).filter(
-            ModelConfig.api_key_id == key_id,
-            ModelConfig.is_manual == False
-        ).update({"is_active": False})
+        # 落库是一串同步 ORM 操作，整体交给 run_sync 在异步会话里执行
+        result = await db.run_sync(cls._apply_catalog, provider_id, key_id, syncer, remote_models, force)
+        await db.commit()
+        model_catalog_cache.invalidate(key_id)
+        return result["created"]
+
+    @classmethod
+    async def sync_all(cls, db: AsyncSession, concurrency: int = SYNC_ALL_CONCURRENCY, force: bool = False,
+                       key_ids: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
+        """
+        所有活跃 Key（或 key_ids 指定的子集）并发拉取远程列表，再在同一个事务里逐 Key 落库。
+        force=False 时目录指纹没变的 Key 直接跳过数据库差分。
+        """
+        stmt = select(APIKey).where(APIKey.is_active == True)
+        if key_ids is not None:
+            stmt = stmt.where(APIKey.id.in_(key_ids))
+        keys = (await db.execute(stmt)).scalars().all()
+        providers = {p.id: p for p in (await db.execute(select(Provider))).scalars().all()}
+        sem = asyncio.Semaphore(concurrency)
+
+        async def fetch(key: APIKey) -> Dict[str, Any]:
+            report = {"key_id": key.id, "provider": key.provider, "fetched": 0, "created": 0,
+                      "changed": False, "error": None}
+            provider_info = providers.get(key.provider)
+            if not provider_info:
+                report["error"] = "Provider 不存在"
+                return report
+            try:
+                syncer = cls.resolve_syncer(provider_info)
+                async with sem:
+                    remote_models = await cls.fetch_for_key(syncer, provider_info, key)
+            except Exception as e:
+                report["error"] = str(e)
+                return report
+            report["fetched"] = len(remote_models or [])
+            if remote_models:
+                report["_apply"] = (syncer, remote_models)
+            else:
+                report["error"] = "远程返回的模型列表为空"
+            return report
+
+        reports = await asyncio.gather(*(fetch(k) for k in keys))
+
+        def apply_all(sync_db: Session) -> None:
+            for report in reports:
+                job = report.pop("_apply", None)
+                if job:
+                    syncer, remote_models = job
+                    report.update(cls._apply_catalog(
+                        sync_db, report["provider"], report["key_id"], syncer, remote_models, force))
+                else:
+                    cls._record_failed_attempt(sync_db, report["provider"], report["key_id"], report["error"])
 
-        count = 0
+        await db.run_sync(apply_all)
+        await db.commit()
+        # 指纹没变的 Key 没碰模型表，缓存不用动
+        for report in reports:
+            if report["changed"] or (force and report["fetched"]):
+                model_catalog_cache.invalidate(report["key_id"])
+        return list(reports)
+
+    @classmethod
+    def _apply_catalog(cls, db: Session, provider_id: str, key_id: int, syncer, remote_models: list,
+                       force: bool = False) -> Dict[str, Any]:
+        """比对目录快照：指纹没变就只刷新拉取时间；变了（或强制）才做数据库差分并更新快照"""
+        digest = catalog_hash(remote_models)
+        now = datetime.utcnow()
+        snapshot = db.get(ModelCatalogSnapshot, key_id)
+        changed = snapshot is None or snapshot.content_hash != digest
+        if snapshot is not None:
+            snapshot.last_attempt_at, snapshot.failure_count, snapshot.last_error = now, 0, None
+        if not changed and not force:
+            snapshot.fetched_at = now
+            return {"created": 0, "changed": False}
+
+        created = cls._apply_remote_models(db, provider_id, key_id, syncer, remote_models)
+        if snapshot is None:
+            snapshot = ModelCatalogSnapshot(api_key_id=key_id, provider=provider_id, changed_at=now,
+                                            last_attempt_at=now, failure_count=0)
+            db.add(snapshot)
+        if changed:
+            snapshot.changed_at = now
+        snapshot.provider = provider_id
+        snapshot.content_hash = digest
+        snapshot.model_count = len(remote_models)
+        snapshot.models = remote_models
+        snapshot.fetched_at = now
+        return {"created": created, "changed": changed}
+
+    @classmethod
+    def _record_failed_attempt(cls, db: Session, provider_id: str, key_id: int, error: Optional[str]) -> None:
+        """拉取失败或返回空列表：只记尝试时间与连续失败次数（供后台刷新退避），不动已有目录"""
+        now = datetime.utcnow()
+        snapshot = db.get(ModelCatalogSnapshot, key_id)
+        if snapshot is None:
+            # 从未成功拉取过：空指纹占位，成功后一定会做一次完整差分
+            snapshot = ModelCatalogSnapshot(api_key_id=key_id, provider=provider_id, content_hash="",
+                                            model_count=0, models=[], failure_count=0)
+            db.add(snapshot)
+        snapshot.last_attempt_at = now
+        snapshot.failure_count = (snapshot.failure_count or 0) + 1
+        snapshot.last_error = (error or "")[:500]
+
+    @classmethod
+    def reclassify_synced_models(cls, db: Session) -> int:
+        """能力规则变更后按新规则批量重算同步模型的能力（手动模型不动），返回改动行数；调用方负责提交"""
+        updates = []
+        for row in db.query(ModelConfig.id, ModelConfig.model_name, ModelConfig.capabilities).filter(
+                ModelConfig.is_manual.isnot(True)):
+            caps = classify_model(row.model_name)
+            if row.capabilities != caps:
+                updates.append({"id": row.id, "capabilities": caps, **capability_columns(caps)})
+        if updates:
+            db.execute(update(ModelConfig), updates)
+        return len(updates)
+
+    @classmethod
+    def _apply_remote_models(cls, db: Session, provider_id: str, key_id: int, syncer, remote_models: list) -> int:
+        """一次查出该 Key 的现有模型，按集合差分：批量插入新模型、批量重新激活 / 下线旧模型"""
+        existing = {
+            row.model_name: row
+            for row in db.query(
+                ModelConfig.id, ModelConfig.model_name, ModelConfig.is_manual,
+                ModelConfig.is_active, ModelConfig.capabilities
+            ).filter(ModelConfig.api_key_id == key_id)
+        }
+
+        inserts, updates = [], []
+        seen = set()
+        now = datetime.utcnow()
         for rm in remote_models:
             m_id = rm["id"]
+            # 远端列表偶有重复条目，(api_key_id, model_name) 有唯一约束，重复的直接跳过
+            if m_id in seen:
+                continue
+            seen.add(m_id)
             # 推断能力和 UI 参数
             caps = syncer.infer_capabilities(m_id)
-            ui_params = syncer.get_context_ui_params(caps)
-
-            # 5. 查找该 Key 是否已经有这个模型的记录
-            db_model = db.query(ModelConfig).filter(
-                ModelConfig.api_key_id == key_id,
-                ModelConfig.model_name == m_id
-            ).first()
-
-            if not db_model:
 
+            row = existing.get(m_id)
+            if row is None:
                 clean_display_name = rm.get("display_name", m_id).replace("models/", "")
                 # 插入全新的模型记录
-                db_model = ModelConfig(
-                    provider=provider_id,
-                    model_name=m_id,
-                    display_name=clean_display_name,
-                    api_key_id=key_id,
-                    capabilities=caps,
-                    context_ui_params=ui_params,
-                    is_active=True,
-                    last_synced=datetime.utcnow()
-                )
-                db.add(db_model)
-                count += 1
-            else:
-                # 更新老模型的数据，并重新激活
-                db_model.is_active = True
-                db_model.capabilities = caps
-                # 🌟 修复：只重新激活，不再用默认规则覆盖用户的自定义 capabilities 和 ui_params！
-                #db_model.context_ui_params = ui_params
-                #db_model.last_synced = datetime.utcnow()
-
-        # 提交事务
-        db.commit()
-        return count
\ No newline at end of file
+                inserts.append({
+                    "provider": provider_id,
+                    "model_name": m_id,
+                    "display_name": clean_display_name,
+                    "api_key_id": key_id,
+                    "capabilities": caps,
+                    **capability_columns(caps),
+                    "context_ui_params": syncer.get_context_ui_params(caps),
+                    "is_active": True,
+                    "is_manual": False,
+                    "is_favorite": False,
+                    "health_status": "unknown",
+                    "last_synced": now,
+                })
+            elif not row.is_active or row.capabilities != caps:
+                # 更新老模型的数据，并重新激活（没变化的不写）
+                # 🌟 修复：只重新激活，不再用默认规则覆盖用户的自定义 ui_params！
+                updates.append({"id": row.id, "is_active": True, "capabilities": caps, **capability_columns(caps)})
+
+        # 软删除机制：远端已经没有的同步模型标记为未激活（手动模型不动）
+        stale_ids = [
+            row.id for name, row in existing.items()
+            if name not in seen and not row.is_manual and row.is_active
+        ]
+
+        if inserts:
+            db.execute(insert(ModelConfig), inserts)
+        if updates:
+            db.execute(update(ModelConfig), updates)
+        if stale_ids:
+            db.query(ModelConfig).filter(ModelConfig.id.in_(stale_ids)).update(
+                {"is_active": False}, synchronize_session=False)
+        return len(inserts)
@@ -1,6 +1,7 @@
 # backend/core/services/syncers/base.py
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any
+from backend.core.capability_classifier import classify_model
 
 class BaseSyncer(ABC):
     @abstractmethod
@@ -8,10 +9,9 @@ class BaseSyncer(ABC):
         """从官方 API 抓取原始模型列表，返回格式: [{'id': 'xxx', 'display_name': 'xxx'}]"""
         pass
 
-    @abstractmethod
     def infer_capabilities(self, model_id: str) -> Dict[str, bool]:
-        """根据模型 ID 推断其能力矩阵 (chat, vision, image, video)"""
-        pass
+        """根据模型 ID 推断其能力矩阵：统一走规则表编译出的分类器，所有同步器口径一致"""
+        return classify_model(model_id)
 
     @abstractmethod
     def get_context_ui_params(self, caps: Dict[str, bool]) -> Dict[str, Any]:
@@ -32,34 +32,12 @@ class GeminiSyncer(BaseSyncer):
             print(f"Gemini Sync Error: {e}")
             return []
 
-    def infer_capabilities(self, model_id: str) -> Dict[str, bool]:
-        """
-        根据模型名称推断能力矩阵 (精确识别图像和视频模型)
-        """
-        m = model_id.lower()
-        # 默认假设是多模态对话模型
-        caps = {"chat": True, "vision": True, "image": False, "video": False}
-
-        # 识别绘图模型 (增加对 nano banana 和 image 关键词的识别)
-        if "imagen" in m or "image" in m or "banana" in m:
-            caps["image"] = True
-            caps["chat"] = False  # 绘图模型不能用于对话
-            caps["vision"] = False  # 绘图模型不能用于识图
-
-        # 识别视频模型
-        if "veo" in m or "video" in m:
-            caps["video"] = True
-            caps["chat"] = False
-            caps["vision"] = False
-
-        return caps
-
     def get_context_ui_params(self, caps: Dict[str, bool]) -> Dict[str, Any]:
         """
         分配动态 UI 参数模板，驱动 GenerateNode 渲染
         """
         params = {}
-        if caps["chat"] or caps["vision"]:
+        if caps.get("chat") or caps.get("vision"):
             # 标准采样参数定义
             standard_params = [
                 {"name": "temperature", "label": "随机性 (Temp)", "type": "number", "default": 0.7, "min": 0, "max": 2,
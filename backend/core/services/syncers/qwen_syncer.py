@@ -34,37 +34,13 @@ class QwenSyncer(BaseSyncer):
             print(f"Qwen Sync Error: {e}")
             return []
 
-    def infer_capabilities(self, model_id: str) -> Dict[str, bool]:
-        """
-        根据千问模型名称推断能力矩阵
-        """
-        m = model_id.lower()
-        # 默认基础能力为纯文本对话
-        caps = {"chat": True, "vision": False, "image": False, "video": False}
-
-        # 识别视觉/多模态模型 (如 qwen-vl-plus, qwen-vl-max)
-        if "vl" in m or "vision" in m:
-            caps["vision"] = True
-
-        # 识别语音模型 (如 qwen-audio)
-        if "audio" in m:
-            caps["chat"] = True
-
-            # 识别生图模型 (如果有通过此接口返回 wanx 或 image 相关的模型)
-        if "wanx" in m or "image" in m:
-            caps["image"] = True
-            caps["chat"] = False
-            caps["vision"] = False
-
-        return caps
-
     def get_context_ui_params(self, caps: Dict[str, bool]) -> Dict[str, Any]:
         """
         根据能力分配 UI 控制面板的参数
         """
         params = {}
         # 文本和视觉模型参数
-        if caps["chat"] or caps["vision"]:
+        if caps.get("chat") or caps.get("vision"):
             standard_params = [
                 {"name": "temperature", "label": "随机性 (Temp)", "type": "number", "default": 0.8, "min": 0.0,
                  "max": 2.0, "step": 0.1},
@@ -75,8 +51,9 @@ class QwenSyncer(BaseSyncer):
             if caps["vision"]: params["vision"] = standard_params
 
         # 图像生成参数（为万相模型准备）
-        if caps["image"]:
-            params["image"] = [
+        image_caps = [c for c in ("text_to_image", "image_to_image") if caps.get(c)]
+        for cap in image_caps:
+            params[cap] = [
                 {"name": "size", "label": "图像尺寸", "type": "select",
                  "options": ["1024*1024", "768*1024", "1024*768"], "default": "1024*1024"},
                 {"name": "n", "label": "生成数量", "type": "number", "default": 1, "min": 1, "max": 4, "step": 1}
@@ -0,0 +1,106 @@
+# backend/core/tag_index.py
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session, Query
+
+from ..models.tag_index import TagIndex
+from ..models.asset import Asset
+from ..models.project import Project
+
+ENTITY_ASSET = "asset"
+ENTITY_PROJECT = "project"
+
+TAG_MODE_AND = "and"
+TAG_MODE_OR = "or"
+
+
+def normalize_tags(tags: Optional[Iterable[str]]) -> List[str]:
+    """去空白、转小写、去重（保持原有顺序），丢弃空标签"""
+    result = []
+    seen = set()
+    for tag in tags or []:
+        if not isinstance(tag, str):
+            continue
+        t = tag.strip().lower()[:100]
+        if t and t not in seen:
+            seen.add(t)
+            result.append(t)
+    return result
+
+
+def sync_entity_tags(db: Session, entity_type: str, entity_id: int, tags: Optional[Iterable[str]]) -> None:
+    """
+    将实体当前的 tags 同步到索引表（只做差量增删，不提交事务）。
+    调用方需保证 entity_id 已经 flush 出来。
+    """
+    wanted = set(normalize_tags(tags))
+    existing = {
+        row.tag: row for row in db.query(TagIndex).filter(
+            TagIndex.entity_type == entity_type,
+            TagIndex.entity_id == entity_id
+        ).all()
+    }
+
+    for tag, row in existing.items():
+        if tag not in wanted:
+            db.delete(row)
+    for tag in wanted - existing.keys():
+        db.add(TagIndex(entity_type=entity_type, entity_id=entity_id, tag=tag))
+
+
+def remove_entity_tags(db: Session, entity_type: str, entity_id: int) -> None:
+    db.query(TagIndex).filter(
+        TagIndex.entity_type == entity_type,
+        TagIndex.entity_id == entity_id
+    ).delete(synchronize_session=False)
+
+
+def tagged_entity_ids(db: Session, entity_type: str, tags: Iterable[str], mode: str = TAG_MODE_AND) -> Query:
+    """
+    返回匹配标签的实体 ID 子查询，可直接用于 Model.id.in_(...)。
+    and: 必须同时包含全部标签；or: 包含任意一个标签即可。
+    """
+    wanted = normalize_tags(tags)
+    query = db.query(TagIndex.entity_id).filter(
+        TagIndex.entity_type == entity_type,
+        TagIndex.tag.in_(wanted)
+    )
+    if mode == TAG_MODE_OR:
+        return query.distinct()
+    return query.group_by(TagIndex.entity_id).having(func.count(TagIndex.tag) == len(wanted))
+
+
+def tag_facets(db: Session, entity_type: str, entity_ids: Optional[Query] = None,
+               limit: int = 100) -> List[Tuple[str, int]]:
+    """统计每个标签下的实体数量（按数量降序），可用 entity_ids 子查询限定统计范围"""
+    query = db.query(TagIndex.tag, func.count(TagIndex.entity_id).label("count")).filter(
+        TagIndex.entity_type == entity_type
+    )
+    if entity_ids is not None:
+        query = query.filter(TagIndex.entity_id.in_(entity_ids))
+    query = query.group_by(TagIndex.tag).order_by(func.count(TagIndex.entity_id).desc(), TagIndex.tag)
+    return [(row.tag, row.count) for row in query.limit(limit).all()]
+
+
+def rebuild_tag_index(db: Session) -> int:
+    """从 Asset / Project 的 JSON tags 全量重建索引，返回写入的行数"""
+    db.query(TagIndex).delete(synchronize_session=False)
+    rows = []
+    for entity_type, model in ((ENTITY_ASSET, Asset), (ENTITY_PROJECT, Project)):
+        for entity_id, tags in db.query(model.id, model.tags).all():
+            for tag in normalize_tags(tags):
+                rows.append({"entity_type": entity_type, "entity_id": entity_id, "tag": tag})
+    if rows:
+        db.bulk_insert_mappings(TagIndex, rows)
+    db.commit()
+    return len(rows)
+
+
+def ensure_tag_index(db: Session) -> None:
+    """启动时调用：索引表为空但库里已有数据时做一次回填（兼容升级前的老库）"""
+    if db.query(TagIndex.id).first() is not None:
+        return
+    has_data = db.query(Asset.id).first() is not None or db.query(Project.id).first() is not None
+    if has_data:
+        count = rebuild_tag_index(db)
+        print(f"🏷️ [TagIndex] 已从历史数据回填 {count} 条标签索引")
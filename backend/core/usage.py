@@ -0,0 +1,117 @@
+# backend/core/usage.py
+"""
+调用用量计量。
+
+- DEFAULT_USAGE_PATHS：从响应里取用量的默认路径（OpenAI / Anthropic / DashScope 风格），
+  Provider DSL 的路由配置可以用 usage_extractors 覆盖，例如
+  {"usage_extractors": {"prompt_tokens": "usage.input_tokens", "image_units": "usage.image_count"}}；
+- quota_cost：按 Key 的 quota_unit 把用量折算成配额消耗；
+- call_log：调用流水的内存缓冲，定时批量写入 call_logs 表。
+"""
+import math
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..models.call_log import CallLog
+from .db_writer import db_writer
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens",
+                "image_units", "video_units", "video_seconds", "response_bytes")
+
+# 每个字段按顺序尝试的候选路径
+DEFAULT_USAGE_PATHS: Dict[str, List[str]] = {
+    "prompt_tokens": ["usage.prompt_tokens", "usage.input_tokens"],
+    "completion_tokens": ["usage.completion_tokens", "usage.output_tokens"],
+    "total_tokens": ["usage.total_tokens"],
+    "image_units": ["usage.image_count", "usage.images"],
+    "video_units": ["usage.video_count"],
+    "video_seconds": ["usage.video_duration", "usage.duration"],
+}
+
+FLUSH_INTERVAL_SECONDS = 10
+RETENTION_DAYS = 30
+
+
+def quota_cost(quota_unit: Optional[str], usage: Dict[str, int], latency_ms: float) -> int:
+    """把一次调用的用量折算成 quota_remaining 的扣减量"""
+    unit = (quota_unit or "count").lower()
+    if unit in ("token", "tokens"):
+        tokens = usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+        # 上游没报 token 时按 1 次计，避免配额永远不动
+        return tokens or 1
+    if unit in ("image", "images"):
+        return usage.get("image_units") or 1
+    if unit in ("video", "videos"):
+        return usage.get("video_units") or 1
+    if unit == "seconds":
+        return usage.get("video_seconds") or max(1, math.ceil(latency_ms / 1000))
+    return 1
+
+
+class CallLogBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+
+    def add(self, api_key_id: int, provider: str, model: str, req_type: str, success: bool,
+            latency_ms: float, usage: Optional[Dict[str, int]] = None, quota_used: int = 0,
+            status_code: Optional[int] = None) -> None:
+        row = {
+            "created_at": datetime.utcnow(),
+            "api_key_id": api_key_id,
+            "provider": provider,
+            "model": (model or "")[:100],
+            "req_type": (req_type or "")[:20],
+            "success": success,
+            "status_code": status_code,
+            "latency_ms": int(latency_ms),
+            "quota_used": quota_used,
+        }
+        usage = usage or {}
+        for field in USAGE_FIELDS:
+            row[field] = int(usage.get(field) or 0)
+        with self._lock:
+            self._rows.append(row)
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        try:
+            db_writer.write_sync(_insert_rows, rows)
+        except Exception as e:
+            print(f"⚠️ [CallLog] 写入失败，保留到下次: {e}")
+            with self._lock:
+                self._rows[:0] = rows
+            return 0
+        return len(rows)
+
+
+def _insert_rows(db: Session, rows: List[Dict[str, Any]]) -> None:
+    db.execute(insert(CallLog), rows)
+
+
+def _prune(db: Session, before: datetime) -> int:
+    return db.query(CallLog).filter(CallLog.created_at < before).delete(synchronize_session=False)
+
+
+call_log = CallLogBuffer()
+
+
+async def start_call_log_flusher(interval_seconds: int = FLUSH_INTERVAL_SECONDS):
+    """定时批量落盘；每小时顺带清理超过保留期的流水"""
+    ticks_per_prune = max(1, 3600 // interval_seconds)
+    tick = 0
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await asyncio.to_thread(call_log.flush)
+        tick += 1
+        if tick % ticks_per_prune == 0:
+            cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+            await db_writer.write(_prune, cutoff)
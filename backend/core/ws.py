@@ -30,4 +30,12 @@ class ConnectionManager:
         else:
             print(f"⚠️ [WS] 丢包警告：找不到节点 {client_id} 的连接！(活跃列表: {list(self.active_connections.keys())})")
 
+    async def broadcast(self, message: dict):
+        """推送给所有在线节点（目录变更这类全局事件用）"""
+        for client_id, websocket in list(self.active_connections.items()):
+            try:
+                await websocket.send_json(message)
+            except Exception as e:
+                print(f"⚠️ [WS] 广播至 {client_id} 失败: {e}")
+
 manager = ConnectionManager()
\ No newline at end of file
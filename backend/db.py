@@ -1,6 +1,7 @@
 # backend/db.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
 
 # 导入 models 包（会执行 __init__.py，注册所有模型）
@@ -10,6 +11,33 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./data/comfyforge.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 🌟 异步引擎：供 async def 路由 / 执行器使用，避免同步 SQLite 读写卡住事件循环（WebSocket 推送）
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./data/comfyforge.db"
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+# expire_on_commit=False：提交后 ORM 对象仍可直接读取属性，不会在 await 之外触发隐式 IO
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# 🌟 SQLite 连接调优：WAL 让读不再被写阻塞；busy_timeout 让写锁冲突排队等待而不是直接报 database is locked
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",       # WAL 下 NORMAL 已能保证一致性，只在 checkpoint 时 fsync
+    "busy_timeout": 5000,          # ms
+    "cache_size": -64000,          # 负数单位为 KB，约 64MB 页缓存
+    "mmap_size": 268435456,        # 256MB 内存映射读
+    "temp_store": "MEMORY",
+}
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+event.listen(engine, "connect", _apply_sqlite_pragmas)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
 # 补全 get_db 函数，解决导入报错
 def get_db():
     db = SessionLocal()
@@ -18,7 +46,15 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """async def 路由专用；同步的 def 路由继续用 get_db（FastAPI 会放进线程池）"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     os.makedirs("./data", exist_ok=True)
     # 使用 models.Base 创建所有表
-    models.Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    models.Base.metadata.create_all(bind=engine)
+    # create_all 不会改动已有表：索引 / 约束等结构变更走版本化迁移
+    from .core.migrations import run_migrations
+    run_migrations(engine)
@@ -7,4 +7,12 @@ from .api_key import APIKey  # 新增
 from .node_parameter_stat import NodeParameterStat
 from .recommendation_rule import RecommendationRule
 from .model_config import ModelConfig
+from .tag_index import TagIndex
+from .asset_lineage import AssetLineage
+from .asset_version import AssetVersionHead, AssetDelta
+from .image_hash import ImageHash
+from .media_blob import MediaBlob
+from .call_log import CallLog
+from .model_catalog_snapshot import ModelCatalogSnapshot
+from .capability_rule import CapabilityRule
 from .schemas import (ImageData,VideoData,PromptData)
\ No newline at end of file
@@ -1,5 +1,5 @@
 # backend/models/api_key.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, JSON, Text
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, JSON, Text, Index
 from datetime import datetime
 from . import Base
 
@@ -39,4 +39,8 @@ class APIKey(Base):
 
     # 标签和元数据
     tags = Column(JSON, default=list)  # 例如 ["free", "backup", "primary"]
-    extra_metadata = Column(JSON, default=dict)  # 额外信息（改名，避免与SQLAlchemy保留字冲突）
\ No newline at end of file
+    extra_metadata = Column(JSON, default=dict)  # 额外信息（改名，避免与SQLAlchemy保留字冲突）
+
+    __table_args__ = (
+        Index('idx_api_key_provider_active', 'provider', 'is_active'),
+    )
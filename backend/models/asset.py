@@ -25,4 +25,6 @@ class Asset(Base):
     __table_args__ = (
         Index('idx_asset_type', 'type'),
         Index('idx_asset_parent', 'parent_id'),
+        Index('idx_asset_project_created', 'project_id', 'created_at'),
+        Index('idx_asset_created', 'created_at'),
     )
\ No newline at end of file
@@ -0,0 +1,25 @@
+# backend/models/asset_lineage.py
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from . import Base
+
+
+class AssetLineage(Base):
+    """
+    资产血缘边表：parent_asset_id --(relation)--> child_asset_id
+    relation: 'source' 表示生成来源 (source_asset_ids)，'version' 表示版本演进 (parent_id)
+    """
+    __tablename__ = 'asset_lineage'
+
+    id = Column(Integer, primary_key=True)
+    parent_asset_id = Column(Integer, nullable=False)
+    child_asset_id = Column(Integer, nullable=False)
+    relation = Column(String(20), nullable=False, default="source")
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # 向上追溯 (ancestors)：按 child 找 parent
+        Index('idx_lineage_child', 'child_asset_id', 'relation', 'parent_asset_id', unique=True),
+        # 向下展开 (descendants)：按 parent 找 child
+        Index('idx_lineage_parent', 'parent_asset_id', 'relation', 'child_asset_id'),
+    )
@@ -0,0 +1,37 @@
+# backend/models/asset_version.py
+from sqlalchemy import Column, Integer, JSON, DateTime, Index
+from datetime import datetime
+from . import Base
+
+
+class AssetVersionHead(Base):
+    """
+    物化的“最新版本”索引：每一行就是一个当前版本头（没有更新版本派生自它的资产）。
+    “只看最新版本”直接走这张表，不再对 assets 做自连接。
+    """
+    __tablename__ = 'asset_version_heads'
+
+    head_asset_id = Column(Integer, primary_key=True)
+    root_asset_id = Column(Integer, nullable=False)  # 版本链的起点 (version=1 的那一行)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_version_head_root', 'root_asset_id'),
+    )
+
+
+class AssetDelta(Base):
+    """
+    历史版本的反向差量：asset_id 的完整 data = apply_delta(base_asset_id 的完整 data, delta)。
+    只有大体积 JSON（例如 workflow）才会被压缩，最新版本始终保存完整 data。
+    """
+    __tablename__ = 'asset_deltas'
+
+    asset_id = Column(Integer, primary_key=True)
+    base_asset_id = Column(Integer, nullable=False)
+    delta = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_asset_delta_base', 'base_asset_id'),
+    )
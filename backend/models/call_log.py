@@ -0,0 +1,37 @@
+# backend/models/call_log.py
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
+from datetime import datetime
+from . import Base
+
+
+class CallLog(Base):
+    """
+    单次调用的用量流水（只存整数列，不存请求 / 响应正文）。
+    token / 图片 / 视频用量由适配器按 Provider DSL 的 usage_extractors 从响应里提取。
+    """
+    __tablename__ = 'call_logs'
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    api_key_id = Column(Integer, nullable=False)
+    provider = Column(String(50), nullable=False)
+    model = Column(String(100), default="")
+    req_type = Column(String(20), default="")
+    success = Column(Boolean, default=True)
+    status_code = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, default=0)
+
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    image_units = Column(Integer, default=0)
+    video_units = Column(Integer, default=0)
+    video_seconds = Column(Integer, default=0)
+    response_bytes = Column(Integer, default=0)
+    quota_used = Column(Integer, default=0)  # 按 Key 的 quota_unit 折算后的消耗
+
+    __table_args__ = (
+        Index('idx_call_log_key_created', 'api_key_id', 'created_at'),
+        Index('idx_call_log_provider_created', 'provider', 'created_at'),
+        Index('idx_call_log_created', 'created_at'),
+    )
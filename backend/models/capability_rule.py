@@ -0,0 +1,22 @@
+# backend/models/capability_rule.py
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON
+from datetime import datetime
+from . import Base
+
+
+class CapabilityRule(Base):
+    """
+    模型能力分类规则：模型 ID 命中 keywords（子串，不区分大小写）或 regex 时，赋予 capabilities。
+    多条规则同时命中时取 priority 最小的一条，都不命中则兜底为 chat。
+    """
+    __tablename__ = 'capability_rules'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    keywords = Column(JSON, default=list)            # 例如 ["i2v", "img2vid"]
+    regex = Column(String(500), nullable=True)       # 可选：更复杂的匹配
+    capabilities = Column(JSON, nullable=False)      # 例如 ["chat", "vision"]
+    priority = Column(Integer, default=100)          # 数字越小越优先
+    enabled = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,28 @@
+# backend/models/image_hash.py
+from sqlalchemy import Column, Integer, DateTime, Index
+from datetime import datetime
+from . import Base
+
+
+class ImageHash(Base):
+    """
+    图片资产的感知哈希 (64 位 dHash)。
+    dhash 按有符号 64 位整数存储（SQLite INTEGER），并拆成 4 段 16 位 band 建索引：
+    汉明距离 <= 3 的两张图至少有一段完全相同（鸽巢原理），近似查询退化为 4 次等值索引查找。
+    """
+    __tablename__ = 'image_hashes'
+
+    asset_id = Column(Integer, primary_key=True)
+    dhash = Column(Integer, nullable=False)
+    band0 = Column(Integer, nullable=False)
+    band1 = Column(Integer, nullable=False)
+    band2 = Column(Integer, nullable=False)
+    band3 = Column(Integer, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_image_hash_band0', 'band0'),
+        Index('idx_image_hash_band1', 'band1'),
+        Index('idx_image_hash_band2', 'band2'),
+        Index('idx_image_hash_band3', 'band3'),
+    )
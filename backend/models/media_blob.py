@@ -0,0 +1,22 @@
+# backend/models/media_blob.py
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
+from datetime import datetime
+from . import Base
+
+
+class MediaBlob(Base):
+    """
+    媒体文件内容哈希登记表：sha256 -> 本地文件。
+    导出时缓存文件哈希（按 size + mtime 判断是否需要重算），导入时按内容去重。
+    """
+    __tablename__ = 'media_blobs'
+
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String(500), nullable=False)
+    size = Column(Integer, default=0)
+    mtime = Column(Float, default=0.0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_media_blob_path', 'file_path'),
+    )
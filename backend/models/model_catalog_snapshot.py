@@ -0,0 +1,24 @@
+# backend/models/model_catalog_snapshot.py
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from . import Base
+
+
+class ModelCatalogSnapshot(Base):
+    """
+    每个 Key 最近一次拉到的远程模型列表（/models 原始结果）。
+    content_hash 与上次相同就说明目录没变，同步时直接跳过数据库差分；为空串表示还没成功拉取过
+    （只记过失败尝试的占位行），下次成功拉取必定做一次完整差分。能力规则变更不经过这里，由规则接口直接重算模型能力。
+    拉取失败 / 返回空列表也会记录 last_attempt_at 与连续失败次数，后台刷新据此退避，不会每个 tick 都重试。
+    """
+    __tablename__ = 'model_catalog_snapshots'
+
+    api_key_id = Column(Integer, primary_key=True)
+    provider = Column(String(50), nullable=False)
+    content_hash = Column(String(64), nullable=False, default="")
+    model_count = Column(Integer, default=0)
+    models = Column(JSON, default=list)
+    fetched_at = Column(DateTime, nullable=True)              # 最近一次成功拉取（失败占位行为空）
+    changed_at = Column(DateTime, nullable=True)              # 最近一次内容变化
+    last_attempt_at = Column(DateTime, nullable=True)         # 最近一次尝试拉取（无论成败）
+    failure_count = Column(Integer, default=0, nullable=False)  # 连续失败次数
+    last_error = Column(String(500), nullable=True)
@@ -1,7 +1,25 @@
-from sqlalchemy import Column, Integer, String, JSON, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, JSON, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.orm import validates
 from datetime import datetime
+from typing import Any, Dict, Optional
 from .base import Base
 
+# 六种任务能力 → 反范式化的布尔列（capabilities JSON 仍是完整来源，列只用于 SQL 过滤）
+CAPABILITY_COLUMNS = {
+    "chat": "cap_chat",
+    "vision": "cap_vision",
+    "text_to_image": "cap_text_to_image",
+    "image_to_image": "cap_image_to_image",
+    "text_to_video": "cap_text_to_video",
+    "image_to_video": "cap_image_to_video",
+}
+
+
+def capability_columns(caps: Optional[Dict[str, Any]]) -> Dict[str, bool]:
+    """capabilities JSON → cap_* 列的值；批量 insert / update 绕过 ORM 时由调用方显式带上"""
+    caps = caps or {}
+    return {column: caps.get(cap) is True for cap, column in CAPABILITY_COLUMNS.items()}
+
 
 class ModelConfig(Base):
     __tablename__ = "model_configs"
@@ -15,6 +33,12 @@ class ModelConfig(Base):
     api_key_id = Column(Integer, ForeignKey("api_keys.id", ondelete="CASCADE"), nullable=True)
 
     capabilities = Column(JSON, nullable=False)
+    cap_chat = Column(Boolean, default=False, nullable=False)
+    cap_vision = Column(Boolean, default=False, nullable=False)
+    cap_text_to_image = Column(Boolean, default=False, nullable=False)
+    cap_image_to_image = Column(Boolean, default=False, nullable=False)
+    cap_text_to_video = Column(Boolean, default=False, nullable=False)
+    cap_image_to_video = Column(Boolean, default=False, nullable=False)
     context_ui_params = Column(JSON, nullable=False)
     is_active = Column(Boolean, default=True)
     # 🌟 核心新增：区分同步模型与手动模型
@@ -26,4 +50,20 @@ class ModelConfig(Base):
     # 🌟 核心新增：健康追踪系统
     # 状态枚举: 'unknown'(未知), 'healthy'(健康可用), 'quota_exhausted'(额度耗尽), 'unauthorized'(无权限/需绑卡), 'error'(其他错误)
     health_status = Column(String, default="unknown")
-    last_tested_at = Column(DateTime, nullable=True)
\ No newline at end of file
+    last_tested_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_model_config_api_key', 'api_key_id'),
+        Index('idx_model_config_model_name', 'model_name'),
+        # 同一个 Key 下模型名唯一（老库由迁移 #2 去重后补建）
+        Index('uq_model_config_key_model', 'api_key_id', 'model_name', unique=True),
+        # 能力过滤：(能力, Key) 复合索引同时覆盖“全部 Key”与“指定 Key”两种查询
+        *(Index(f'idx_model_config_{column}', column, 'api_key_id') for column in CAPABILITY_COLUMNS.values()),
+    )
+
+    @validates("capabilities")
+    def _sync_capability_columns(self, key, value):
+        # 经 ORM 赋值 capabilities 时同步刷新 cap_* 列
+        for column, enabled in capability_columns(value).items():
+            setattr(self, column, enabled)
+        return value
@@ -1,5 +1,5 @@
 # backend/models/provider.py
-from sqlalchemy import Column, String, Boolean, JSON
+from sqlalchemy import Column, String, Boolean, JSON, Integer
 from .base import Base
 
 
@@ -22,4 +22,7 @@ class Provider(Base):
 
     # ================= 🌟 架构升级：新增高级路由与自定义头 =================
     endpoints = Column(JSON, default={}, nullable=True)  # 例如: {"chat": "/v1/chat/completions", "image": "..."}
-    custom_headers = Column(JSON, default={}, nullable=True)  # 例如: {"X-DashScope-Async": "enable"}
\ No newline at end of file
+    custom_headers = Column(JSON, default={}, nullable=True)  # 例如: {"X-DashScope-Async": "enable"}
+
+    # 🌟 模型目录后台刷新间隔（分钟）：为空走默认值，0 表示不自动刷新
+    catalog_refresh_minutes = Column(Integer, nullable=True)
@@ -98,6 +98,11 @@ class AssetOut(AssetBase):
     source_asset_ids: Optional[List[int]] = None
     model_config = ConfigDict(from_attributes=True)
 
+# 标签分面统计（资产 / 项目共用）
+class TagFacetOut(BaseModel):
+    tag: str
+    count: int
+
 # --- 3. 模型配置 API 交互模型 (新功能) ---
 
 class ModelConfigBase(BaseModel):
@@ -0,0 +1,23 @@
+# backend/models/tag_index.py
+from sqlalchemy import Column, Integer, String, Index
+from . import Base
+
+
+class TagIndex(Base):
+    """
+    规范化标签索引表：Asset.tags / Project.tags 的 JSON 列在写入时同步展开到这里，
+    标签过滤与分面统计全部走索引，不再扫描 JSON。
+    """
+    __tablename__ = 'tag_index'
+
+    id = Column(Integer, primary_key=True)
+    entity_type = Column(String(20), nullable=False)  # 'asset' 或 'project'
+    entity_id = Column(Integer, nullable=False)
+    tag = Column(String(100), nullable=False)  # 已规范化（去空白、小写）
+
+    __table_args__ = (
+        # 按标签查实体 (过滤 / 分面) 的覆盖索引
+        Index('idx_tag_lookup', 'entity_type', 'tag', 'entity_id', unique=True),
+        # 按实体查/删其全部标签
+        Index('idx_tag_entity', 'entity_type', 'entity_id'),
+    )